@@ -1,38 +1,147 @@
 from flask import Flask, request, jsonify
-import subprocess
-import mysql.connector
-from textblob import TextBlob
+import atexit
+import os
+import queue
+import threading
+import time
+import uuid
+import mysql.connector.pooling
+import requests
+import requests.adapters
+from emotion import EMOTION_MODE, INLINE_MODES, get_scorer
 
 app = Flask(__name__)
 
-# 🧩 Database connection (adjust to your .env or XAMPP settings)
-db = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",  # change if needed
-    database="library_system_ai"
-)
-cursor = db.cursor()
+# 🧩 Settings (adjust to your .env or XAMPP settings)
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+MODEL_NAME = os.getenv("OLLAMA_MODEL", "llama3:8b-instruct-q4_K_M")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", ""),  # change if needed
+    "database": os.getenv("DB_NAME", "library_system_ai"),
+}
+DB_POOL_SIZE = int(os.getenv("AI_DB_POOL_SIZE", "4"))
+LOG_BATCH_SIZE = int(os.getenv("AI_LOG_BATCH_SIZE", "50"))
+LOG_FLUSH_SECONDS = float(os.getenv("AI_LOG_FLUSH_SECONDS", "1.0"))
+LOG_QUEUE_MAX = int(os.getenv("AI_LOG_QUEUE_MAX", "10000"))
+
+# 🧩 Database pool: each thread borrows its own connection instead of sharing one cursor
+db_pool = None
+
+
+def get_db_pool():
+    global db_pool
+    if db_pool is None:
+        db_pool = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name="ai_server", pool_size=DB_POOL_SIZE, pool_reset_session=False, **DB_CONFIG
+        )
+    return db_pool
+
+
+# 🔹 Persistent model client: one keep-alive HTTP session to the Ollama server
+# (the model stays loaded, no process start or handshake per request)
+ollama = requests.Session()
+ollama.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=8))
+ollama.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=8))
+
 
-# 🔹 Function: run local LLaMA 3
 def run_llama(prompt):
-    result = subprocess.run(
-        ["ollama", "run", "llama3:8b-instruct-q4_K_M"],
-        input=prompt.encode("utf-8"),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
+    r = ollama.post(
+        f"{OLLAMA_URL}/api/generate",
+        json={"model": MODEL_NAME, "prompt": prompt, "stream": False, "keep_alive": OLLAMA_KEEP_ALIVE},
+        timeout=OLLAMA_TIMEOUT,
     )
-    return result.stdout.decode("utf-8").strip()
-
-# 🔹 Function: detect emotion via sentiment
-def detect_emotion(text):
-    polarity = TextBlob(text).sentiment.polarity
-    if polarity > 0.4:
-        return "positive"
-    elif polarity < -0.4:
-        return "negative"
-    else:
-        return "neutral"
+    r.raise_for_status()
+    return (r.json().get("response") or "").strip()
+
+
+# 🔹 Async batched log writer: requests only enqueue; one thread tags emotions
+# that were not scored inline (AI_EMOTION_MODE=textblob) and inserts ai_logs
+# rows in batches. ai_emotion_logs is not written: its message_id references
+# ai_chat_history in jrmsu_library, which this server has no rows in.
+class LogWriter:
+    INSERT = "INSERT INTO ai_logs (user_id, message, ai_response, emotion_detected) VALUES (%s, %s, %s, %s)"
+
+    def __init__(self, get_pool, batch_size=LOG_BATCH_SIZE, flush_seconds=LOG_FLUSH_SECONDS,
+                 max_queue=LOG_QUEUE_MAX, scorer=None):
+        self.get_pool = get_pool
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.scorer = scorer or get_scorer(EMOTION_MODE)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.recent = {}  # message_id -> emotion result, for GET /ai/emotion/<id>
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ai-log-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def log(self, message_id, user_id, message, ai_response, emotion=None):
+        try:
+            self.queue.put_nowait((message_id, user_id, message, ai_response, emotion))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=5.0):
+        """Stop the thread after writing what is still queued"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            batch = []
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=min(remaining, 0.1)))
+                except queue.Empty:
+                    if self._stop.is_set():
+                        break
+            if batch:
+                self._write(self._tag(batch))
+
+    def _tag(self, batch):
+        tagged = []
+        for message_id, user_id, message, ai_response, result in batch:
+            if result is None:
+                result = self.scorer(ai_response)
+            self.recent[message_id] = result
+            tagged.append((message_id, user_id, message, ai_response, result))
+        while len(self.recent) > LOG_QUEUE_MAX:
+            self.recent.pop(next(iter(self.recent)))
+        return tagged
+
+    def _write(self, tagged):
+        try:
+            conn = self.get_pool().get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.executemany(self.INSERT, [(u, m, r, e["tone"]) for _, u, m, r, e in tagged])
+                conn.commit()
+                self.written += len(tagged)
+                cursor.close()
+            finally:
+                conn.close()  # back to the pool
+        except Exception as e:
+            self.dropped += len(tagged)
+            print(f"⚠️  ai_logs batch of {len(tagged)} not written: {e}")
+
+
+log_writer = LogWriter(get_db_pool).start()
+atexit.register(log_writer.close)
+
 
 # 🔹 Route: handle AI chat & logging
 @app.route("/ai/chat", methods=["POST"])
@@ -41,23 +150,42 @@ def ai_chat():
     user_id = data.get("user_id", "unknown")
     prompt = data.get("prompt", "")
 
-    # Run LLaMA 3 locally
-    response_text = run_llama(prompt)
+    # Run LLaMA 3 via the local Ollama server
+    try:
+        response_text = run_llama(prompt)
+    except requests.RequestException as e:
+        return jsonify({"error": f"Model request failed: {e}"}), 502
 
-    # Detect emotion
-    emotion = detect_emotion(response_text)
-
-    # Save to ai_logs table
-    query = "INSERT INTO ai_logs (user_id, message, ai_response, emotion_detected) VALUES (%s, %s, %s, %s)"
-    cursor.execute(query, (user_id, prompt, response_text, emotion))
-    db.commit()
+    # The lexicon scorer takes microseconds, so its tone is returned right away;
+    # TextBlob tagging and the ai_logs insert happen in batches off the request thread
+    message_id = uuid.uuid4().hex
+    result = log_writer.scorer(response_text) if EMOTION_MODE in INLINE_MODES else None
+    log_writer.log(message_id, user_id, prompt, response_text, result)
 
     return jsonify({
         "response": response_text,
-        "emotion": emotion
+        # None in textblob mode: poll GET /ai/emotion/<messageId> instead
+        "emotion": result["tone"] if result else None,
+        "messageId": message_id
     })
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+# 🔹 Route: emotion of a logged response, once the background writer has tagged it
+@app.route("/ai/emotion/<message_id>", methods=["GET"])
+def ai_emotion(message_id):
+    result = log_writer.recent.get(message_id)
+    if result is None:
+        return jsonify({"messageId": message_id, "pending": True}), 202
+    return jsonify({"messageId": message_id, **result})
 
+# 🔹 Route: writer/queue status
+@app.route("/ai/stats", methods=["GET"])
+def ai_stats():
+    return jsonify({
+        "logsQueued": log_writer.queue.qsize(),
+        "logsWritten": log_writer.written,
+        "logsDropped": log_writer.dropped,
+        "emotionMode": EMOTION_MODE,
+    })
 
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5000, threaded=True)
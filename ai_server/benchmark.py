@@ -0,0 +1,145 @@
+"""
+benchmark.py
+Compares the old per-request `ollama run` subprocess with the persistent HTTP
+client in app.py, the lexicon and TextBlob emotion scorers, and (with --db)
+commit-per-insert on one shared connection with the batched ai_logs writer.
+
+Usage:
+    python benchmark.py [--requests 20] [--concurrency 4] [--ollama-cmd ollama] [--db] [--emotion-only]
+OLLAMA_URL / OLLAMA_MODEL / DB_* are read from the environment like app.py.
+"""
+
+import argparse
+import shutil
+import subprocess
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app import MODEL_NAME, DB_CONFIG, LogWriter, get_db_pool, run_llama
+from emotion import lexicon_emotion
+
+PROMPTS = [
+    "What are the library opening hours?",
+    "Recommend a book about Philippine history.",
+    "How do I reserve a book?",
+    "Summarize the borrowing rules in one sentence.",
+]
+
+
+def run_subprocess(cmd, prompt):
+    """The previous implementation: a new `ollama run` process per request"""
+    result = subprocess.run(
+        [cmd, "run", MODEL_NAME],
+        input=prompt.encode("utf-8"),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    return result.stdout.decode("utf-8").strip()
+
+
+def timed(label, fn, n, concurrency):
+    latencies = []
+
+    def one(i):
+        start = time.perf_counter()
+        fn(PROMPTS[i % len(PROMPTS)])
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<28} {n / wall:8.2f} req/s   p50 {p50:8.1f} ms   p95 {p95:8.1f} ms")
+    return n / wall
+
+
+RESPONSES = [
+    "Thanks for asking! The library is open from 8:00 AM to 5:00 PM, Monday to Friday.",
+    "I'm sorry, that book is currently borrowed. You can reserve it and we'll notify you.",
+    "Your book is overdue. Please return it as soon as possible to avoid penalties.",
+    "Here are three great books about Philippine history that students love.",
+]
+
+
+def bench_emotion(n):
+    texts = [RESPONSES[i % len(RESPONSES)] for i in range(n)]
+    start = time.perf_counter()
+    for text in texts:
+        lexicon_emotion(text)
+    lexicon = (time.perf_counter() - start) * 1e6 / n
+    print(f"{'lexicon emotion':<28} {lexicon:8.1f} us/msg")
+    try:
+        start = time.perf_counter()
+        from emotion import textblob_emotion
+        textblob_emotion("warm up")
+        first = (time.perf_counter() - start) * 1000.0
+        start = time.perf_counter()
+        for text in texts:
+            textblob_emotion(text)
+        precise = (time.perf_counter() - start) * 1e6 / n
+        print(f"{'textblob emotion':<28} {precise:8.1f} us/msg   import + first call {first:.0f} ms   "
+              f"({precise / lexicon:.0f}x slower)")
+    except ImportError:
+        print("skipping textblob: not installed")
+
+
+def bench_logs(rows):
+    import mysql.connector
+    sample = [("bench", "prompt", "response", "neutral")] * rows
+
+    db = mysql.connector.connect(**DB_CONFIG)
+    cursor = db.cursor()
+    start = time.perf_counter()
+    for row in sample:
+        cursor.execute(LogWriter.INSERT, row)
+        db.commit()
+    shared = time.perf_counter() - start
+    cursor.execute("DELETE FROM ai_logs WHERE user_id = 'bench'")
+    db.commit()
+
+    writer = LogWriter(get_db_pool).start()
+    start = time.perf_counter()
+    for user_id, message, response, _ in sample:
+        writer.log(uuid.uuid4().hex, user_id, message, response)
+    enqueue = time.perf_counter() - start
+    writer.close(timeout=60)
+    batched = time.perf_counter() - start
+    cursor.execute("DELETE FROM ai_logs WHERE user_id = 'bench'")
+    db.commit()
+    db.close()
+
+    print(f"{'shared conn, commit/row':<28} {rows / shared:8.0f} rows/s")
+    print(f"{'batched writer (drain)':<28} {rows / batched:8.0f} rows/s   request-side {enqueue * 1e6 / rows:.1f} us/row")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--ollama-cmd", default="ollama")
+    parser.add_argument("--db", action="store_true", help="also benchmark ai_logs inserts")
+    parser.add_argument("--log-rows", type=int, default=2000)
+    parser.add_argument("--emotion-only", action="store_true", help="only benchmark the emotion scorers")
+    args = parser.parse_args()
+
+    bench_emotion(5000)
+    if args.emotion_only:
+        return
+
+    http = timed("persistent HTTP client", run_llama, args.requests, args.concurrency)
+    if shutil.which(args.ollama_cmd):
+        sub = timed("subprocess per request", lambda p: run_subprocess(args.ollama_cmd, p), args.requests, args.concurrency)
+        print(f"speedup: {http / sub:.1f}x")
+    else:
+        print(f"skipping subprocess run: '{args.ollama_cmd}' not found")
+
+    if args.db:
+        bench_logs(args.log_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+emotion.py
+Emotion/tone scorers for AI chat logs.
+
+- "lexicon" (default): precompiled word table, same keyword groups as the
+  frontend's aiService.detectEmotion; microseconds per message
+- "textblob": TextBlob polarity (imported on first use, it is heavy)
+
+Each scorer returns {"emotion", "confidence", "tone", "keywords"}.
+"""
+
+import os
+import re
+
+EMOTION_MODE = os.getenv("AI_EMOTION_MODE", "lexicon")
+
+EMOTION_WORDS = {
+    "joy": ["happy", "great", "excellent", "wonderful", "amazing", "fantastic", "love", "excited",
+            "delighted", "pleased", "glad", "cheerful", "awesome", "nice", "helpful"],
+    "gratitude": ["thank", "thanks", "appreciate", "grateful", "thankful", "salamat"],
+    "sadness": ["sad", "unhappy", "depressed", "miserable", "disappointed", "dejected", "sorry"],
+    "anger": ["angry", "mad", "furious", "annoyed", "irritated", "frustrated", "hate", "terrible", "useless"],
+    "fear": ["afraid", "scared", "worried", "anxious", "nervous", "concerned", "overdue", "penalty"],
+    "surprise": ["surprised", "shocked", "astonished", "wow"],
+    "confusion": ["confused", "puzzled", "unclear", "uncertain", "lost"],
+}
+POSITIVE = {"joy", "gratitude", "surprise"}
+NEGATIVE = {"sadness", "anger", "fear"}
+NEGATIONS = {"not", "no", "never", "dont", "don't", "isn't", "isnt", "wasn't", "cannot", "can't"}
+
+# word -> emotion, built once
+_WORD_TABLE = {word: emotion for emotion, words in EMOTION_WORDS.items() for word in words}
+_TOKEN_RE = re.compile(r"[a-z']+")
+
+
+def lexicon_emotion(text):
+    tokens = _TOKEN_RE.findall((text or "").lower())
+    scores = {}
+    keywords = []
+    for i, token in enumerate(tokens):
+        emotion = _WORD_TABLE.get(token)
+        if emotion is None:
+            continue
+        # "not happy" counts against joy instead of for it
+        if i and tokens[i - 1] in NEGATIONS:
+            emotion = "sadness" if emotion in POSITIVE else "neutral"
+        scores[emotion] = scores.get(emotion, 0) + 1
+        keywords.append(token)
+    if "confusion" not in scores and "don't understand" in (text or "").lower():
+        scores["confusion"] = scores.get("confusion", 0) + 1
+        keywords.append("don't understand")
+    if not scores:
+        return {"emotion": "neutral", "confidence": 0.6, "tone": "neutral", "keywords": []}
+    emotion = max(scores, key=scores.get)
+    tone = "positive" if emotion in POSITIVE else "negative" if emotion in NEGATIVE else "neutral"
+    return {
+        "emotion": emotion,
+        "confidence": round(min(0.5 + scores[emotion] * 0.15, 0.95), 2),
+        "tone": tone,
+        "keywords": keywords,
+    }
+
+
+_TextBlob = None
+
+
+def textblob_emotion(text):
+    global _TextBlob
+    if _TextBlob is None:
+        from textblob import TextBlob
+        _TextBlob = TextBlob
+    polarity = _TextBlob(text or "").sentiment.polarity
+    if polarity > 0.4:
+        tone = "positive"
+    elif polarity < -0.4:
+        tone = "negative"
+    else:
+        tone = "neutral"
+    return {"emotion": tone, "confidence": round(min(0.5 + abs(polarity) / 2, 0.99), 2), "tone": tone, "keywords": []}
+
+
+SCORERS = {"lexicon": lexicon_emotion, "textblob": textblob_emotion}
+# Cheap enough to run on the request thread
+INLINE_MODES = {"lexicon"}
+
+
+def get_scorer(mode=EMOTION_MODE):
+    if mode not in SCORERS:
+        raise ValueError(f"Unknown AI_EMOTION_MODE: {mode}")
+    return SCORERS[mode]
@@ -175,6 +175,33 @@ CREATE TABLE IF NOT EXISTS ai_analytics (
     INDEX idx_metric_type (metric_type)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- ==================================================
+-- Table: ai_analytics_watermarks
+-- Last row rolled up into ai_analytics per source (python-backend/ai_analytics.py)
+-- ==================================================
+CREATE TABLE IF NOT EXISTS ai_analytics_watermarks (
+    source VARCHAR(50) PRIMARY KEY COMMENT 'chat, emotions, searches',
+    last_ts DATETIME NOT NULL,
+    last_id VARCHAR(100) NOT NULL DEFAULT '',
+    rows_processed BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ==================================================
+-- Table: ai_response_cache
+-- Persisted chatbot answers (python-backend/ai_response_cache.py, AI_CACHE_PERSIST=true)
+-- ==================================================
+CREATE TABLE IF NOT EXISTS ai_response_cache (
+    cache_key CHAR(64) PRIMARY KEY COMMENT 'sha256 of model, options, message and history',
+    message TEXT NOT NULL COMMENT 'Normalized question',
+    content TEXT NOT NULL,
+    latency_ms FLOAT NOT NULL DEFAULT 0 COMMENT 'Generation time the entry saves',
+    model VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- ==================================================
 -- Views for common queries
 -- ==================================================
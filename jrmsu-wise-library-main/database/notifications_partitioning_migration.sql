@@ -0,0 +1,69 @@
+-- ============================================================================
+-- JRMSU Library - Monthly partitioning for notifications / activity_log
+-- Converts tables created by older versions of notifications_schema.sql.
+-- Fresh installs already get this layout from notifications_schema.sql.
+-- ============================================================================
+
+USE jrmsu_library;
+
+-- ============================================================================
+-- 1. notifications
+-- ============================================================================
+-- Tables older than the per-recipient read state have no seq yet; add it
+-- (with the same keys as notifications_read_state_migration.sql) so the
+-- unique key rewrite below applies to every version.
+
+SET @has_seq := (
+  SELECT COUNT(*) FROM information_schema.COLUMNS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'notifications' AND COLUMN_NAME = 'seq'
+);
+SET @sql := IF(@has_seq = 0,
+  'ALTER TABLE notifications
+     ADD COLUMN seq BIGINT NOT NULL AUTO_INCREMENT AFTER id,
+     ADD UNIQUE KEY uq_seq (seq),
+     ADD INDEX idx_role_seq (target_role, seq),
+     ADD INDEX idx_user_seq (target_user_id, seq)',
+  'SELECT ''notifications.seq already present'' AS status');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- The partition column has to be part of every unique key.
+
+ALTER TABLE notifications
+  MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (id, created_at),
+  DROP INDEX uq_seq,
+  ADD UNIQUE KEY uq_seq (seq, created_at);
+
+ALTER TABLE notifications
+  PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+    PARTITION p_start VALUES LESS THAN (UNIX_TIMESTAMP('2025-10-01 00:00:00')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+  );
+
+-- ============================================================================
+-- 2. activity_log
+-- ============================================================================
+
+ALTER TABLE activity_log
+  MODIFY timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (id, timestamp);
+
+ALTER TABLE activity_log
+  PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION p_start VALUES LESS THAN (UNIX_TIMESTAMP('2025-10-01 00:00:00')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+  );
+
+-- ============================================================================
+-- 3. Monthly partitions
+-- ============================================================================
+-- p_future is split into monthly partitions by the retention job:
+--   python notification_retention.py partitions
+-- Schedule `python notification_retention.py run` daily to keep partitions
+-- ahead of time and archive expired months.
+
+SELECT 'Partitioning migration completed' AS status;
@@ -0,0 +1,61 @@
+-- ============================================================================
+-- JRMSU Library - Per-recipient notification read state
+-- Adds notifications.seq and the read mark / receipt tables to databases
+-- created before notifications_schema.sql had them. Safe to run twice.
+-- Run it before notifications_partitioning_migration.sql.
+-- ============================================================================
+
+USE jrmsu_library;
+
+-- ============================================================================
+-- 1. notifications.seq
+-- ============================================================================
+-- Existing rows are numbered in primary key order (ids start with the
+-- creation time in ms), new rows continue from there.
+
+SET @has_seq := (
+  SELECT COUNT(*) FROM information_schema.COLUMNS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'notifications' AND COLUMN_NAME = 'seq'
+);
+SET @sql := IF(@has_seq = 0,
+  'ALTER TABLE notifications
+     ADD COLUMN seq BIGINT NOT NULL AUTO_INCREMENT AFTER id,
+     ADD UNIQUE KEY uq_seq (seq),
+     ADD INDEX idx_role_seq (target_role, seq),
+     ADD INDEX idx_user_seq (target_user_id, seq)',
+  'SELECT ''notifications.seq already present'' AS status');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- ============================================================================
+-- 2. Read state tables
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS notification_read_marks (
+    user_id VARCHAR(50) PRIMARY KEY,
+    read_upto_seq BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE IF NOT EXISTS notification_read_receipts (
+    user_id VARCHAR(50) NOT NULL,
+    notification_id VARCHAR(50) NOT NULL,
+    seq BIGINT NOT NULL,
+    read_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, notification_id),
+    INDEX idx_user_seq (user_id, seq)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================================================
+-- 3. Carry over the legacy flag
+-- ============================================================================
+-- Personal notifications already marked read stay read. The shared flag of
+-- role notifications does not say which admin read them, so those start
+-- unread for everyone.
+
+INSERT IGNORE INTO notification_read_receipts (user_id, notification_id, seq)
+SELECT target_user_id, id, seq FROM notifications
+WHERE target_user_id IS NOT NULL AND read_flag = TRUE;
+
+SELECT 'Read state migration completed' AS status;
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+AI Analytics Rollups
+Incrementally aggregates ai_chat_history, ai_emotion_logs and
+ai_search_history into daily ai_analytics rows so dashboards read a few
+rows instead of scanning the raw tables.
+
+- each source keeps a watermark (ai_analytics_watermarks: last timestamp
+  + id); a run reads only rows after it, in chunks of AI_ANALYTICS_CHUNK
+- a chunk's upserts and its watermark move commit in one transaction, and
+  the watermark row is locked (SELECT ... FOR UPDATE), so concurrent
+  workers and crashes never count a row twice or skip it
+- rows younger than AI_ANALYTICS_LAG_SECONDS are left for the next run
+  (transactions still in flight may commit with older timestamps)
+- every ai_analytics row keeps mergeable counters in `metadata`;
+  metric_value is derived from them after each merge
+
+Daily metrics per user_role (chat) or 'all': messages, replies,
+avg_latency_ms, cache_hit_rate (percent), top_intents, emotion_mix,
+searches, avg_search_ms.
+
+Usage:
+    python ai_analytics.py run                          # process new rows
+    python ai_analytics.py backfill [YYYY-MM-DD] [chunk]  # rebuild from a date (default: everything)
+"""
+
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+AI_ANALYTICS_INTERVAL = int(os.getenv('AI_ANALYTICS_INTERVAL', '300'))
+AI_ANALYTICS_CHUNK = int(os.getenv('AI_ANALYTICS_CHUNK', '5000'))
+AI_ANALYTICS_LAG_SECONDS = int(os.getenv('AI_ANALYTICS_LAG_SECONDS', '60'))
+TOP_INTENTS = 5
+EPOCH = datetime(1970, 1, 2)
+
+# metric_type -> metric_value computed from the merged counters
+METRICS: Dict[str, Callable[[Counter], int]] = {
+    'messages': lambda c: c['count'],
+    'replies': lambda c: c['count'],
+    'avg_latency_ms': lambda c: round(c['sum'] / c['count']) if c['count'] else 0,
+    'cache_hit_rate': lambda c: round(100 * c['hits'] / c['total']) if c['total'] else 0,
+    'top_intents': lambda c: sum(c.values()),
+    'emotion_mix': lambda c: sum(v for k, v in c.items() if k.startswith('emotion:')),
+    'searches': lambda c: c['count'],
+    'avg_search_ms': lambda c: round(c['sum'] / c['count']) if c['count'] else 0,
+}
+
+Key = Tuple[date, str, str]  # (date, metric_type, user_role)
+
+
+def _meta(value: Any) -> Dict[str, Any]:
+    if not value:
+        return {}
+    if isinstance(value, (str, bytes)):
+        return json.loads(value)
+    return value
+
+
+def aggregate_chat(rows: List[Dict[str, Any]]) -> Dict[Key, Counter]:
+    out: Dict[Key, Counter] = defaultdict(Counter)
+    for row in rows:
+        day = row['timestamp'].date()
+        for role in (row.get('user_role') or 'student', 'all'):
+            if row['role'] == 'user':
+                out[(day, 'messages', role)]['count'] += 1
+                continue
+            meta = _meta(row.get('metadata'))
+            source = meta.get('source')
+            replies = out[(day, 'replies', role)]
+            replies['count'] += 1
+            if source:
+                replies[source] += 1
+                hits = out[(day, 'cache_hit_rate', role)]
+                hits['total'] += 1
+                hits['hits'] += 1 if source == 'cache' else 0
+            if source == 'llm' and meta.get('latencyMs') is not None:
+                latency = out[(day, 'avg_latency_ms', role)]
+                latency['sum'] += int(meta['latencyMs'])
+                latency['count'] += 1
+            if source == 'intent' and meta.get('intent'):
+                out[(day, 'top_intents', role)][meta['intent']] += 1
+    return out
+
+
+def aggregate_emotions(rows: List[Dict[str, Any]]) -> Dict[Key, Counter]:
+    out: Dict[Key, Counter] = defaultdict(Counter)
+    for row in rows:
+        mix = out[(row['detected_at'].date(), 'emotion_mix', 'all')]
+        mix[f"emotion:{row['detected_emotion']}"] += 1
+        mix[f"tone:{row['tone']}"] += 1
+    return out
+
+
+def aggregate_searches(rows: List[Dict[str, Any]]) -> Dict[Key, Counter]:
+    out: Dict[Key, Counter] = defaultdict(Counter)
+    for row in rows:
+        day = row['searched_at'].date()
+        searches = out[(day, 'searches', 'all')]
+        searches['count'] += 1
+        searches['aiEnhanced'] += 1 if row.get('ai_enhanced') else 0
+        searches['clicks'] += 1 if row.get('clicked_result_id') else 0
+        if row.get('search_duration_ms') is not None:
+            duration = out[(day, 'avg_search_ms', 'all')]
+            duration['sum'] += int(row['search_duration_ms'])
+            duration['count'] += 1
+    return out
+
+
+# source -> how to read rows after a (timestamp, id) watermark, and how to aggregate them
+SOURCES: Dict[str, Dict[str, Any]] = {
+    'chat': {
+        'time': 'timestamp',
+        'query': """
+            SELECT h.id, h.role, h.metadata, h.timestamp, s.user_role
+            FROM ai_chat_history h
+            LEFT JOIN ai_chat_sessions s ON s.id = h.session_id
+            WHERE h.role IN ('user', 'assistant')
+              AND (h.timestamp > %s OR (h.timestamp = %s AND h.id > %s))
+              AND h.timestamp < NOW() - INTERVAL %s SECOND
+            ORDER BY h.timestamp, h.id
+            LIMIT %s
+        """,
+        'aggregate': aggregate_chat,
+    },
+    'emotions': {
+        'time': 'detected_at',
+        'query': """
+            SELECT CAST(id AS CHAR) AS id, detected_emotion, tone, detected_at
+            FROM ai_emotion_logs
+            WHERE (detected_at > %s OR (detected_at = %s AND id > CAST(%s AS UNSIGNED)))
+              AND detected_at < NOW() - INTERVAL %s SECOND
+            ORDER BY detected_at, id
+            LIMIT %s
+        """,
+        'aggregate': aggregate_emotions,
+    },
+    'searches': {
+        'time': 'searched_at',
+        'query': """
+            SELECT id, ai_enhanced, clicked_result_id, search_duration_ms, searched_at
+            FROM ai_search_history
+            WHERE (searched_at > %s OR (searched_at = %s AND id > %s))
+              AND searched_at < NOW() - INTERVAL %s SECOND
+            ORDER BY searched_at, id
+            LIMIT %s
+        """,
+        'aggregate': aggregate_searches,
+    },
+}
+# Which metrics each source writes (cleared for the backfilled range)
+SOURCE_METRICS = {
+    'chat': ['messages', 'replies', 'avg_latency_ms', 'cache_hit_rate', 'top_intents'],
+    'emotions': ['emotion_mix'],
+    'searches': ['searches', 'avg_search_ms'],
+}
+
+
+_watermarks_ready = False
+
+
+def ensure_watermarks(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ai_analytics_watermarks (
+            source VARCHAR(50) PRIMARY KEY,
+            last_ts DATETIME NOT NULL,
+            last_id VARCHAR(100) NOT NULL DEFAULT '',
+            rows_processed BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    for source in SOURCES:
+        cursor.execute(
+            "INSERT INTO ai_analytics_watermarks (source, last_ts) VALUES (%s, %s) ON DUPLICATE KEY UPDATE source = source",
+            (source, EPOCH)
+        )
+
+
+def prepare_watermarks():
+    """Create the watermark table and rows once per process (before any FOR UPDATE on them)"""
+    global _watermarks_ready
+    if _watermarks_ready:
+        return
+    from db import get_db_cursor
+    with get_db_cursor() as cursor:
+        ensure_watermarks(cursor)
+    _watermarks_ready = True
+
+
+def merge(cursor, aggregates: Dict[Key, Counter]):
+    """Add chunk counters to the stored ones and upsert the recomputed rows"""
+    for (day, metric, role), counts in aggregates.items():
+        cursor.execute(
+            "SELECT metadata FROM ai_analytics WHERE date = %s AND metric_type = %s AND user_role = %s FOR UPDATE",
+            (day, metric, role)
+        )
+        row = cursor.fetchone()
+        merged = Counter(_meta(row['metadata']).get('counts') if row else None) + counts
+        metadata = {'counts': dict(merged)}
+        if metric == 'top_intents':
+            metadata['top'] = merged.most_common(TOP_INTENTS)
+        cursor.execute(
+            """
+            INSERT INTO ai_analytics (date, metric_type, metric_value, user_role, metadata)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE metric_value = VALUES(metric_value), metadata = VALUES(metadata)
+            """,
+            (day, metric, METRICS[metric](merged), role, json.dumps(metadata))
+        )
+
+
+def rollup_chunk(source: str, chunk: int = AI_ANALYTICS_CHUNK, lag: int = AI_ANALYTICS_LAG_SECONDS) -> int:
+    """Process the next chunk of one source; returns the number of rows rolled up"""
+    from db import get_db_cursor
+    spec = SOURCES[source]
+    prepare_watermarks()
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT last_ts, last_id FROM ai_analytics_watermarks WHERE source = %s FOR UPDATE", (source,))
+        mark = cursor.fetchone()
+        cursor.execute(spec['query'], (mark['last_ts'], mark['last_ts'], mark['last_id'], lag, chunk))
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+        merge(cursor, spec['aggregate'](rows))
+        last = rows[-1]
+        cursor.execute(
+            "UPDATE ai_analytics_watermarks SET last_ts = %s, last_id = %s, rows_processed = rows_processed + %s WHERE source = %s",
+            (last[spec['time']], last['id'], len(rows), source)
+        )
+    return len(rows)
+
+
+def run_rollup(chunk: int = AI_ANALYTICS_CHUNK, max_chunks: Optional[int] = None) -> Dict[str, int]:
+    """Roll up everything past the watermarks, chunk by chunk (each chunk commits on its own)"""
+    start = time.perf_counter()
+    out = {}
+    for source in SOURCES:
+        total = chunks = 0
+        while max_chunks is None or chunks < max_chunks:
+            try:
+                n = rollup_chunk(source, chunk)
+            except Exception as e:
+                print(f"Error rolling up AI analytics ({source}): {e}")
+                metrics.incr('ai.analytics.errors')
+                break
+            total += n
+            chunks += 1
+            if n < chunk:
+                break
+        out[source] = total
+        metrics.incr(f'ai.analytics.rows.{source}', total)
+    metrics.observe('ai.analytics.run_ms', (time.perf_counter() - start) * 1000.0)
+    return out
+
+
+def backfill(since: Optional[date] = None, chunk: int = AI_ANALYTICS_CHUNK) -> Dict[str, int]:
+    """
+    Rebuild the rollups from `since` (or from the beginning): clears the
+    rolled-up rows in that range, rewinds the watermarks to `since` (never
+    forward: a source still behind it keeps its place, so no rows are skipped)
+    and replays the raw tables chunk by chunk. Interrupted backfills resume
+    with run_rollup().
+    """
+    from db import get_db_cursor
+    start = datetime.combine(since, datetime.min.time()) if since else EPOCH
+    prepare_watermarks()
+    with get_db_cursor() as cursor:
+        for source, names in SOURCE_METRICS.items():
+            cursor.execute("SELECT last_ts FROM ai_analytics_watermarks WHERE source = %s FOR UPDATE", (source,))
+            mark = cursor.fetchone()
+            cursor.execute(
+                f"DELETE FROM ai_analytics WHERE date >= %s AND metric_type IN ({', '.join(['%s'] * len(names))})",
+                (start.date(), *names)
+            )
+            if mark and mark['last_ts'] < start:
+                continue
+            cursor.execute(
+                "UPDATE ai_analytics_watermarks SET last_ts = %s, last_id = '' WHERE source = %s",
+                (start, source)
+            )
+    return run_rollup(chunk)
+
+
+def query_metrics(start: date, end: date, role: str = 'all', metric_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    from db import execute_query
+    names = metric_types or list(METRICS)
+    rows = execute_query(
+        f"""
+        SELECT date, metric_type, metric_value, user_role, metadata FROM ai_analytics
+        WHERE date BETWEEN %s AND %s AND user_role = %s AND metric_type IN ({', '.join(['%s'] * len(names))})
+        ORDER BY date, metric_type
+        """,
+        (start, end, role, *names), fetch_all=True
+    ) or []
+    return [{**r, 'date': r['date'].isoformat(), 'metadata': _meta(r.get('metadata'))} for r in rows]
+
+
+def watermarks() -> List[Dict[str, Any]]:
+    from db import execute_query
+    rows = execute_query("SELECT source, last_ts, last_id, rows_processed, updated_at FROM ai_analytics_watermarks",
+                         fetch_all=True) or []
+    return [{k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in r.items()} for r in rows]
+
+
+def register_ai_analytics_endpoints(app, socketio=None):
+    """Dashboard read endpoint, manual rollup/backfill, and the periodic rollup"""
+    from flask import jsonify, request
+
+    @app.route('/api/ai/analytics', methods=['GET'])
+    def ai_analytics_metrics():
+        """?from=YYYY-MM-DD&to=YYYY-MM-DD&role=all|student|admin|guest&metric=messages,replies"""
+        try:
+            end = date.fromisoformat(request.args.get('to') or date.today().isoformat())
+            start = date.fromisoformat(request.args.get('from') or (end - timedelta(days=29)).isoformat())
+        except ValueError:
+            return jsonify(error='from/to must be YYYY-MM-DD'), 400
+        names = [m for m in (request.args.get('metric') or '').split(',') if m in METRICS] or None
+        try:
+            return jsonify(items=query_metrics(start, end, request.args.get('role') or 'all', names))
+        except Exception as e:
+            return jsonify(error=str(e)), 500
+
+    @app.route('/api/admin/ai-analytics/rollup', methods=['POST'])
+    def ai_analytics_rollup():
+        """{"backfill": true, "since": "YYYY-MM-DD"} rebuilds; otherwise processes new rows"""
+        body = request.get_json(silent=True) or {}
+        try:
+            if body.get('backfill'):
+                since = date.fromisoformat(body['since']) if body.get('since') else None
+                return jsonify(ok=True, rows=backfill(since))
+            return jsonify(ok=True, rows=run_rollup())
+        except ValueError:
+            return jsonify(error='since must be YYYY-MM-DD'), 400
+        except Exception as e:
+            return jsonify(ok=False, error=str(e)), 500
+
+    @app.route('/api/admin/ai-analytics/status', methods=['GET'])
+    def ai_analytics_status():
+        try:
+            marks = watermarks()
+        except Exception as e:
+            marks = {'error': str(e)}
+        return jsonify(watermarks=marks, runMs=metrics.summary('ai.analytics.run_ms'))
+
+    try:
+        prepare_watermarks()
+    except Exception as e:
+        print(f"⚠️  AI analytics watermarks not created: {e}")
+
+    if socketio is not None:
+        def _rollup_loop():
+            while True:
+                socketio.sleep(AI_ANALYTICS_INTERVAL)
+                run_rollup()
+
+        socketio.start_background_task(_rollup_loop)
+    print("✅ AI analytics endpoints registered")
+
+
+if __name__ == '__main__':
+    cmd = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    if cmd == 'run':
+        print(json.dumps(run_rollup(), indent=2))
+    elif cmd == 'backfill':
+        since_arg = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2] != 'all' else None
+        chunk_arg = int(sys.argv[3]) if len(sys.argv) > 3 else AI_ANALYTICS_CHUNK
+        print(json.dumps(backfill(since_arg, chunk_arg), indent=2))
+    else:
+        print(__doc__)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+AI Conversation State
+Keeps the sanitized turns of each chat session on the server (ai_chat_history,
+with an in-memory hot cache per session) so clients send only
+{sessionId, message}. Each message is sanitized once, when it arrives,
+instead of the whole client history being uploaded and re-cleaned on every
+request.
+
+Old clients that still send `history` keep working: their history is used
+as before, and the exchange is still recorded when they pass a sessionId.
+Sessions belong to the user that created them (guest for anonymous callers).
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import bleach
+import metrics
+import ollama_client
+from ai_memory import ensure_session
+
+AI_CONVERSATION_MAX_SESSIONS = int(os.getenv('AI_CONVERSATION_MAX_SESSIONS', '2000'))
+AI_CONVERSATION_TTL = int(os.getenv('AI_CONVERSATION_TTL', '900'))
+MAX_SESSION_ID = 100  # ai_chat_sessions.id is VARCHAR(100)
+
+_id_lock = threading.Lock()
+_last_id_ms = 0
+
+
+def message_id() -> str:
+    """
+    Time-ordered ai_chat_history id (ms, strictly increasing per process, plus
+    a random suffix). `timestamp` only has second resolution, so turns are
+    ordered by (timestamp, id) and a reply never sorts before its question.
+    """
+    global _last_id_ms
+    with _id_lock:
+        _last_id_ms = max(int(time.time() * 1000), _last_id_ms + 1)
+        ms = _last_id_ms
+    return f"{ms:013d}-{uuid.uuid4().hex[:12]}"
+
+
+class SessionAccessError(Exception):
+    """Session id is invalid or belongs to another user"""
+
+
+class ConversationStore:
+    """Hot cache of session turns in front of ai_chat_history"""
+
+    def __init__(
+        self,
+        max_sessions: int = AI_CONVERSATION_MAX_SESSIONS,
+        ttl: int = AI_CONVERSATION_TTL,
+        max_turns: int = ollama_client.HISTORY_MAX_TURNS,
+        spawn: Optional[Callable[..., Any]] = None,
+        persist: bool = True
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.spawn = spawn or (lambda fn, *args: threading.Thread(target=fn, args=args, daemon=True).start())
+        self.persist = persist
+        self._lock = threading.Lock()
+        # session id -> {'owner', 'turns', 'loadedAt'}
+        self._sessions: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+    def history(self, session_id: str, user_id: Optional[str] = None) -> List[Dict[str, str]]:
+        """Sanitized turns of the session (oldest first); raises SessionAccessError"""
+        entry = self._entry(session_id, user_id)
+        with self._lock:
+            return list(entry['turns'])
+
+    def record(self, session_id: str, user_id: Optional[str], user_message: str, reply: str,
+               meta: Optional[Dict[str, Any]] = None):
+        """Append a user message and the assistant reply (both already sanitized); meta is stored with the reply"""
+        turns = [{'role': 'user', 'content': user_message}, {'role': 'assistant', 'content': reply}]
+        entry = self._entry(session_id, user_id)
+        with self._lock:
+            entry['turns'].extend(turns)
+            del entry['turns'][:-self.max_turns]
+        metrics.incr('ai.conversation.turns', 2)
+        if self.persist:
+            self.spawn(self._save, session_id, entry['owner'], turns, meta)
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    # ---- internals ----
+
+    def _entry(self, session_id: str, user_id: Optional[str]) -> Dict[str, Any]:
+        if not session_id or len(session_id) > MAX_SESSION_ID:
+            raise SessionAccessError('Invalid sessionId')
+        caller = user_id or 'guest'
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and now - entry['loadedAt'] > self.ttl:
+                entry = None  # another worker may have appended; reload
+            if entry is not None:
+                self._sessions.move_to_end(session_id)
+        if entry is None:
+            metrics.incr('ai.conversation.cache_misses')
+            try:
+                entry = self._load(session_id, caller) if self.persist else {'owner': caller, 'turns': []}
+                entry['loadedAt'] = now
+            except Exception as e:
+                print(f"Error loading AI conversation {session_id}: {e}")
+                entry = {'owner': caller, 'turns': [], 'loadedAt': 0}  # retried on next access
+            with self._lock:
+                self._sessions[session_id] = entry
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+        else:
+            metrics.incr('ai.conversation.cache_hits')
+        if entry['owner'] != caller:
+            raise SessionAccessError('Session belongs to another user')
+        return entry
+
+    def _load(self, session_id: str, caller: str) -> Dict[str, Any]:
+        from db import execute_query
+        session = execute_query("SELECT user_id FROM ai_chat_sessions WHERE id = %s", (session_id,), fetch_one=True)
+        if not session:
+            return {'owner': caller, 'turns': []}
+        rows = execute_query(
+            """
+            SELECT role, content FROM (
+                SELECT id, role, content, timestamp FROM ai_chat_history
+                WHERE session_id = %s AND role IN ('user', 'assistant')
+                ORDER BY timestamp DESC, id DESC LIMIT %s
+            ) recent ORDER BY timestamp ASC, id ASC
+            """,
+            (session_id, self.max_turns), fetch_all=True
+        ) or []
+        return {'owner': session['user_id'], 'turns': [{'role': r['role'], 'content': r['content']} for r in rows]}
+
+    def _save(self, session_id: str, owner: str, turns: List[Dict[str, str]], meta: Optional[Dict[str, Any]] = None):
+        from db import execute_query
+        try:
+            ensure_session(session_id, owner)
+            for turn in turns:
+                metadata = json.dumps(meta) if meta and turn['role'] == 'assistant' else None
+                execute_query(
+                    """
+                    INSERT INTO ai_chat_history (id, session_id, user_id, role, content, metadata)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    """,
+                    (message_id(), session_id, owner, turn['role'], turn['content'], metadata)
+                )
+            execute_query(
+                "UPDATE ai_chat_sessions SET message_count = message_count + %s WHERE id = %s",
+                (len(turns), session_id)
+            )
+        except Exception as e:
+            print(f"Error saving AI conversation {session_id}: {e}")
+
+
+_store: Optional[ConversationStore] = None
+
+
+def init_conversation_store(socketio=None) -> ConversationStore:
+    """Create the process-wide store (saves run as socketio background tasks when given)"""
+    global _store
+    _store = ConversationStore(spawn=socketio.start_background_task if socketio is not None else None)
+    return _store
+
+
+def get_conversation_store() -> ConversationStore:
+    global _store
+    if _store is None:
+        _store = ConversationStore()
+    return _store
+
+
+def chat_messages(body: Dict[str, Any], user_id: Optional[str] = None) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """
+    (messages, session_id) for a chat request. {sessionId, message} uses the
+    server-held history; bodies with `history` (old clients) use that instead.
+    """
+    session_id = body.get('sessionId') or None
+    if session_id is None or 'history' in body:
+        metrics.incr('ai.conversation.client_history')
+        if session_id is not None:
+            get_conversation_store().history(session_id, user_id)  # ownership check
+        return ollama_client.build_chat_messages(body), session_id
+    message = bleach.clean((body.get('message') or '').strip(), strip=True)
+    history = get_conversation_store().history(session_id, user_id)
+    metrics.incr('ai.conversation.server_history')
+    return [{"role": "system", "content": ollama_client.SYSTEM_PROMPT}] + history + [{"role": "user", "content": message}], session_id
+
+
+def record_exchange(session_id: Optional[str], user_id: Optional[str], messages: List[Dict[str, str]], reply: str,
+                    meta: Optional[Dict[str, Any]] = None):
+    """
+    Store the new message and reply of a finished chat (no-op without a session).
+    meta says how the reply was produced ({'source': 'llm' | 'cache' | 'intent',
+    'latencyMs', 'intent'}); ai_analytics rolls it up.
+    """
+    if not session_id or not reply:
+        return
+    try:
+        # The reply is cleaned once here, like incoming messages, so stored turns are always sanitized
+        get_conversation_store().record(session_id, user_id, messages[-1]['content'], bleach.clean(reply, strip=True), meta)
+    except SessionAccessError:
+        pass
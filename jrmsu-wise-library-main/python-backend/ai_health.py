@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+AI Health Prober
+Background probe of the Ollama server so /ai/health answers from cache
+instead of making a live GET /api/tags per call, plus the wiring of the
+ollama_client circuit breaker:
+
+- every AI_HEALTH_INTERVAL seconds: GET /api/tags, is MODEL_NAME installed,
+  latency; failures count towards opening the breaker
+- while the breaker is open nothing is probed until its reset timeout, then
+  the probe is the half-open trial call that closes or re-opens it
+- breaker transitions are broadcast as 'ai.status' socket events
+- metrics: ai.health.up / latency_ms / model_available (gauges),
+  ai.breaker.state (0 closed, 1 half_open, 2 open), ai.breaker.<state>
+  transition counters, ai.breaker.fast_failures
+"""
+
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+import metrics
+import ollama_client
+from ollama_client import MODEL_NAME, CircuitBreaker
+
+AI_HEALTH_INTERVAL = float(os.getenv('AI_HEALTH_INTERVAL', '10'))
+AI_HEALTH_TIMEOUT = float(os.getenv('AI_HEALTH_TIMEOUT', '3'))
+
+FALLBACK_MESSAGE = (
+    "Jose is taking a short break right now. You can still search the catalog, check your "
+    "borrowed books and reservations, and ask again in a minute."
+)
+_STATE_GAUGE = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+
+class OllamaProber:
+    """Caches Ollama availability/latency and drives the breaker's half-open probes"""
+
+    def __init__(self, breaker: CircuitBreaker = ollama_client.breaker, interval: float = AI_HEALTH_INTERVAL,
+                 timeout: float = AI_HEALTH_TIMEOUT, sleep: Callable[[float], None] = time.sleep):
+        self.breaker = breaker
+        self.interval = interval
+        self.timeout = timeout
+        self.sleep = sleep
+        self.status: Dict[str, Any] = {'ollama': None, 'modelAvailable': None, 'latencyMs': None,
+                                       'checkedAt': None, 'error': None}
+
+    def probe_once(self) -> Dict[str, Any]:
+        """One probe; skipped (cached status kept) while the breaker is cooling down"""
+        if not self.breaker.allow():
+            return self.snapshot()
+        if self.breaker.state == CircuitBreaker.HALF_OPEN:
+            metrics.incr('ai.breaker.half_open_probes')
+        start = time.perf_counter()
+        try:
+            names = ollama_client.tags(timeout=self.timeout)
+            latency = (time.perf_counter() - start) * 1000.0
+            available = any(n == MODEL_NAME or n.split(':')[0] == MODEL_NAME for n in names)
+            self.status = {'ollama': True, 'modelAvailable': available, 'latencyMs': round(latency, 1),
+                           'checkedAt': time.time(), 'error': None if available else f'{MODEL_NAME} is not installed'}
+            if available:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            metrics.set_gauge('ai.health.latency_ms', latency)
+        except Exception as e:
+            self.status = {'ollama': False, 'modelAvailable': False, 'latencyMs': None,
+                           'checkedAt': time.time(), 'error': str(e)}
+            self.breaker.record_failure()
+        metrics.set_gauge('ai.health.up', 1 if self.status['ollama'] else 0)
+        metrics.set_gauge('ai.health.model_available', 1 if self.status['modelAvailable'] else 0)
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        out = dict(self.status)
+        out['breaker'] = self.breaker.state
+        if self.breaker.state == CircuitBreaker.OPEN:
+            out['retryAfter'] = round(self.breaker.retry_after(), 1)
+        return out
+
+    def run(self):
+        while True:
+            self.probe_once()
+            self.sleep(self.interval)
+
+
+_prober: Optional[OllamaProber] = None
+
+
+def init_ai_health(socketio=None) -> OllamaProber:
+    """Create the prober, publish breaker transitions and start probing in the background"""
+    global _prober
+    _prober = OllamaProber(sleep=socketio.sleep if socketio is not None else time.sleep)
+    breaker = _prober.breaker
+    metrics.set_gauge('ai.breaker.state', _STATE_GAUGE[breaker.state])
+
+    def _on_change(old: str, new: str):
+        metrics.incr(f'ai.breaker.{new}')
+        metrics.set_gauge('ai.breaker.state', _STATE_GAUGE[new])
+        print(f"AI circuit breaker: {old} -> {new}")
+        if socketio is not None:
+            socketio.emit('ai.status', {'breaker': new, 'previous': old, **_prober.status})
+
+    breaker.on_change(_on_change)
+    if socketio is not None:
+        socketio.start_background_task(_prober.run)
+    return _prober
+
+
+def get_ai_health() -> OllamaProber:
+    global _prober
+    if _prober is None:
+        _prober = OllamaProber()
+    return _prober
+
+
+def unavailable() -> bool:
+    """True while the breaker is open: skip the queue and answer with FALLBACK_MESSAGE"""
+    if get_ai_health().breaker.is_open():
+        metrics.incr('ai.breaker.fast_failures')
+        return True
+    return False
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+AI History Search
+Admin full-text search over ai_chat_history (FULLTEXT ft_content) and
+ai_search_history (FULLTEXT ft_query) with MATCH ... AGAINST, so staff can
+find conversations without exporting the tables.
+
+    GET /api/admin/ai-history/search?q=...&role=&userId=&sessionId=&from=&to=&mode=&page=&pageSize=
+    GET /api/admin/ai-search-history/search?q=...&userId=&aiEnhanced=&from=&to=&mode=&page=&pageSize=
+
+- mode=natural (default): any word may match, ranked by relevance
+- mode=all: every word must appear (words match as prefixes, "quoted
+  phrases" exactly, -word excludes); still ranked by natural relevance
+- each item carries `score`, a `snippet` of the text around the first match
+  and `highlights` ([start, end] offsets of the matches in the snippet)
+- pages (query + filters + page) are cached for AI_HISTORY_SEARCH_CACHE_TTL
+  seconds, LRU-bounded by AI_HISTORY_SEARCH_CACHE_MAX; &fresh=1 bypasses it
+
+InnoDB ignores words shorter than innodb_ft_min_token_size (3) and its
+stopwords, so those are dropped before the query is built.
+
+Usage:
+    python ai_history_search.py chat "overdue fine" [page]
+    python ai_history_search.py searches "marine biology" [page]
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+
+AI_HISTORY_SEARCH_CACHE_MAX = int(os.getenv('AI_HISTORY_SEARCH_CACHE_MAX') or '200')
+AI_HISTORY_SEARCH_CACHE_TTL = int(os.getenv('AI_HISTORY_SEARCH_CACHE_TTL') or '60')
+AI_HISTORY_SEARCH_PAGE_MAX = int(os.getenv('AI_HISTORY_SEARCH_PAGE_MAX') or '100')
+AI_HISTORY_SNIPPET_CHARS = int(os.getenv('AI_HISTORY_SNIPPET_CHARS') or '160')
+MIN_TOKEN = 3
+
+# InnoDB's default full-text stopword list (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD)
+STOPWORDS = frozenset(
+    'a about an are as at be by com de en for from how i in is it la of on or that the this to '
+    'was what when where who will with und www'.split()
+)
+
+# source -> table, searched column, timestamp column, selected fields, filter params,
+# allowed values per filter and a condition every row must meet
+SOURCES: Dict[str, Dict[str, Any]] = {
+    'chat': {
+        'table': 'ai_chat_history',
+        'column': 'content',
+        'time': 'timestamp',
+        'fields': 'id, session_id, user_id, role, content, timestamp',
+        'filters': {'role': 'role', 'userId': 'user_id', 'sessionId': 'session_id'},
+        'choices': {'role': ('user', 'assistant')},
+        # System prompts and other internal rows are not conversation turns
+        'where': "role IN ('user', 'assistant')",
+    },
+    'searches': {
+        'table': 'ai_search_history',
+        'column': 'query',
+        'time': 'searched_at',
+        'fields': 'id, user_id, query, ai_enhanced, results_count, top_result_id, clicked_result_id, '
+                  'search_duration_ms, searched_at',
+        'filters': {'userId': 'user_id', 'aiEnhanced': 'ai_enhanced'},
+    },
+}
+
+_TOKEN = re.compile(r'(-?)"([^"]*)"|(-?)(\S+)')
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in re.findall(r'\w+', text.lower()) if len(w) >= MIN_TOKEN and w not in STOPWORDS]
+
+
+def parse_query(q: str) -> Tuple[List[str], List[str], List[str]]:
+    """(words, quoted phrases, excluded words) of a search box query"""
+    words, phrases, excluded = [], [], []
+    for neg_phrase, phrase, neg, word in _TOKEN.findall(q or ''):
+        if phrase:
+            kept = ' '.join(re.findall(r'\w+', phrase.lower()))
+            if kept and not neg_phrase:
+                phrases.append(kept)
+            elif kept:
+                excluded.extend(_words(kept))
+        elif neg:
+            excluded.extend(_words(word))
+        else:
+            words.extend(_words(word))
+    return list(dict.fromkeys(words)), list(dict.fromkeys(phrases)), list(dict.fromkeys(excluded))
+
+
+def natural_query(words: List[str], phrases: List[str]) -> str:
+    return ' '.join(words + phrases)
+
+
+def boolean_query(words: List[str], phrases: List[str], excluded: List[str]) -> str:
+    parts = [f'+{w}*' for w in words] + [f'+"{p}"' for p in phrases] + [f'-{w}' for w in excluded]
+    return ' '.join(parts)
+
+
+def snippet(text: str, words: List[str], phrases: List[str], width: int = AI_HISTORY_SNIPPET_CHARS) -> Dict[str, Any]:
+    """Window of `text` around the first match, with [start, end] offsets of every match in it"""
+    text = re.sub(r'\s+', ' ', text or '').strip()
+    patterns = [r'\b' + re.escape(p).replace(r'\ ', r'\W+') + r'\b' for p in phrases]
+    patterns += [r'\b' + re.escape(w) + r'\w*' for w in words]
+    found = re.compile('|'.join(patterns), re.IGNORECASE) if patterns else None
+    first = found.search(text) if found else None
+    start = 0
+    if first and len(text) > width:
+        start = max(0, min(first.start() - width // 3, len(text) - width))
+        if start:
+            space = text.find(' ', start)
+            start = space + 1 if 0 <= space < first.start() else start
+    end = min(len(text), start + width)
+    if end < len(text):
+        space = text.rfind(' ', start, end)
+        end = space if space > start else end
+    prefix = '…' if start else ''
+    window = prefix + text[start:end] + ('…' if end < len(text) else '')
+    highlights = [[m.start() + len(prefix), m.end() + len(prefix)]
+                  for m in found.finditer(text[start:end])] if found else []
+    return {'snippet': window, 'highlights': highlights}
+
+
+def _row(row: Dict[str, Any], source: Dict[str, Any], words: List[str], phrases: List[str]) -> Dict[str, Any]:
+    item = {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in row.items()}
+    item['score'] = round(float(item.get('score') or 0), 4)
+    item.update(snippet(row[source['column']], words, phrases))
+    return item
+
+
+class SearchCache:
+    """LRU + TTL map of search parameters -> result page"""
+
+    def __init__(self, max_entries: int = AI_HISTORY_SEARCH_CACHE_MAX, ttl: int = AI_HISTORY_SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry['at'] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry['page']
+
+    def put(self, key: str, page: Dict[str, Any]):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = {'page': page, 'at': time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+search_cache = SearchCache()
+
+
+def search(
+    source_name: str,
+    q: str,
+    mode: str = 'natural',
+    filters: Optional[Dict[str, Any]] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    page: int = 1,
+    page_size: int = 20,
+    fresh: bool = False
+) -> Dict[str, Any]:
+    """One page of matches ranked by relevance; ValueError on an unusable query"""
+    source = SOURCES[source_name]
+    if mode not in ('natural', 'all'):
+        raise ValueError('mode must be natural or all')
+    words, phrases, excluded = parse_query(q)
+    if not words and not phrases:
+        raise ValueError(f'q needs at least one word of {MIN_TOKEN}+ letters that is not a stopword')
+    page = max(1, page)
+    page_size = max(1, min(page_size, AI_HISTORY_SEARCH_PAGE_MAX))
+    filters = {k: v for k, v in (filters or {}).items() if k in source['filters'] and v not in (None, '')}
+    for name, allowed in source.get('choices', {}).items():
+        if name in filters and filters[name] not in allowed:
+            raise ValueError(f"{name} must be one of: {', '.join(allowed)}")
+
+    key = json.dumps([source_name, words, phrases, excluded, mode, filters,
+                      str(since), str(until), page, page_size], sort_keys=True)
+    if not fresh:
+        cached = search_cache.get(key)
+        if cached is not None:
+            metrics.incr('ai.history_search.cache_hits')
+            return {**cached, 'cached': True}
+    metrics.incr('ai.history_search.cache_misses')
+
+    ranking = natural_query(words, phrases)
+    column = source['column']
+    where = [f"MATCH({column}) AGAINST(%s IN BOOLEAN MODE)" if mode == 'all'
+             else f"MATCH({column}) AGAINST(%s IN NATURAL LANGUAGE MODE)"]
+    params: List[Any] = [boolean_query(words, phrases, excluded) if mode == 'all' else ranking]
+    if source.get('where'):
+        where.append(source['where'])
+    if mode == 'natural' and excluded:
+        where.append(f"NOT MATCH({column}) AGAINST(%s IN BOOLEAN MODE)")
+        params.append(' '.join(excluded))
+    for name, value in filters.items():
+        where.append(f"{source['filters'][name]} = %s")
+        params.append(value)
+    if since:
+        where.append(f"{source['time']} >= %s")
+        params.append(since)
+    if until:
+        where.append(f"{source['time']} < %s")
+        params.append(until + timedelta(days=1))
+    clause = ' AND '.join(where)
+
+    from db import execute_query
+    start = time.perf_counter()
+    total = (execute_query(f"SELECT COUNT(*) AS total FROM {source['table']} WHERE {clause}",
+                           tuple(params), fetch_one=True) or {}).get('total', 0)
+    rows = []
+    if total > (page - 1) * page_size:
+        rows = execute_query(
+            f"""SELECT {source['fields']}, MATCH({column}) AGAINST(%s IN NATURAL LANGUAGE MODE) AS score
+                FROM {source['table']} WHERE {clause}
+                ORDER BY score DESC, {source['time']} DESC
+                LIMIT %s OFFSET %s""",
+            tuple([ranking] + params + [page_size, (page - 1) * page_size]), fetch_all=True
+        ) or []
+    took_ms = (time.perf_counter() - start) * 1000.0
+    metrics.observe('ai.history_search.ms', took_ms)
+
+    result = {
+        'items': [_row(r, source, words, phrases) for r in rows],
+        'total': total,
+        'page': page,
+        'pageSize': page_size,
+        'pages': (total + page_size - 1) // page_size,
+        'terms': words + phrases,
+        'tookMs': round(took_ms, 1),
+        'cached': False,
+    }
+    search_cache.put(key, result)
+    return result
+
+
+def _day(value: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(value) if value else None
+
+
+def register_ai_history_search_endpoints(app):
+    """Admin full-text search over chat and search history"""
+    from flask import jsonify, request
+
+    def _search(source_name: str, filter_args: Dict[str, Any]):
+        args = request.args
+        try:
+            return jsonify(search(
+                source_name,
+                args.get('q', ''),
+                mode=args.get('mode') or 'natural',
+                filters=filter_args,
+                since=_day(args.get('from')),
+                until=_day(args.get('to')),
+                page=int(args.get('page') or 1),
+                page_size=int(args.get('pageSize') or 20),
+                fresh=args.get('fresh', '').lower() in ('1', 'true'),
+            ))
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        except Exception as e:
+            return jsonify(error=str(e)), 500
+
+    @app.route('/api/admin/ai-history/search', methods=['GET'])
+    def ai_history_search():
+        args = request.args
+        return _search('chat', {'role': args.get('role'), 'userId': args.get('userId'),
+                                'sessionId': args.get('sessionId')})
+
+    @app.route('/api/admin/ai-search-history/search', methods=['GET'])
+    def ai_search_history_search():
+        enhanced = request.args.get('aiEnhanced')
+        return _search('searches', {'userId': request.args.get('userId'),
+                                    'aiEnhanced': None if not enhanced else int(enhanced.lower() in ('1', 'true'))})
+
+    print("✅ AI history search endpoints registered")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] in SOURCES:
+        page_arg = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+        print(json.dumps(search(sys.argv[1], sys.argv[2], page=page_arg, fresh=True), indent=2, default=str))
+    else:
+        print(__doc__)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+AI Intent Fast-Path
+Answers simple, exact-answer chat messages (library hours, borrowing rules,
+"what books do I have borrowed", "my reservations") straight from config and
+the database, before anything is sent to Ollama. Open-ended questions fall
+through to the LLM.
+
+Handlers register with @intent(name, patterns); the first intent whose pattern
+matches a short message wins. Fast-path vs LLM ratios are exposed at
+GET /api/ai/intents/stats.
+"""
+
+import os
+import re
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+
+from flask import jsonify
+import metrics
+
+LIBRARY_OPEN = os.getenv('LIBRARY_OPEN_TIME', '08:00')
+LIBRARY_CLOSE = os.getenv('LIBRARY_CLOSE_TIME', '17:00')
+LIBRARY_DAYS = os.getenv('LIBRARY_DAYS', 'Monday to Friday')
+# Longer messages are treated as open-ended and go to the LLM
+INTENT_MAX_WORDS = int(os.getenv('AI_INTENT_MAX_WORDS', '14'))
+
+# A second clause ("... and recommend three books") or a second question makes
+# the message open-ended; "open and close" still counts as one question
+_COMPOUND = re.compile(r'\b(and|also|then|plus|but)\b (?!(open|opens|opening|close|closes|closing|closed)\b)')
+
+# handler(user_id) -> answer, or None to fall through to the LLM
+Handler = Callable[[Optional[str]], Optional[str]]
+_REGISTRY: List[Tuple[str, List[Pattern], Handler]] = []
+
+
+def intent(name: str, patterns: List[str]):
+    """Register a fast-path handler for messages matching any of the patterns"""
+    compiled = [re.compile(p) for p in patterns]
+
+    def decorator(fn: Handler) -> Handler:
+        _REGISTRY.append((name, compiled, fn))
+        return fn
+    return decorator
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', re.sub(r"[^\w\s']", ' ', (text or '').lower())).strip()
+
+
+def classify(message: str) -> Optional[Tuple[str, Handler]]:
+    text = _normalize(message)
+    if not text or len(text.split()) > INTENT_MAX_WORDS:
+        return None
+    if (message or '').count('?') > 1 or _COMPOUND.search(text):
+        return None
+    for name, patterns, handler in _REGISTRY:
+        if any(p.search(text) for p in patterns):
+            return name, handler
+    return None
+
+
+def answer(message: str, user_id: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """Fast-path answer {'intent', 'content'} or None to use the LLM"""
+    start = time.perf_counter()
+    match = classify(message)
+    content = None
+    if match:
+        name, handler = match
+        try:
+            content = handler(user_id)
+        except Exception as e:
+            print(f"Error in AI intent {name}: {e}")
+    if content is None:
+        metrics.incr('ai.intent.llm')
+        return None
+    metrics.incr('ai.intent.fast_path')
+    metrics.incr(f'ai.intent.{name}')
+    metrics.observe('ai.intent.latency_ms', (time.perf_counter() - start) * 1000.0)
+    return {'intent': name, 'content': content}
+
+
+def _clock(hhmm: str) -> str:
+    return datetime.strptime(hhmm, '%H:%M').strftime('%I:%M %p').lstrip('0')
+
+
+def _date(value) -> str:
+    if isinstance(value, datetime):
+        return value.strftime('%b %d, %Y %I:%M %p')
+    return str(value or 'n/a')
+
+
+def _sign_in_needed() -> str:
+    return "Please sign in so I can look up your library account."
+
+
+def library_hours_text() -> str:
+    return (f"The library is open {LIBRARY_DAYS}, {_clock(LIBRARY_OPEN)} to {_clock(LIBRARY_CLOSE)}. "
+            f"Please remember to log out at the entrance before leaving.")
+
+
+BORROWING_RULES = (
+    "Borrowing rules: books used inside the campus are due the same day at 4:00 PM "
+    "(next day 4:00 PM if borrowed after 4:00 PM). Books taken outside the campus can be "
+    "kept for one night and are due the next day at 4:00 PM. A book becomes overdue after "
+    "7 business days (weekends are not counted)."
+)
+
+RESERVE_HOWTO = (
+    "To reserve a book: search for it in the Books page, open the book and click Reserve. "
+    "You'll get a notification when it's ready for pickup, and you can cancel it any time "
+    "from My Reservations."
+)
+
+
+# ---- General library information ----
+
+# A day or time that makes "are you open ..." about opening hours
+_WHEN = (r'(now|today|tonight|tomorrow|weekends?|holidays?|this (week|weekend|morning|afternoon|evening)'
+         r'|(mon|tues|wednes|thurs|fri|satur|sun)days?|at \d+|until|till)')
+
+
+# Anchored to the library ("the library", "you") so "when does the semester open"
+# or "books on opening a business today" reach the LLM; "are you open ..." also
+# needs a day or time so "are you open to suggestions" does too
+@intent('library_hours', [
+    r'\b(what time|when) (does|do|will|is) (the library|you)\b.*\b(open|opens|close|closes|closed|closing|opening)\b',
+    r'\b(does|do|is|are) (the library|you) (open|close|closed)( right)?( ' + _WHEN + r')?$',
+    r'\b(does|do|is|are) (the library|you) (open|close|closed)\b.*\b' + _WHEN + r'\b',
+    r'\b(library|your) (opening |closing )?hours\b',
+    r'\b(library|your) (opening|closing) time\b',
+    r"^(what are the |what's the |what s the )?(opening|closing) (time|hours)( today| tomorrow)?$",
+])
+def _library_hours(user_id):
+    return library_hours_text()
+
+
+@intent('borrowing_rules', [
+    r'\bborrow(ing)? (rules?|policy|policies|period|limit)\b',
+    r'\bhow long can i (borrow|keep)\b',
+    r'\b(when|what time) (is|are) (?!.*\bmy\b).*\bdue\b',
+    r'\boverdue (rules?|policy)\b',
+])
+def _borrowing_rules(user_id):
+    return BORROWING_RULES
+
+
+# Book reservations only; "how do I book a study room" goes to the LLM
+_NOT_A_BOOK = r'^(?!.*\b(rooms?|seats?|tables?|computers?|pcs?|spaces?|venues?)\b)'
+
+
+@intent('how_to_reserve', [
+    r'\bhow (do|can) i (reserve|book) (a |the |this |that )?books?\b',
+    r'\bhow to reserve (a |the )?books?\b',
+    _NOT_A_BOOK + r'.*\bhow (do|can) i (reserve|make a reservation|place a reservation)\b',
+    _NOT_A_BOOK + r'.*\bhow to (reserve|make a reservation)\b',
+    _NOT_A_BOOK + r'.*\b(book )?reserv(e|ation) (process|steps)\b',
+])
+def _how_to_reserve(user_id):
+    return RESERVE_HOWTO
+
+
+# ---- Personal lookups (need the caller's user id) ----
+
+@intent('my_borrowed', [
+    r'\b(what|which) books? (do i have|have i) borrowed\b',
+    r'\bmy (borrowed|current) books?\b',
+    r'\bbooks? i (have )?borrowed\b',
+    r'\bmy (loans?|borrowings?)\b',
+    r'\bwhat do i (need to|have to) return\b',
+    r'\bmy\b.*\bdue\b',
+])
+def _my_borrowed(user_id):
+    if not user_id:
+        return _sign_in_needed()
+    from db import execute_query
+    rows = execute_query(
+        """
+        SELECT book_title, book_id, due_date, status FROM borrow_records
+        WHERE user_id = %s AND status IN ('borrowed', 'overdue')
+        ORDER BY due_date ASC LIMIT 20
+        """,
+        (user_id,), fetch_all=True
+    ) or []
+    if not rows:
+        return "You don't have any borrowed books right now."
+    lines = [f"- {r.get('book_title') or r['book_id']} (due {_date(r.get('due_date'))}"
+             f"{', OVERDUE' if r.get('status') == 'overdue' else ''})" for r in rows]
+    return f"You have {len(rows)} borrowed book{'s' if len(rows) != 1 else ''}:\n" + "\n".join(lines)
+
+
+@intent('my_reservations', [
+    r'\bmy reservations?\b',
+    r'\b(what|which) books? (do i have|have i) reserved\b',
+    r'\bbooks? i (have )?reserved\b',
+    r'\bmy reserved books?\b',
+])
+def _my_reservations(user_id):
+    if not user_id:
+        return _sign_in_needed()
+    from db import execute_query
+    rows = execute_query(
+        """
+        SELECT book_title, book_id, expires_at FROM reservations
+        WHERE user_id = %s AND status = 'pending'
+        ORDER BY reserved_at ASC LIMIT 20
+        """,
+        (user_id,), fetch_all=True
+    ) or []
+    if not rows:
+        return "You don't have any active reservations."
+    lines = [f"- {r.get('book_title') or r['book_id']} (expires {_date(r.get('expires_at'))})" for r in rows]
+    return f"You have {len(rows)} active reservation{'s' if len(rows) != 1 else ''}:\n" + "\n".join(lines)
+
+
+def stats() -> Dict[str, object]:
+    fast = metrics.counter('ai.intent.fast_path')
+    llm = metrics.counter('ai.intent.llm')
+    return {
+        'fastPath': fast,
+        'llm': llm,
+        'fastPathRatio': round(fast / (fast + llm), 4) if fast + llm else 0.0,
+        'byIntent': {name: metrics.counter(f'ai.intent.{name}') for name, _, _ in _REGISTRY},
+        'latencyMs': metrics.summary('ai.intent.latency_ms'),
+    }
+
+
+def register_ai_intent_endpoints(app):
+    """Register GET /api/ai/intents/stats"""
+
+    @app.route('/api/ai/intents/stats', methods=['GET'])
+    def ai_intents_stats():
+        return jsonify(stats())
+
+    print("✅ AI intent endpoints registered")
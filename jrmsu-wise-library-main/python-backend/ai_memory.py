@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+AI Conversation Memory
+Fits a chat into the model's context window instead of blindly keeping the
+last 5 turns. Per ai_chat_sessions session:
+
+- the newest turns are kept verbatim, as many as fit the token budget
+  (AI_CONTEXT_TOKENS minus the reply, the retrieval snippets and the prompt);
+  with ai_session_context the window start stays pinned across turns so
+  Ollama can reuse the evaluated prompt prefix
+- older turns are represented by a rolling summary, cached in memory and in
+  ai_chat_history (id 'summary-<sessionId>'); when more turns fall out of the
+  window the summary is extended in the background, never on the request path
+- over-long messages are clipped so the result always fits the budget; an
+  oversized system prompt or summary gives way first, and the new message is
+  never cut below AI_MEMORY_MESSAGE_FLOOR tokens
+
+Metrics: ai.memory.tokens, ai.memory.clipped, ai.memory.dropped_turns,
+ai.memory.summaries, ai.memory.summary_ms
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+import ollama_client
+from ai_session_context import SessionContextCache, get_session_contexts
+from ollama_client import CHAT_OPTIONS, estimate_tokens
+
+AI_CONTEXT_TOKENS = int(os.getenv('AI_CONTEXT_TOKENS', str(CHAT_OPTIONS['num_ctx'])))
+AI_RESPONSE_TOKENS = int(os.getenv('AI_RESPONSE_TOKENS', str(CHAT_OPTIONS['num_predict'])))
+# Room left for ai_retrieval snippets, which are added after the memory is fitted
+AI_MEMORY_RESERVE_TOKENS = int(os.getenv('AI_MEMORY_RESERVE_TOKENS', os.getenv('AI_RETRIEVAL_MAX_TOKENS', '300')))
+AI_MEMORY_SUMMARY_TOKENS = int(os.getenv('AI_MEMORY_SUMMARY_TOKENS', '200'))
+AI_MEMORY_TURN_TOKENS = int(os.getenv('AI_MEMORY_TURN_TOKENS', '400'))
+AI_MEMORY_MAX_SESSIONS = int(os.getenv('AI_MEMORY_MAX_SESSIONS', '1000'))
+# Tokens of the new message that survive clipping, however long the system prompt is
+AI_MEMORY_MESSAGE_FLOOR = int(os.getenv('AI_MEMORY_MESSAGE_FLOOR', '100'))
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation between a library user and Jose, the JRMSU Library AI assistant, "
+    "in at most {words} words. Keep names, book titles, dates and anything the user still needs."
+)
+
+
+def clip(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens (by estimate_tokens)"""
+    limit = (max(2, max_tokens) - 1) * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit - 1].rstrip() + '…'
+
+
+def fingerprint(turns: List[Dict[str, str]]) -> str:
+    return hashlib.sha1(json.dumps([(t['role'], t['content']) for t in turns]).encode('utf-8')).hexdigest()
+
+
+def ensure_session(session_id: str, user_id: Optional[str] = None):
+    """Make sure the ai_chat_sessions row exists (ai_chat_history references it)"""
+    from ai_scheduler import ADMIN, priority_for
+    from db import execute_query
+    role = 'guest' if not user_id else 'admin' if priority_for(user_id) == ADMIN else 'student'
+    execute_query(
+        """
+        INSERT INTO ai_chat_sessions (id, user_id, user_role, status)
+        VALUES (%s, %s, %s, 'active')
+        ON DUPLICATE KEY UPDATE id = id
+        """,
+        (session_id, user_id or 'guest', role)
+    )
+
+
+def summarize_with_llm(previous: str, turns: List[Dict[str, str]]) -> str:
+    """Fold turns into the previous summary with the chat model"""
+    lines = [f"{'User' if t['role'] == 'user' else 'Jose'}: {t['content']}" for t in turns if t['role'] != 'system']
+    text = (f"Summary so far: {previous}\n\n" if previous else '') + "Conversation:\n" + "\n".join(lines)
+    words = AI_MEMORY_SUMMARY_TOKENS * 3 // 4
+    return ollama_client.chat(
+        [{"role": "system", "content": SUMMARY_PROMPT.format(words=words)}, {"role": "user", "content": text}],
+        options={"num_predict": AI_MEMORY_SUMMARY_TOKENS, "temperature": 0.1},
+    ).strip()
+
+
+class ConversationMemory:
+    """Token-budgeted view of a conversation with a lazily rolled-up summary"""
+
+    def __init__(
+        self,
+        context_tokens: int = AI_CONTEXT_TOKENS,
+        response_tokens: int = AI_RESPONSE_TOKENS,
+        reserve_tokens: int = AI_MEMORY_RESERVE_TOKENS,
+        summary_tokens: int = AI_MEMORY_SUMMARY_TOKENS,
+        turn_tokens: int = AI_MEMORY_TURN_TOKENS,
+        message_floor: int = AI_MEMORY_MESSAGE_FLOOR,
+        summarize: Callable[[str, List[Dict[str, str]]], str] = summarize_with_llm,
+        spawn: Optional[Callable[..., Any]] = None,
+        persist: bool = True,
+        session_contexts: Optional[SessionContextCache] = None
+    ):
+        self.context_tokens = context_tokens
+        self.response_tokens = response_tokens
+        self.reserve_tokens = reserve_tokens
+        self.summary_tokens = summary_tokens
+        self.turn_tokens = turn_tokens
+        self.message_floor = message_floor
+        self.summarize = summarize
+        self.spawn = spawn or (lambda fn, *args: threading.Thread(target=fn, args=args, daemon=True).start())
+        self.persist = persist
+        self.session_contexts = session_contexts
+        self._lock = threading.Lock()
+        # session id -> {'summary', 'upto' (turns folded), 'fingerprint' (of those turns)}
+        self._summaries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._pending = set()
+
+    @property
+    def budget(self) -> int:
+        """Prompt tokens available for system prompt, summary, history and the new message"""
+        return self.context_tokens - self.response_tokens - self.reserve_tokens
+
+    def fit(self, session_id: Optional[str], messages: List[Dict[str, str]], user_id: Optional[str] = None) -> List[Dict[str, str]]:
+        """[system, *history, user] -> [system, summary?, *recent history, user] within the budget"""
+        system, history, user = messages[0], messages[1:-1], messages[-1]
+        # The system prompt is clipped before the new message goes below its floor
+        floor = max(1, min(estimate_tokens(user['content']), self.message_floor, self.budget // 2))
+        if estimate_tokens(system['content']) > self.budget - floor:
+            system = {**system, 'content': clip(system['content'], self.budget - floor)}
+            metrics.incr('ai.memory.clipped')
+        remaining = self.budget - estimate_tokens(system['content'])
+        limit = max(floor, remaining * 3 // 4)
+        if estimate_tokens(user['content']) > limit:
+            user = {**user, 'content': clip(user['content'], limit)}
+            metrics.incr('ai.memory.clipped')
+        remaining -= estimate_tokens(user['content'])
+
+        turns = []
+        for turn in history:
+            if estimate_tokens(turn['content']) > self.turn_tokens:
+                turn = {**turn, 'content': clip(turn['content'], self.turn_tokens)}
+                metrics.incr('ai.memory.clipped')
+            turns.append(turn)
+
+        if sum(estimate_tokens(t['content']) for t in turns) <= remaining:
+            return self._observed([system] + turns + [user])
+
+        # Keep the newest turns that fit next to a summary of the rest; the
+        # summary shrinks (or is left out) when little room is left
+        summary_room = min(self.summary_tokens, remaining)
+        if summary_room - estimate_tokens(SUMMARY_PREFIX) < 2:
+            summary_room = 0
+        start = self._window_start(session_id, turns, remaining - summary_room)
+        kept, older = turns[start:], turns[:start]
+        summary = self._summary_for(session_id, older, user_id) if session_id and summary_room else ''
+        if not summary:
+            metrics.incr('ai.memory.dropped_turns', len(older))
+        out = [system]
+        if summary:
+            out.append({'role': 'system', 'content': SUMMARY_PREFIX + clip(summary, summary_room - estimate_tokens(SUMMARY_PREFIX))})
+        return self._observed(out + kept + [user])
+
+    def _window_start(self, session_id: Optional[str], turns: List[Dict[str, str]], room: int) -> int:
+        """
+        Index of the first turn kept verbatim. A pinned start is kept while the
+        turns after it fit; otherwise the window is re-pinned to fill only part
+        of the room, so the next turns append to an unchanged prefix.
+        """
+        contexts = self.session_contexts if session_id else None
+        target = room
+        if contexts is not None:
+            pinned = contexts.window_start(session_id, turns)
+            if pinned is not None and sum(estimate_tokens(t['content']) for t in turns[pinned:]) <= room:
+                contexts.pin(session_id, turns, pinned)
+                metrics.incr('ai.session_context.hits')
+                return pinned
+            target = int(room * contexts.refill)
+        start, used = len(turns), 0
+        for i in range(len(turns) - 1, -1, -1):
+            used += estimate_tokens(turns[i]['content'])
+            if used > target:
+                break
+            start = i
+        if contexts is not None:
+            contexts.pin(session_id, turns, start)
+            metrics.incr('ai.session_context.repins')
+        return start
+
+    def _observed(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        metrics.observe('ai.memory.tokens', sum(estimate_tokens(m['content']) for m in messages))
+        return messages
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._summaries.pop(session_id, None)
+
+    # ---- summaries ----
+
+    def _summary_for(self, session_id: str, older: List[Dict[str, str]], user_id: Optional[str]) -> str:
+        """Cached summary covering a prefix of `older`; schedules a refresh when it lags behind"""
+        state = self._state(session_id)
+        upto = state['upto'] if state else 0
+        valid = state is not None and upto <= len(older) and fingerprint(older[:upto]) == state['fingerprint']
+        if not valid:
+            state, upto = None, 0
+        if upto < len(older):
+            self._schedule(session_id, state['summary'] if state else '', older, upto, user_id)
+        return state['summary'] if state else ''
+
+    def _state(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if session_id in self._summaries:
+                self._summaries.move_to_end(session_id)
+                return self._summaries[session_id]
+        state = self._load(session_id) if self.persist else None
+        self._remember(session_id, state)
+        return state
+
+    def _remember(self, session_id: str, state: Optional[Dict[str, Any]]):
+        with self._lock:
+            self._summaries[session_id] = state
+            self._summaries.move_to_end(session_id)
+            while len(self._summaries) > AI_MEMORY_MAX_SESSIONS:
+                self._summaries.popitem(last=False)
+
+    def _schedule(self, session_id: str, previous: str, older: List[Dict[str, str]], upto: int, user_id: Optional[str]):
+        with self._lock:
+            if session_id in self._pending:
+                return
+            self._pending.add(session_id)
+        self.spawn(self._refresh, session_id, previous, list(older), upto, user_id)
+
+    def _refresh(self, session_id: str, previous: str, older: List[Dict[str, str]], upto: int, user_id: Optional[str]):
+        start = time.perf_counter()
+        try:
+            from ai_scheduler import BACKGROUND, get_ai_scheduler
+            with get_ai_scheduler().slot('memory-summarizer', priority=BACKGROUND):
+                summary = clip(self.summarize(previous, older[upto:]), self.summary_tokens)
+            state = {'summary': summary, 'upto': len(older), 'fingerprint': fingerprint(older)}
+            self._remember(session_id, state)
+            metrics.incr('ai.memory.summaries')
+            metrics.observe('ai.memory.summary_ms', (time.perf_counter() - start) * 1000.0)
+            if self.persist:
+                self._save(session_id, state, user_id)
+        except Exception as e:
+            print(f"Error summarizing AI conversation {session_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(session_id)
+
+    def _load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            from db import execute_query
+            row = execute_query(
+                "SELECT content, metadata FROM ai_chat_history WHERE id = %s",
+                (f'summary-{session_id}',), fetch_one=True
+            )
+        except Exception as e:
+            print(f"Error loading AI conversation summary: {e}")
+            return None
+        if not row:
+            return None
+        meta = row.get('metadata') or {}
+        if isinstance(meta, (str, bytes)):
+            meta = json.loads(meta)
+        return {'summary': row['content'], 'upto': int(meta.get('upto', 0)), 'fingerprint': meta.get('fingerprint', '')}
+
+    def _save(self, session_id: str, state: Dict[str, Any], user_id: Optional[str]):
+        from db import execute_query
+        ensure_session(session_id, user_id)
+        execute_query(
+            """
+            INSERT INTO ai_chat_history (id, session_id, user_id, role, content, metadata)
+            VALUES (%s, %s, %s, 'system', %s, %s)
+            ON DUPLICATE KEY UPDATE content = VALUES(content), metadata = VALUES(metadata), timestamp = NOW()
+            """,
+            (f'summary-{session_id}', session_id, user_id or 'guest', state['summary'],
+             json.dumps({'upto': state['upto'], 'fingerprint': state['fingerprint'], 'kind': 'summary'}))
+        )
+
+
+_memory: Optional[ConversationMemory] = None
+
+
+def init_conversation_memory(socketio=None) -> ConversationMemory:
+    """Create the process-wide memory (summaries run as socketio background tasks when given)"""
+    global _memory
+    _memory = ConversationMemory(spawn=socketio.start_background_task if socketio is not None else None,
+                                 session_contexts=get_session_contexts())
+    return _memory
+
+
+def get_conversation_memory() -> ConversationMemory:
+    global _memory
+    if _memory is None:
+        _memory = ConversationMemory(session_contexts=get_session_contexts())
+    return _memory
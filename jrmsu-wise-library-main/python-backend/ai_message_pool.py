@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+AI Message Pool
+Varied Jose messages for recurring events (forgotten logout reminders, ...)
+without an LLM call on the request path:
+
+- an offline batch job asks Ollama for many variations per event type,
+  normalizes and de-duplicates them, and stores them as
+  jose_message_templates rows (placeholders like {fullName}, {closeTime})
+- the server keeps the templates in memory and reloads them in the
+  background every AI_MESSAGE_POOL_REFRESH seconds (optionally topping a
+  small pool up to AI_MESSAGE_POOL_TARGET with a generation batch)
+- pick() is O(1): each user walks the pool with their own random start and
+  stride coprime to its size, so nobody sees a message twice before having
+  seen all of them
+
+Usage:
+    python ai_message_pool.py generate [event_type] [count]
+    python ai_message_pool.py list [event_type]
+
+Metrics: ai.message_pool.picks, ai.message_pool.size.<event> (gauge),
+ai.message_pool.generated, ai.message_pool.duplicates, ai.message_pool.rejected
+"""
+
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import metrics
+
+AI_MESSAGE_POOL_REFRESH = int(os.getenv('AI_MESSAGE_POOL_REFRESH', '600'))
+AI_MESSAGE_POOL_TARGET = int(os.getenv('AI_MESSAGE_POOL_TARGET', '200'))
+AI_MESSAGE_POOL_BATCH = int(os.getenv('AI_MESSAGE_POOL_BATCH', '20'))
+# Variations asked for per model call during a background top-up (each call takes its own queue slot)
+AI_MESSAGE_POOL_CALL_SIZE = int(os.getenv('AI_MESSAGE_POOL_CALL_SIZE', '5'))
+AI_MESSAGE_POOL_TOPUP = os.getenv('AI_MESSAGE_POOL_TOPUP', 'false').lower() == 'true'
+AI_MESSAGE_POOL_MAX_USERS = int(os.getenv('AI_MESSAGE_POOL_MAX_USERS', '5000'))
+
+FORGOTTEN_LOGOUT = 'forgotten_logout'
+
+# Event type -> (variables a template may use, what the messages are for)
+EVENTS: Dict[str, Dict[str, Any]] = {
+    FORGOTTEN_LOGOUT: {
+        'variables': ['fullName', 'closeTime'],
+        'required': ['fullName'],
+        'purpose': "a friendly reminder to a library user who is still logged in at the library "
+                   "entrance system and should log out before leaving; the library closes at {closeTime}",
+    },
+}
+
+# The original hard-coded messages: always in the pool, and all of it until a batch is generated
+SEED_TEMPLATES: Dict[str, List[str]] = {
+    FORGOTTEN_LOGOUT: [
+        "Hi {fullName}! We noticed you're still logged in at the library. Please remember to logout before leaving. The library closes at {closeTime}.",
+        "Hello {fullName}! You forgot to logout from the library system. Kindly logout before you leave to help us track library usage accurately.",
+        "Good afternoon {fullName}! Your library session is still active. Please logout before leaving the premises. Thank you!",
+        "Reminder for {fullName}: You're still logged in at the library. Please logout before leaving. Library hours end at {closeTime}.",
+        "Hey {fullName}! Don't forget to logout from the library system before you go. Your session is still active.",
+    ],
+}
+
+GENERATE_PROMPT = (
+    "Write {count} different short messages from Jose, the JRMSU Library AI assistant: {purpose}. "
+    "Vary the greeting, wording, tone and length (one or two sentences each). "
+    "Use the placeholder {{fullName}} for the user's name{extra}. "
+    "Output one message per line, with no numbering, quotes or extra text."
+)
+
+MIN_LENGTH = 30
+MAX_LENGTH = 240
+_PLACEHOLDER = re.compile(r'\{(\w+)\}')
+_LIST_PREFIX = re.compile(r'^\s*(?:[-*•]+|\d+[.)]|\(\d+\))\s*')
+
+
+def normalize(line: str) -> Optional[str]:
+    """Clean one generated line into a template, or None if it is unusable"""
+    text = _LIST_PREFIX.sub('', line).strip().strip('"“”\'').strip()
+    text = re.sub(r'\s+', ' ', text)
+    # Models sometimes write the placeholder without braces or in another case
+    text = re.sub(r'\{\{?\s*full\s*_?name\s*\}?\}', '{fullName}', text, flags=re.IGNORECASE)
+    text = re.sub(r'\{\{?\s*close\s*_?time\s*\}?\}', '{closeTime}', text, flags=re.IGNORECASE)
+    if not MIN_LENGTH <= len(text) <= MAX_LENGTH:
+        return None
+    return text
+
+
+def dedupe_key(template: str) -> str:
+    """Templates differing only in case, punctuation or spacing count as duplicates"""
+    return re.sub(r'[^a-z0-9{}]+', ' ', template.lower()).strip()
+
+
+def valid_template(event_type: str, template: str) -> bool:
+    spec = EVENTS[event_type]
+    used = set(_PLACEHOLDER.findall(template))
+    if not used <= set(spec['variables']):
+        return False
+    if any(f'{{{v}}}' not in template for v in spec['required']):
+        return False
+    # Stray braces would show up verbatim in the rendered message
+    return template.count('{') == template.count('}') == len(_PLACEHOLDER.findall(template))
+
+
+def render(template: str, variables: Dict[str, Any]) -> str:
+    message = template
+    for key, value in variables.items():
+        message = message.replace(f'{{{key}}}', str(value))
+    return message
+
+
+def generate_with_llm(event_type: str, count: int) -> List[str]:
+    """Ask the chat model for `count` raw variations (one per line)"""
+    import ollama_client
+    spec = EVENTS[event_type]
+    extra = ''.join(f' and {{{v}}}' for v in spec['variables'] if v not in spec['required'])
+    extra = f"; you may also use{extra[4:]}" if extra else ''
+    prompt = GENERATE_PROMPT.format(count=count, purpose=spec['purpose'], extra=extra)
+    reply = ollama_client.chat(
+        [{"role": "user", "content": prompt}],
+        options={"temperature": 1.0, "top_p": 0.95, "num_predict": 60 * count},
+    )
+    return reply.splitlines()
+
+
+class MessagePool:
+    """Per-event template lists with O(1) no-repeat-per-user selection"""
+
+    def __init__(
+        self,
+        seeds: Optional[Dict[str, List[str]]] = None,
+        max_users: int = AI_MESSAGE_POOL_MAX_USERS,
+        rng: Optional[random.Random] = None,
+        persist: bool = True
+    ):
+        self.max_users = max_users
+        self.rng = rng or random.Random()
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._seeds = {e: list(t) for e, t in (SEED_TEMPLATES if seeds is None else seeds).items()}
+        self._pools: Dict[str, List[str]] = {}
+        self._versions: Dict[str, int] = {}
+        # (event, user) -> [version, start, stride, step]
+        self._cursors: 'OrderedDict[tuple, List[int]]' = OrderedDict()
+        for event_type in EVENTS:
+            self._set_pool(event_type, [])
+
+    def size(self, event_type: str) -> int:
+        return len(self._pools.get(event_type, ()))
+
+    def pick(self, event_type: str, user_id: Optional[str] = None, **variables) -> str:
+        """Rendered message for the user; repeats only after the user has seen the whole pool"""
+        with self._lock:
+            pool = self._pools[event_type]
+            version = self._versions[event_type]
+            key = (event_type, user_id or 'guest')
+            cursor = self._cursors.get(key)
+            if cursor is None or cursor[0] != version or cursor[3] >= len(pool):
+                cursor = [version, self.rng.randrange(len(pool)), self._stride(len(pool)), 0]
+                self._cursors[key] = cursor
+            self._cursors.move_to_end(key)
+            while len(self._cursors) > self.max_users:
+                self._cursors.popitem(last=False)
+            template = pool[(cursor[1] + cursor[2] * cursor[3]) % len(pool)]
+            cursor[3] += 1
+        metrics.incr('ai.message_pool.picks')
+        return render(template, variables)
+
+    def _stride(self, n: int) -> int:
+        """Random step coprime to n, so start + k*stride visits every index once per cycle"""
+        if n <= 2:
+            return 1
+        while True:
+            stride = self.rng.randrange(1, n)
+            if math.gcd(stride, n) == 1:
+                return stride
+
+    def _set_pool(self, event_type: str, templates: Iterable[str]):
+        merged, seen = [], set()
+        for template in list(self._seeds.get(event_type, [])) + list(templates):
+            key = dedupe_key(template)
+            if key not in seen:
+                seen.add(key)
+                merged.append(template)
+        with self._lock:
+            if merged == self._pools.get(event_type):
+                return
+            self._pools[event_type] = merged
+            self._versions[event_type] = self._versions.get(event_type, 0) + 1
+        metrics.set_gauge(f'ai.message_pool.size.{event_type}', len(merged))
+
+    # ---- storage ----
+
+    def reload(self) -> Dict[str, int]:
+        """Re-read all stored templates; keeps the current pools if the database is unreachable"""
+        if not self.persist:
+            return {e: self.size(e) for e in EVENTS}
+        for event_type in EVENTS:
+            rows = load_templates(event_type)
+            if rows is None:
+                continue
+            self._set_pool(event_type, [r for r in rows if valid_template(event_type, r)])
+        return {e: self.size(e) for e in EVENTS}
+
+    def generate(
+        self,
+        event_type: str,
+        count: int,
+        batch: int = AI_MESSAGE_POOL_BATCH,
+        llm: Callable[[str, int], List[str]] = generate_with_llm
+    ) -> Dict[str, int]:
+        """Batch job: generate until `count` new unique templates are stored (or attempts run out)"""
+        seen = {dedupe_key(t) for t in self._pools[event_type]}
+        added: List[str] = []
+        duplicates = rejected = 0
+        attempts = max(1, math.ceil(count / batch)) * 3
+        while len(added) < count and attempts > 0:
+            attempts -= 1
+            for line in llm(event_type, min(batch, count - len(added))):
+                template = normalize(line)
+                if template is None or not valid_template(event_type, template):
+                    rejected += 1 if line.strip() else 0
+                    continue
+                key = dedupe_key(template)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                added.append(template)
+                if len(added) >= count:
+                    break
+        if added and self.persist:
+            store_templates(event_type, EVENTS[event_type]['variables'], added)
+        self._set_pool(event_type, self._pools[event_type] + added)
+        metrics.incr('ai.message_pool.generated', len(added))
+        metrics.incr('ai.message_pool.duplicates', duplicates)
+        metrics.incr('ai.message_pool.rejected', rejected)
+        return {'added': len(added), 'duplicates': duplicates, 'rejected': rejected, 'size': self.size(event_type)}
+
+    def top_up(self, target: int = AI_MESSAGE_POOL_TARGET) -> Dict[str, Dict[str, int]]:
+        """Generate a batch for every event whose pool is below `target` (skipped while Ollama is down)"""
+        import ai_health
+        from ai_scheduler import BACKGROUND, get_ai_scheduler
+
+        def llm(event_type: str, count: int) -> List[str]:
+            # The slot is held for one short call, not the whole batch with its retries,
+            # so with a single Ollama slot interactive chat waits for one call at most
+            with get_ai_scheduler().slot('message-pool', priority=BACKGROUND):
+                return generate_with_llm(event_type, count)
+
+        out = {}
+        for event_type in EVENTS:
+            missing = target - self.size(event_type)
+            if missing <= 0 or ai_health.unavailable():
+                continue
+            out[event_type] = self.generate(event_type, min(missing, AI_MESSAGE_POOL_BATCH),
+                                            batch=AI_MESSAGE_POOL_CALL_SIZE, llm=llm)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'events': {e: {'size': len(p), 'version': self._versions[e]} for e, p in self._pools.items()},
+                'trackedUsers': len(self._cursors),
+            }
+
+
+def load_templates(event_type: str) -> Optional[List[str]]:
+    """Stored templates for an event type, or None if they could not be read"""
+    from db import execute_query
+    try:
+        rows = execute_query(
+            "SELECT template FROM jose_message_templates WHERE event_type = %s ORDER BY id",
+            (event_type,), fetch_all=True
+        ) or []
+    except Exception as e:
+        print(f"Error loading {event_type} message templates: {e}")
+        return None
+    return [r['template'] for r in rows]
+
+
+def store_templates(event_type: str, variables: List[str], templates: List[str]):
+    from db import get_db_cursor
+    with get_db_cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO jose_message_templates (event_type, template, variables) VALUES (%s, %s, %s)",
+            [(event_type, t, json.dumps(variables)) for t in templates]
+        )
+
+
+_pool: Optional[MessagePool] = None
+
+
+def get_message_pool() -> MessagePool:
+    global _pool
+    if _pool is None:
+        _pool = MessagePool()
+    return _pool
+
+
+def forgotten_logout_message(full_name: str, user_id: Optional[str] = None) -> str:
+    """Logout reminder for the forgotten-logout notifications and /api/ai/generate-logout-warning"""
+    from ai_intents import LIBRARY_CLOSE, _clock
+    return get_message_pool().pick(FORGOTTEN_LOGOUT, user_id, fullName=full_name, closeTime=_clock(LIBRARY_CLOSE))
+
+
+def register_ai_message_pool_endpoints(app, socketio=None):
+    """Load the stored pools, keep them fresh in the background and expose their stats"""
+    from flask import jsonify
+    pool = get_message_pool()
+
+    @app.route('/api/ai/message-pool/stats', methods=['GET'])
+    def ai_message_pool_stats():
+        return jsonify(pool.stats())
+
+    def _refresh_loop():
+        while True:
+            try:
+                pool.reload()
+                if AI_MESSAGE_POOL_TOPUP:
+                    pool.top_up()
+            except Exception as e:
+                print(f"Error refreshing AI message pool: {e}")
+            socketio.sleep(AI_MESSAGE_POOL_REFRESH)
+
+    if socketio is not None:
+        socketio.start_background_task(_refresh_loop)
+    else:
+        pool.reload()
+    print("✅ AI message pool endpoints registered")
+
+
+if __name__ == '__main__':
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ''
+    event = sys.argv[2] if len(sys.argv) > 2 else FORGOTTEN_LOGOUT
+    if cmd == 'generate' and event in EVENTS:
+        count = int(sys.argv[3]) if len(sys.argv) > 3 else AI_MESSAGE_POOL_TARGET
+        pool = get_message_pool()
+        pool.reload()
+        start = time.perf_counter()
+        result = pool.generate(event, count)
+        print(json.dumps({**result, 'seconds': round(time.perf_counter() - start, 1)}, indent=2))
+    elif cmd == 'list' and event in EVENTS:
+        pool = get_message_pool()
+        pool.reload()
+        for template in pool._pools[event]:
+            print(template)
+    else:
+        print(__doc__)
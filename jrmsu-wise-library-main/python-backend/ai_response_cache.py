@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+AI Response Cache
+Answers repeated chatbot questions (library hours, borrowing rules, how to
+reserve) without a new LLM generation. Keys combine the normalized sanitized
+message, the model and its options, and a hash of recent history only when
+the message refers back to it ("what about that one?").
+
+- LRU + TTL eviction (AI_CACHE_MAX entries, AI_CACHE_TTL seconds)
+- Optional persistence in ai_response_cache (AI_CACHE_PERSIST=true) so the
+  cache survives restarts; kept out of ai_chat_history so analytics and
+  history search only see real conversations
+- GET /api/ai/cache/stats: hit rate and generation time saved
+- POST /api/admin/ai-cache/invalidate {"contains": "..."} (empty = everything)
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from flask import request, jsonify
+import metrics
+from ollama_client import MODEL_NAME, CHAT_OPTIONS
+
+AI_CACHE_MAX = int(os.getenv('AI_CACHE_MAX', '500'))
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', '3600'))
+AI_CACHE_PERSIST = os.getenv('AI_CACHE_PERSIST', 'false').lower() == 'true'
+
+# Messages that lean on earlier turns; their key includes the recent history
+_CONTEXT_WORDS = re.compile(r"\b(it|its|that|this|those|these|them|they|he|she|one|more|else|again|above|previous)\b")
+
+
+def normalize(text: str) -> str:
+    text = re.sub(r'\s+', ' ', (text or '').lower()).strip()
+    return text.rstrip('?!. ')
+
+
+def cache_key(messages: List[Dict[str, str]]) -> Optional[str]:
+    """Key for a sanitized chat (system + history + user message); None if not cacheable"""
+    if not messages or messages[-1].get('role') != 'user':
+        return None
+    message = normalize(messages[-1].get('content', ''))
+    if not message:
+        return None
+    history = ''
+    if _CONTEXT_WORDS.search(message):
+        recent = [(m['role'], normalize(m['content'])) for m in messages[1:-1][-2:]]
+        history = hashlib.sha256(json.dumps(recent).encode('utf-8')).hexdigest()
+    raw = json.dumps({
+        'model': MODEL_NAME,
+        'options': CHAT_OPTIONS,
+        'system': messages[0].get('content', '') if messages[0].get('role') == 'system' else '',
+        'message': message,
+        'history': history,
+    }, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL map of cache key -> generated answer"""
+
+    def __init__(self, max_entries: int = AI_CACHE_MAX, ttl: int = AI_CACHE_TTL, persist: bool = AI_CACHE_PERSIST):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        key = cache_key(messages) if self.enabled else None
+        if key is None:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry['createdAt'] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry['hits'] += 1
+        if entry is None:
+            metrics.incr('ai.cache.misses')
+            return None
+        metrics.incr('ai.cache.hits')
+        metrics.incr('ai.cache.saved_ms', entry['latencyMs'])
+        return entry['content']
+
+    def put(self, messages: List[Dict[str, str]], content: str, latency_ms: float):
+        key = cache_key(messages) if self.enabled else None
+        if key is None or not content:
+            return
+        entry = {
+            'content': content,
+            'message': normalize(messages[-1]['content']),
+            'latencyMs': round(latency_ms, 1),
+            'createdAt': time.time(),
+            'hits': 0,
+        }
+        self._store(key, entry)
+        if self.persist:
+            try:
+                self._persist(key, entry)
+            except Exception as e:
+                print(f"Error persisting AI cache entry: {e}")
+
+    def invalidate(self, contains: Optional[str] = None) -> int:
+        """Drop entries whose question contains the text (all entries if empty)"""
+        needle = normalize(contains or '')
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if not needle or needle in e['message']]
+            for k in keys:
+                del self._entries[k]
+        metrics.incr('ai.cache.invalidated', len(keys))
+        if self.persist:
+            try:
+                self._delete_persisted(needle)
+            except Exception as e:
+                print(f"Error deleting persisted AI cache entries: {e}")
+        return len(keys)
+
+    def load(self) -> int:
+        """Warm from ai_response_cache (persisted entries younger than the TTL)"""
+        from db import execute_query
+        ensure_cache_table()
+        rows = execute_query(
+            """
+            SELECT cache_key, message, content, latency_ms, UNIX_TIMESTAMP(created_at) AS created
+            FROM ai_response_cache
+            WHERE model = %s AND created_at > NOW() - INTERVAL %s SECOND
+            ORDER BY created_at ASC
+            LIMIT %s
+            """,
+            (MODEL_NAME, self.ttl, self.max_entries),
+            fetch_all=True
+        ) or []
+        for row in rows:
+            self._store(row['cache_key'], {
+                'content': row['content'],
+                'message': row['message'],
+                'latencyMs': float(row['latency_ms'] or 0),
+                'createdAt': float(row['created']),
+                'hits': 0,
+            })
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = metrics.counter('ai.cache.hits')
+        misses = metrics.counter('ai.cache.misses')
+        with self._lock:
+            size = len(self._entries)
+            top = sorted(self._entries.values(), key=lambda e: -e['hits'])[:10]
+        return {
+            'size': size,
+            'maxEntries': self.max_entries,
+            'ttl': self.ttl,
+            'persist': self.persist,
+            'hits': hits,
+            'misses': misses,
+            'hitRate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'savedMs': metrics.counter('ai.cache.saved_ms'),
+            'top': [{'message': e['message'], 'hits': e['hits']} for e in top],
+        }
+
+    # ---- internals ----
+
+    def _store(self, key: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.incr('ai.cache.evicted')
+
+    def _persist(self, key: str, entry: Dict[str, Any]):
+        from db import execute_query
+        ensure_cache_table()
+        execute_query(
+            """
+            INSERT INTO ai_response_cache (cache_key, message, content, latency_ms, model)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE content = VALUES(content), latency_ms = VALUES(latency_ms), created_at = NOW()
+            """,
+            (key, entry['message'], entry['content'], entry['latencyMs'], MODEL_NAME)
+        )
+
+    def _delete_persisted(self, needle: str):
+        from db import execute_query
+        ensure_cache_table()
+        if needle:
+            execute_query("DELETE FROM ai_response_cache WHERE message LIKE %s", (f'%{needle}%',))
+        else:
+            execute_query("DELETE FROM ai_response_cache")
+
+
+_table_ready = False
+
+
+def ensure_cache_table():
+    """Create ai_response_cache on databases set up before it existed (once per process)"""
+    global _table_ready
+    if _table_ready:
+        return
+    from db import execute_query
+    execute_query(
+        """
+        CREATE TABLE IF NOT EXISTS ai_response_cache (
+            cache_key CHAR(64) PRIMARY KEY,
+            message TEXT NOT NULL,
+            content TEXT NOT NULL,
+            latency_ms FLOAT NOT NULL DEFAULT 0,
+            model VARCHAR(100) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_created_at (created_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """
+    )
+    _table_ready = True
+
+
+response_cache = ResponseCache()
+
+
+def register_ai_cache_endpoints(app):
+    """Register cache stats/invalidation endpoints and warm persisted entries"""
+
+    @app.route('/api/ai/cache/stats', methods=['GET'])
+    def ai_cache_stats():
+        return jsonify(response_cache.stats())
+
+    @app.route('/api/admin/ai-cache/invalidate', methods=['POST'])
+    def ai_cache_invalidate():
+        body = request.get_json(silent=True) or {}
+        return jsonify(ok=True, invalidated=response_cache.invalidate(body.get('contains')))
+
+    if response_cache.persist:
+        try:
+            print(f"✅ AI cache warmed with {response_cache.load()} entries")
+        except Exception as e:
+            print(f"⚠️  AI cache not warmed: {e}")
+
+    print("✅ AI cache endpoints registered")
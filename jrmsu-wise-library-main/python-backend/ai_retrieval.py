@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+AI Retrieval Index
+Local vector index over the `books` table and library policy text, used to
+ground Jose's answers. Before each generation the top-k snippets for the
+user's message are added to the system prompt, within a token budget.
+
+- Vectors live in AI_RETRIEVAL_PATH/vectors.npy (float32, memory-mapped on
+  load) with ids, texts and content hashes in meta.json
+- Sync is incremental: only new or changed documents are re-embedded, removed
+  ones are tombstoned and compacted away on save
+- Embedders are pluggable (AI_RETRIEVAL_EMBEDDER): 'hashing' is a
+  deterministic local feature-hashing embedder, 'ollama' uses /api/embed
+- Books are re-synced every AI_RETRIEVAL_REFRESH_SECONDS, or immediately via
+  POST /api/admin/ai-index/refresh and POST /api/admin/ai-index/books
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from flask import request, jsonify
+import metrics
+from ollama_client import estimate_tokens
+
+AI_RETRIEVAL_ENABLED = os.getenv('AI_RETRIEVAL_ENABLED', 'true').lower() == 'true'
+AI_RETRIEVAL_PATH = os.getenv('AI_RETRIEVAL_PATH') or os.path.join(os.path.dirname(__file__), 'ai_index')
+AI_RETRIEVAL_EMBEDDER = os.getenv('AI_RETRIEVAL_EMBEDDER', 'hashing')
+AI_RETRIEVAL_EMBED_MODEL = os.getenv('AI_RETRIEVAL_EMBED_MODEL', 'nomic-embed-text')
+AI_RETRIEVAL_TOP_K = int(os.getenv('AI_RETRIEVAL_TOP_K', '4'))
+AI_RETRIEVAL_MAX_TOKENS = int(os.getenv('AI_RETRIEVAL_MAX_TOKENS', '300'))
+AI_RETRIEVAL_MIN_SCORE = float(os.getenv('AI_RETRIEVAL_MIN_SCORE', '0.1'))
+AI_RETRIEVAL_REFRESH_SECONDS = int(os.getenv('AI_RETRIEVAL_REFRESH_SECONDS', '300'))
+AI_RETRIEVAL_POLICY_FILE = os.getenv('AI_RETRIEVAL_POLICY_FILE', '')
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_STOPWORDS = frozenset(
+    'a an and any are as at be by can do does for from have how i in is it me my of on or '
+    'the to what when where which who you your'.split()
+)
+
+
+# ---- Embedders ----
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words embedder: unigrams and bigrams hashed into
+    `dim` signed buckets, log-scaled and L2-normalized. No model needed, and
+    stable across processes, so it doubles as the test stand-in.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f'hashing-{dim}'
+
+    def _bucket(self, feature: str):
+        h = int.from_bytes(hashlib.md5(feature.encode('utf-8')).digest()[:8], 'little')
+        return h % self.dim, (1.0 if (h >> 63) & 1 else -1.0)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = [t[:-1] if len(t) > 3 and t.endswith('s') else t
+                      for t in _TOKEN_RE.findall((text or '').lower()) if t not in _STOPWORDS]
+            counts: Dict[str, int] = {}
+            for feature in tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]:
+                counts[feature] = counts.get(feature, 0) + 1
+            for feature, n in counts.items():
+                bucket, sign = self._bucket(feature)
+                out[i, bucket] += sign * (1.0 + np.log(n))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms == 0, 1.0, norms)
+
+
+class OllamaEmbedder:
+    """Embeddings from the local Ollama server (POST /api/embed)"""
+
+    def __init__(self, model: str = AI_RETRIEVAL_EMBED_MODEL, batch_size: int = 64):
+        self.model = model
+        self.batch_size = batch_size
+        self.name = f'ollama-{model}'
+        self.dim: Optional[int] = None
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        import ollama_client
+        rows = []
+        for i in range(0, len(texts), self.batch_size):
+            r = ollama_client.session().post(
+                f"{ollama_client.OLLAMA_URL}/api/embed",
+                json={"model": self.model, "input": texts[i:i + self.batch_size]},
+                timeout=ollama_client.OLLAMA_TIMEOUT,
+            )
+            if not r.ok:
+                raise ollama_client.OllamaError(r.status_code, r.text)
+            rows.extend(r.json().get('embeddings') or [])
+        out = np.asarray(rows, dtype=np.float32).reshape(len(texts), -1)
+        self.dim = out.shape[1]
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms == 0, 1.0, norms)
+
+
+EMBEDDERS: Dict[str, Callable[[], Any]] = {
+    'hashing': HashingEmbedder,
+    'ollama': OllamaEmbedder,
+}
+
+
+def create_embedder(name: str = AI_RETRIEVAL_EMBEDDER):
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown AI_RETRIEVAL_EMBEDDER: {name}")
+    return EMBEDDERS[name]()
+
+
+# ---- Index ----
+
+class VectorIndex:
+    """Cosine-similarity index of id -> text, persisted as .npy + meta.json"""
+
+    def __init__(self, path: str, embedder):
+        self.path = path
+        self.embedder = embedder
+        self._lock = threading.Lock()
+        self._ids: List[Optional[str]] = []      # row -> doc id (None = removed)
+        self._docs: Dict[str, Dict[str, Any]] = {}  # doc id -> {row, text, hash}
+        self._vectors: Optional[np.ndarray] = None
+        self._dead = 0
+
+    @property
+    def _vectors_file(self) -> str:
+        return os.path.join(self.path, 'vectors.npy')
+
+    @property
+    def _meta_file(self) -> str:
+        return os.path.join(self.path, 'meta.json')
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def load(self) -> int:
+        """Open a saved index (memory-mapped); ignored if built by another embedder"""
+        if not (os.path.exists(self._meta_file) and os.path.exists(self._vectors_file)):
+            return 0
+        with open(self._meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        vectors = np.load(self._vectors_file, mmap_mode='r')
+        if meta.get('embedder') != self.embedder.name or len(meta.get('ids', [])) != vectors.shape[0]:
+            print(f"⚠️  AI index at {self.path} is stale, rebuilding")
+            return 0
+        with self._lock:
+            self._vectors = vectors
+            self._ids = meta['ids']
+            self._docs = {
+                doc_id: {'row': row, 'text': meta['texts'][row], 'hash': meta['hashes'][row]}
+                for row, doc_id in enumerate(self._ids)
+            }
+            self._dead = 0
+        metrics.set_gauge('ai.retrieval.docs', len(self._docs))
+        return len(self._docs)
+
+    def upsert(self, docs: Dict[str, str]) -> int:
+        """Embed and store new or changed documents; returns how many were embedded"""
+        changed = {}
+        with self._lock:
+            for doc_id, text in docs.items():
+                digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+                current = self._docs.get(doc_id)
+                if current is None or current['hash'] != digest:
+                    changed[doc_id] = (text, digest)
+        if not changed:
+            return 0
+        ids = list(changed)
+        vectors = self.embedder.embed([changed[i][0] for i in ids])
+        with self._lock:
+            base = self._writable_locked(vectors.shape[1])
+            appended = []
+            for doc_id, vector in zip(ids, vectors):
+                text, digest = changed[doc_id]
+                current = self._docs.get(doc_id)
+                if current is not None:
+                    base[current['row']] = vector
+                    current.update(text=text, hash=digest)
+                else:
+                    self._docs[doc_id] = {'row': len(self._ids), 'text': text, 'hash': digest}
+                    self._ids.append(doc_id)
+                    appended.append(vector)
+            self._vectors = np.vstack([base] + appended) if appended else base
+        metrics.incr('ai.retrieval.embedded', len(ids))
+        return len(ids)
+
+    def remove(self, doc_ids: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for doc_id in doc_ids:
+                current = self._docs.pop(doc_id, None)
+                if current is None:
+                    continue
+                base = self._writable_locked(self._vectors.shape[1])
+                base[current['row']] = 0.0
+                self._ids[current['row']] = None
+                self._dead += 1
+                removed += 1
+        return removed
+
+    def sync(self, docs: Dict[str, str], prefix: str) -> Dict[str, int]:
+        """Make the documents under `prefix` match `docs` exactly, then save"""
+        embedded = self.upsert(docs)
+        with self._lock:
+            stale = [d for d in self._docs if d.startswith(prefix) and d not in docs]
+        removed = self.remove(stale)
+        if embedded or removed:
+            self.save()
+        return {'embedded': embedded, 'removed': removed, 'total': len(self._docs)}
+
+    def save(self):
+        """Compact removed rows and write vectors.npy + meta.json atomically"""
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            if self._vectors is None:
+                return
+            if self._dead:
+                live = [row for row, doc_id in enumerate(self._ids) if doc_id is not None]
+                self._vectors = np.ascontiguousarray(self._vectors[live])
+                self._ids = [self._ids[row] for row in live]
+                for row, doc_id in enumerate(self._ids):
+                    self._docs[doc_id]['row'] = row
+                self._dead = 0
+            meta = {
+                'embedder': self.embedder.name,
+                'dim': int(self._vectors.shape[1]),
+                'ids': self._ids,
+                'texts': [self._docs[d]['text'] for d in self._ids],
+                'hashes': [self._docs[d]['hash'] for d in self._ids],
+                'savedAt': time.time(),
+            }
+            tmp = self._vectors_file + '.tmp.npy'
+            np.save(tmp, np.asarray(self._vectors, dtype=np.float32))
+            os.replace(tmp, self._vectors_file)
+            with open(self._meta_file + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(self._meta_file + '.tmp', self._meta_file)
+            self._vectors = np.load(self._vectors_file, mmap_mode='r')
+        metrics.set_gauge('ai.retrieval.docs', len(self._docs))
+
+    def search(self, query: str, k: int = AI_RETRIEVAL_TOP_K, min_score: float = AI_RETRIEVAL_MIN_SCORE) -> List[Dict[str, Any]]:
+        """Top-k documents by cosine similarity, best first"""
+        with self._lock:
+            if not self._docs:
+                return []
+        q = self.embedder.embed([query])[0]
+        with self._lock:
+            scores = np.asarray(self._vectors @ q)
+            ids = list(self._ids)
+            k = min(k, len(ids))
+            top = np.argpartition(-scores, k - 1)[:k] if k else []
+            hits = [
+                {'id': ids[row], 'text': self._docs[ids[row]]['text'], 'score': float(scores[row])}
+                for row in top if ids[row] is not None and scores[row] >= min_score
+            ]
+        return sorted(hits, key=lambda h: -h['score'])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'path': self.path,
+                'embedder': self.embedder.name,
+                'docs': len(self._docs),
+                'books': sum(1 for d in self._docs if d.startswith('book:')),
+                'policy': sum(1 for d in self._docs if d.startswith('policy:')),
+                'dim': int(self._vectors.shape[1]) if self._vectors is not None else None,
+                'mmapped': isinstance(self._vectors, np.memmap),
+            }
+
+    def _writable_locked(self, dim: int) -> np.ndarray:
+        """In-memory copy of the (possibly read-only mmapped) vectors"""
+        if self._vectors is None:
+            self._vectors = np.zeros((0, dim), dtype=np.float32)
+        elif isinstance(self._vectors, np.memmap) or not self._vectors.flags.writeable:
+            self._vectors = np.array(self._vectors, dtype=np.float32)
+        return self._vectors
+
+
+# ---- Documents ----
+
+def policy_docs() -> Dict[str, str]:
+    """Library policy snippets: the intent answers plus paragraphs of AI_RETRIEVAL_POLICY_FILE"""
+    import ai_intents
+    docs = {
+        'policy:hours': ai_intents.library_hours_text(),
+        'policy:borrowing': ai_intents.BORROWING_RULES,
+        'policy:reserve': ai_intents.RESERVE_HOWTO,
+    }
+    if AI_RETRIEVAL_POLICY_FILE and os.path.exists(AI_RETRIEVAL_POLICY_FILE):
+        with open(AI_RETRIEVAL_POLICY_FILE, 'r', encoding='utf-8') as f:
+            paragraphs = [p.strip() for p in f.read().split('\n\n') if p.strip()]
+        for i, paragraph in enumerate(paragraphs):
+            docs[f'policy:file:{i}'] = paragraph
+    return docs
+
+
+def book_text(book: Dict[str, Any]) -> str:
+    parts = [f"Book \"{book.get('title') or book.get('id')}\""]
+    if book.get('author'):
+        parts[0] += f" by {book['author']}"
+    for label, key in (('Category', 'category'), ('ISBN', 'isbn'), ('Shelf', 'shelf'), ('Status', 'status')):
+        if book.get(key):
+            parts.append(f"{label}: {book[key]}")
+    if book.get('copies') is not None and book.get('available') is not None:
+        parts.append(f"{book['available']} of {book['copies']} copies available")
+    if book.get('description'):
+        parts.append(str(book['description']))
+    return '. '.join(parts) + '.'
+
+
+def book_docs(books: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    return {f"book:{b['id']}": book_text(b) for b in books if b.get('id') is not None}
+
+
+# ---- Process-wide index ----
+
+_index: Optional[VectorIndex] = None
+
+
+def init_retrieval_index(embedder=None, path: str = AI_RETRIEVAL_PATH) -> VectorIndex:
+    """Create the process-wide index and open what was saved on disk"""
+    global _index
+    _index = VectorIndex(path, embedder or create_embedder())
+    try:
+        _index.load()
+    except Exception as e:
+        print(f"⚠️  AI index not loaded: {e}")
+    return _index
+
+
+def get_retrieval_index() -> Optional[VectorIndex]:
+    return _index
+
+
+def refresh(index: Optional[VectorIndex] = None) -> Dict[str, Any]:
+    """Incrementally sync policy text and the books table into the index"""
+    from db import execute_query
+    index = index if index is not None else _index
+    start = time.perf_counter()
+    result = {'policy': index.sync(policy_docs(), 'policy:')}
+    books = execute_query("SELECT * FROM books", fetch_all=True) or []
+    result['books'] = index.sync(book_docs(books), 'book:')
+    if any(r['embedded'] or r['removed'] for r in result.values()):
+        invalidate_cached_replies()
+    metrics.observe('ai.retrieval.refresh_ms', (time.perf_counter() - start) * 1000.0)
+    return result
+
+
+def invalidate_cached_replies():
+    """
+    Drop cached chat replies after the index changed: they may quote a book's
+    status or available copies, and their cache key is the plain question
+    """
+    from ai_response_cache import response_cache
+    response_cache.invalidate()
+
+
+def build_context(query: str, k: int = AI_RETRIEVAL_TOP_K, max_tokens: int = AI_RETRIEVAL_MAX_TOKENS) -> str:
+    """Best snippets for the query, as many as fit in max_tokens"""
+    if _index is None or not query:
+        return ''
+    start = time.perf_counter()
+    hits = _index.search(query, k)
+    metrics.observe('ai.retrieval.query_ms', (time.perf_counter() - start) * 1000.0)
+    lines, used = [], 0
+    for hit in hits:
+        cost = estimate_tokens(hit['text']) + 1
+        if used + cost > max_tokens:
+            continue
+        lines.append(f"- {hit['text']}")
+        used += cost
+    metrics.incr('ai.retrieval.hits' if lines else 'ai.retrieval.misses')
+    if not lines:
+        return ''
+    return "Library catalog and policy excerpts (use them when relevant):\n" + "\n".join(lines)
+
+
+def with_context(messages: List[Dict[str, str]], context: str) -> List[Dict[str, str]]:
+    """
+    Copy of the chat with the snippets as a system message right before the
+    new user message. The system prompt and history stay byte-identical across
+    turns, so Ollama can reuse their evaluated prefix (see ai_session_context).
+    """
+    if not context:
+        return messages
+    return messages[:-1] + [{'role': 'system', 'content': context}, messages[-1]]
+
+
+def augment(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Copy of the chat with retrieved snippets for the new message"""
+    if not AI_RETRIEVAL_ENABLED or _index is None or not messages or messages[0].get('role') != 'system':
+        return messages
+    try:
+        context = build_context(messages[-1].get('content', ''))
+    except Exception as e:
+        print(f"Error retrieving AI context: {e}")
+        return messages
+    return with_context(messages, context)
+
+
+def register_ai_retrieval_endpoints(app, socketio=None):
+    """Open the index, keep it synced with the books table, and register admin endpoints"""
+    if not AI_RETRIEVAL_ENABLED:
+        print("⚠️  AI retrieval disabled (AI_RETRIEVAL_ENABLED=false)")
+        return
+    index = init_retrieval_index()
+
+    @app.route('/api/ai/index/stats', methods=['GET'])
+    def ai_index_stats():
+        out = index.stats()
+        out['queryMs'] = metrics.summary('ai.retrieval.query_ms')
+        out['refreshMs'] = metrics.summary('ai.retrieval.refresh_ms')
+        return jsonify(out)
+
+    @app.route('/api/admin/ai-index/refresh', methods=['POST'])
+    def ai_index_refresh():
+        try:
+            return jsonify(ok=True, **refresh(index))
+        except Exception as e:
+            return jsonify(ok=False, error=str(e)), 500
+
+    @app.route('/api/admin/ai-index/books', methods=['POST'])
+    def ai_index_books():
+        """{"books": [{id, title, author, ...}], "removed": [id, ...]} from book create/update/delete"""
+        body = request.get_json(silent=True) or {}
+        embedded = index.upsert(book_docs(body.get('books') or []))
+        removed = index.remove(f'book:{i}' for i in body.get('removed') or [])
+        if embedded or removed:
+            index.save()
+            invalidate_cached_replies()
+        return jsonify(ok=True, embedded=embedded, removed=removed, total=len(index))
+
+    if socketio is not None:
+        def _refresh_loop():
+            while True:
+                try:
+                    refresh(index)
+                except Exception as e:
+                    print(f"Error refreshing AI index: {e}")
+                socketio.sleep(AI_RETRIEVAL_REFRESH_SECONDS)
+
+        socketio.start_background_task(_refresh_loop)
+
+    print("✅ AI retrieval endpoints registered")
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+AI Request Scheduler
+Bounded queue in front of Ollama. Only AI_MAX_CONCURRENCY requests run at
+once (match it to OLLAMA_NUM_PARALLEL); waiting requests are granted
+round-robin across users so one user's burst can't starve everyone else.
+
+- Priority classes: admin (interactive admin chat and commands), chat
+  (students and guests) and background (summaries, message generation).
+  The free slot goes to the class with the highest priority plus aging
+  (one level per AI_PRIORITY_AGING_SECONDS its oldest request has waited),
+  so background work is delayed but never starved; per-class caps
+  (AI_<CLASS>_CONCURRENCY) keep bulk jobs from taking every slot
+- Rejects when the queue (AI_QUEUE_MAX) or the user's share
+  (AI_QUEUE_PER_USER) is full, and when a request waited past AI_QUEUE_MAX_WAIT
+- position(ticket) gives queue position feedback for streaming clients
+- Metrics: ai.queue.depth / running (gauges, also per class as
+  ai.queue.running.<class>), ai.queue.wait_ms and ai.queue.wait_ms.<class>,
+  ai.queue.aged, ai.queue.rejected.full / user_limit, ai.queue.timeouts
+- GET /api/ai/queue returns stats and the caller's queued positions
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+
+AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', os.getenv('OLLAMA_NUM_PARALLEL', '1')))
+AI_QUEUE_MAX = int(os.getenv('AI_QUEUE_MAX', '50'))
+AI_QUEUE_PER_USER = int(os.getenv('AI_QUEUE_PER_USER', '3'))
+AI_QUEUE_MAX_WAIT = float(os.getenv('AI_QUEUE_MAX_WAIT', '30'))
+AI_PRIORITY_AGING_SECONDS = float(os.getenv('AI_PRIORITY_AGING_SECONDS', '10'))
+POLL_SECONDS = 0.05
+
+ADMIN, CHAT, BACKGROUND = 'admin', 'chat', 'background'
+# Base priority per class; higher is granted first
+PRIORITIES = {ADMIN: 2, CHAT: 1, BACKGROUND: 0}
+CLASS_CONCURRENCY = {
+    ADMIN: int(os.getenv('AI_ADMIN_CONCURRENCY') or AI_MAX_CONCURRENCY),
+    CHAT: int(os.getenv('AI_CHAT_CONCURRENCY') or AI_MAX_CONCURRENCY),
+    # Leaves a slot for interactive requests when Ollama runs more than one in parallel; with a
+    # single slot, background jobs take it per short model call so chat waits for one call at most
+    BACKGROUND: int(os.getenv('AI_BACKGROUND_CONCURRENCY') or max(1, AI_MAX_CONCURRENCY - 1)),
+}
+AI_PRIORITY_CACHE_SECONDS = 300
+
+
+class SchedulerRejected(Exception):
+    """Request not admitted (queue full, user limit, or waited too long)"""
+
+    def __init__(self, reason: str, retry_after: float = 5.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    __slots__ = ('id', 'user_id', 'priority', 'enqueued_at', 'granted', 'done')
+
+    def __init__(self, user_id: str, priority: str = CHAT):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.priority = priority
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+        self.done = False
+
+
+class FairScheduler:
+    """Priority classes with aging; round-robin across per-user FIFO queues within a class"""
+
+    def __init__(
+        self,
+        max_concurrency: int = AI_MAX_CONCURRENCY,
+        max_queue: int = AI_QUEUE_MAX,
+        per_user: int = AI_QUEUE_PER_USER,
+        max_wait: float = AI_QUEUE_MAX_WAIT,
+        sleep: Callable[[float], None] = time.sleep,
+        class_concurrency: Optional[Dict[str, int]] = None,
+        aging_seconds: float = AI_PRIORITY_AGING_SECONDS
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.per_user = per_user
+        self.max_wait = max_wait
+        self.class_concurrency = {c: max(1, n) for c, n in {**CLASS_CONCURRENCY, **(class_concurrency or {})}.items()}
+        self.aging_seconds = aging_seconds
+        # Waiting polls instead of blocking on a Condition so it works under eventlet (socketio.sleep)
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        # priority class -> user -> queued tickets
+        self._queues: Dict[str, Dict[str, deque]] = {c: {} for c in PRIORITIES}
+        self._rr: Dict[str, deque] = {c: deque() for c in PRIORITIES}  # users with queued tickets, in grant order
+        self._running = 0
+        self._running_by_class: Dict[str, int] = {c: 0 for c in PRIORITIES}
+        self._per_user: Dict[str, int] = {}  # queued + running per user
+
+    # ---- low-level API (used by streaming handlers) ----
+
+    def submit(self, user_id: str, priority: str = CHAT) -> Ticket:
+        """Queue a request in a priority class; raises SchedulerRejected when full"""
+        if priority not in PRIORITIES:
+            raise ValueError(f'Unknown AI priority class: {priority}')
+        ticket = Ticket(user_id or 'anonymous', priority)
+        with self._lock:
+            depth = self._depth_locked()
+            queues = self._queues[priority]
+            queue = queues.get(ticket.user_id)
+            if depth >= self.max_queue:
+                metrics.incr('ai.queue.rejected.full')
+                raise SchedulerRejected('AI queue is full', self._retry_after_locked())
+            if self._per_user.get(ticket.user_id, 0) >= self.per_user:
+                metrics.incr('ai.queue.rejected.user_limit')
+                raise SchedulerRejected('Too many AI requests in progress for this user', self._retry_after_locked())
+            if queue is None:
+                queue = queues[ticket.user_id] = deque()
+                self._rr[priority].append(ticket.user_id)
+            queue.append(ticket)
+            self._per_user[ticket.user_id] = self._per_user.get(ticket.user_id, 0) + 1
+            self._grant_locked()
+            self._gauges_locked()
+        return ticket
+
+    def wait(self, ticket: Ticket, timeout: Optional[float] = None) -> bool:
+        """
+        Wait up to timeout seconds for a slot. Returns True once granted, False
+        if still queued; raises SchedulerRejected past max_wait (ticket is dropped).
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not ticket.granted:
+            waited = time.perf_counter() - ticket.enqueued_at
+            if self.max_wait and waited >= self.max_wait:
+                if not self.cancel(ticket):
+                    return True  # granted in the race with cancel
+                metrics.incr('ai.queue.timeouts')
+                raise SchedulerRejected('Timed out waiting for the AI model', self.max_wait)
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            self.sleep(POLL_SECONDS)
+        return True
+
+    def release(self, ticket: Ticket):
+        """Free the slot of a granted ticket (or drop a queued one)"""
+        with self._lock:
+            if ticket.done:
+                return
+            ticket.done = True
+            self._forget_locked(ticket)
+            if ticket.granted:
+                self._running -= 1
+                self._running_by_class[ticket.priority] -= 1
+            else:
+                self._remove_locked(ticket)
+            self._grant_locked()
+            self._gauges_locked()
+
+    def cancel(self, ticket: Ticket) -> bool:
+        """Drop a still-queued ticket; returns False if it was already granted"""
+        with self._lock:
+            if ticket.granted or ticket.done:
+                return False
+            ticket.done = True
+            self._forget_locked(ticket)
+            self._remove_locked(ticket)
+            self._gauges_locked()
+        return True
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based position in the grant order (as of now: aging can still reorder classes); 0 once running"""
+        with self._lock:
+            if ticket.granted or ticket.done:
+                return 0
+            queues = self._queues[ticket.priority]
+            queue = queues.get(ticket.user_id)
+            if not queue or ticket not in queue:
+                return 0
+            index = list(queue).index(ticket)
+            ahead = index
+            order = list(self._rr[ticket.priority])
+            mine = order.index(ticket.user_id)
+            for i, uid in enumerate(order):
+                if uid == ticket.user_id:
+                    continue
+                # Users before us in rotation get index+1 grants first, the rest index
+                ahead += min(len(queues[uid]), index + (1 if i < mine else 0))
+            # Classes currently ranked above ours go first
+            now = time.perf_counter()
+            mine_score = self._score_locked(ticket.priority, now)
+            for cls, users in self._queues.items():
+                if cls != ticket.priority and users and self._score_locked(cls, now) > mine_score:
+                    ahead += sum(len(q) for q in users.values())
+            return ahead + 1
+
+    @contextmanager
+    def slot(
+        self,
+        user_id: str,
+        on_position: Optional[Callable[[int], None]] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+        priority: str = CHAT
+    ):
+        """Run a block once a slot is granted; reports position changes while waiting"""
+        ticket = self.submit(user_id, priority)
+        try:
+            last = None
+            while not self.wait(ticket, timeout=1.0):
+                if cancelled and cancelled():
+                    raise SchedulerRejected('Request cancelled', 0)
+                pos = self.position(ticket)
+                if on_position and pos != last:
+                    on_position(pos)
+                last = pos
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            classes = {
+                cls: {
+                    'priority': PRIORITIES[cls],
+                    'maxConcurrency': self.class_concurrency[cls],
+                    'running': self._running_by_class[cls],
+                    'queued': sum(len(q) for q in users.values()),
+                    'waitMs': metrics.summary(f'ai.queue.wait_ms.{cls}'),
+                }
+                for cls, users in self._queues.items()
+            }
+            users = {uid for queues in self._queues.values() for uid in queues}
+            return {
+                'maxConcurrency': self.max_concurrency,
+                'maxQueue': self.max_queue,
+                'perUser': self.per_user,
+                'maxWait': self.max_wait,
+                'agingSeconds': self.aging_seconds,
+                'running': self._running,
+                'queued': self._depth_locked(),
+                'queuedUsers': len(users),
+                'waitMs': metrics.summary('ai.queue.wait_ms'),
+                'classes': classes,
+            }
+
+    def user_positions(self, user_id: str) -> List[int]:
+        with self._lock:
+            tickets = [t for queues in self._queues.values() for t in queues.get(user_id) or ()]
+        return [self.position(t) for t in tickets]
+
+    # ---- internals ----
+
+    def _score_locked(self, cls: str, now: float) -> float:
+        """Base priority plus one level per aging_seconds the class's oldest request has waited"""
+        oldest = min(q[0].enqueued_at for q in self._queues[cls].values())
+        return PRIORITIES[cls] + (now - oldest) / self.aging_seconds if self.aging_seconds > 0 else PRIORITIES[cls]
+
+    def _next_class_locked(self) -> Optional[str]:
+        now = time.perf_counter()
+        best, best_score = None, None
+        for cls, rr in self._rr.items():
+            if not rr or self._running_by_class[cls] >= self.class_concurrency[cls]:
+                continue
+            score = self._score_locked(cls, now)
+            if best is None or score > best_score or (score == best_score and PRIORITIES[cls] > PRIORITIES[best]):
+                best, best_score = cls, score
+        if best is not None and any(
+            self._rr[c] and PRIORITIES[c] > PRIORITIES[best] and self._running_by_class[c] < self.class_concurrency[c]
+            for c in self._rr
+        ):
+            metrics.incr('ai.queue.aged')
+        return best
+
+    def _grant_locked(self):
+        while self._running < self.max_concurrency:
+            cls = self._next_class_locked()
+            if cls is None:
+                break
+            rr, queues = self._rr[cls], self._queues[cls]
+            uid = rr.popleft()
+            queue = queues[uid]
+            ticket = queue.popleft()
+            ticket.granted = True
+            self._running += 1
+            self._running_by_class[cls] += 1
+            waited = (time.perf_counter() - ticket.enqueued_at) * 1000.0
+            metrics.observe('ai.queue.wait_ms', waited)
+            metrics.observe(f'ai.queue.wait_ms.{cls}', waited)
+            if queue:
+                rr.append(uid)
+            else:
+                del queues[uid]
+
+    def _remove_locked(self, ticket: Ticket):
+        queues = self._queues[ticket.priority]
+        queue = queues.get(ticket.user_id)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del queues[ticket.user_id]
+                self._rr[ticket.priority].remove(ticket.user_id)
+
+    def _forget_locked(self, ticket: Ticket):
+        left = self._per_user.get(ticket.user_id, 0) - 1
+        if left > 0:
+            self._per_user[ticket.user_id] = left
+        else:
+            self._per_user.pop(ticket.user_id, None)
+
+    def _depth_locked(self) -> int:
+        return sum(len(q) for queues in self._queues.values() for q in queues.values())
+
+    def _gauges_locked(self):
+        metrics.set_gauge('ai.queue.depth', self._depth_locked())
+        metrics.set_gauge('ai.queue.running', self._running)
+        for cls, running in self._running_by_class.items():
+            metrics.set_gauge(f'ai.queue.running.{cls}', running)
+
+    def _retry_after_locked(self) -> float:
+        avg = metrics.summary('ai.queue.wait_ms').get('avg') or 5000.0
+        return round(max(1.0, avg / 1000.0), 1)
+
+
+_scheduler: Optional[FairScheduler] = None
+
+
+def init_ai_scheduler(socketio=None) -> FairScheduler:
+    """Create the process-wide scheduler (waits via socketio.sleep when given)"""
+    global _scheduler
+    _scheduler = FairScheduler(sleep=socketio.sleep if socketio is not None else time.sleep)
+    return _scheduler
+
+
+def get_ai_scheduler() -> FairScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FairScheduler()
+    return _scheduler
+
+
+_priorities: Dict[str, Any] = {}  # account id -> (class, resolved at)
+
+
+def priority_for(account_id: Optional[str]) -> str:
+    """Priority class of a chat caller: admin for accounts in the admins table, chat otherwise"""
+    if not account_id:
+        return CHAT
+    cached = _priorities.get(account_id)
+    if cached is not None and time.time() - cached[1] < AI_PRIORITY_CACHE_SECONDS:
+        return cached[0]
+    try:
+        from db import AdminDB
+        cls = ADMIN if AdminDB.get_admin_by_id(account_id) else CHAT
+    except Exception:
+        return cached[0] if cached else CHAT
+    if len(_priorities) > 10000:
+        _priorities.clear()
+    _priorities[account_id] = (cls, time.time())
+    return cls
+
+
+def register_ai_queue_endpoints(app):
+    """Register GET /api/ai/queue"""
+    from flask import request, jsonify
+
+    @app.route('/api/ai/queue', methods=['GET'])
+    def ai_queue_status():
+        scheduler = get_ai_scheduler()
+        user_id = request.headers.get('X-User-Id') or request.args.get('userId')
+        out = scheduler.stats()
+        if user_id:
+            out['positions'] = scheduler.user_positions(user_id)
+        return jsonify(out)
+
+    print("✅ AI queue endpoint registered")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+AI Session Context Reuse
+Ollama's /api/chat has no context handle to pass back (the `context` array of
+/api/generate is deprecated), but its runner keeps the KV cache of the last
+prompt and only evaluates the part of a new prompt after the longest common
+prefix. Reuse therefore comes from keeping each session's prompt prefix
+byte-stable from turn to turn:
+
+- the system prompt is shared and never changes (retrieval snippets go
+  right before the new message, not into it; see ai_retrieval.augment)
+- the history window is pinned: instead of sliding by one turn when the
+  budget is full (which changes the prefix and forces a full re-evaluation
+  every turn), ai_memory drops a block of old turns once and then appends
+  to the same start for the next turns
+- this module keeps the pinned window per session, with LRU
+  (AI_SESSION_CONTEXT_SESSIONS) and idle-TTL (AI_SESSION_CONTEXT_TTL, match
+  OLLAMA_KEEP_ALIVE: once the model is unloaded its cache is gone) eviction
+
+Metrics: ai.prompt_eval.tokens / ms (from every Ollama reply, in
+ollama_client), ai.session_context.hits / repins / evictions
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import metrics
+
+AI_SESSION_CONTEXT_ENABLED = os.getenv('AI_SESSION_CONTEXT_ENABLED', 'true').lower() == 'true'
+AI_SESSION_CONTEXT_SESSIONS = int(os.getenv('AI_SESSION_CONTEXT_SESSIONS', '500'))
+AI_SESSION_CONTEXT_TTL = int(os.getenv('AI_SESSION_CONTEXT_TTL', '1800'))
+# Share of the history room used right after re-pinning; the rest is room to append turns
+AI_SESSION_CONTEXT_REFILL = float(os.getenv('AI_SESSION_CONTEXT_REFILL', '0.6'))
+
+
+def turn_key(turn: Dict[str, str]) -> str:
+    return hashlib.sha1(f"{turn['role']}\x00{turn['content']}".encode('utf-8')).hexdigest()
+
+
+class SessionContextCache:
+    """Pinned history window start per chat session"""
+
+    def __init__(
+        self,
+        max_sessions: int = AI_SESSION_CONTEXT_SESSIONS,
+        ttl: int = AI_SESSION_CONTEXT_TTL,
+        refill: float = AI_SESSION_CONTEXT_REFILL
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.refill = refill
+        self._lock = threading.Lock()
+        # session id -> {'window': turn keys of the kept turns at the last request, 'usedAt'}
+        self._sessions: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+    def window_start(self, session_id: str, turns: List[Dict[str, str]]) -> Optional[int]:
+        """Index in `turns` where the session's pinned window begins, or None (not pinned / stale)"""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if now - entry['usedAt'] > self.ttl:
+                del self._sessions[session_id]
+                metrics.incr('ai.session_context.evictions')
+                return None
+            entry['usedAt'] = now
+            self._sessions.move_to_end(session_id)
+            window = entry['window']
+        # The last window must reappear unchanged, followed only by new turns
+        keys = [turn_key(t) for t in turns]
+        for i in range(len(keys) - len(window), -1, -1):
+            if keys[i:i + len(window)] == window:
+                return i
+        return None
+
+    def pin(self, session_id: str, turns: List[Dict[str, str]], start: int):
+        """Remember that the session's window is turns[start:]"""
+        window = [turn_key(t) for t in turns[start:]]
+        with self._lock:
+            self._sessions[session_id] = {'window': window, 'usedAt': time.time()}
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                metrics.incr('ai.session_context.evictions')
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_stale(self) -> int:
+        """Drop sessions idle for longer than the TTL"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            stale = [sid for sid, e in self._sessions.items() if e['usedAt'] < cutoff]
+            for sid in stale:
+                del self._sessions[sid]
+        if stale:
+            metrics.incr('ai.session_context.evictions', len(stale))
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._sessions)
+        return {
+            'enabled': AI_SESSION_CONTEXT_ENABLED,
+            'sessions': size,
+            'maxSessions': self.max_sessions,
+            'ttl': self.ttl,
+            'hits': metrics.counter('ai.session_context.hits'),
+            'repins': metrics.counter('ai.session_context.repins'),
+            'evictions': metrics.counter('ai.session_context.evictions'),
+            'promptEvalTokens': metrics.summary('ai.prompt_eval.tokens'),
+            'promptEvalMs': metrics.summary('ai.prompt_eval.ms'),
+        }
+
+
+_cache: Optional[SessionContextCache] = None
+
+
+def get_session_contexts() -> Optional[SessionContextCache]:
+    """The process-wide cache, or None when AI_SESSION_CONTEXT_ENABLED=false"""
+    global _cache
+    if _cache is None and AI_SESSION_CONTEXT_ENABLED:
+        _cache = SessionContextCache()
+    return _cache
+
+
+def register_ai_session_context_endpoints(app, socketio=None):
+    """Expose reuse stats and sweep idle sessions in the background"""
+    from flask import jsonify
+    cache = get_session_contexts()
+    if cache is None:
+        print("⚠️  AI session context reuse disabled (AI_SESSION_CONTEXT_ENABLED=false)")
+        return
+
+    @app.route('/api/ai/context/stats', methods=['GET'])
+    def ai_session_context_stats():
+        return jsonify(cache.stats())
+
+    if socketio is not None:
+        def _sweep_loop():
+            while True:
+                socketio.sleep(max(60, cache.ttl // 4))
+                cache.evict_stale()
+
+        socketio.start_background_task(_sweep_loop)
+    print("✅ AI session context endpoints registered")
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+AI Chat Token Streaming
+Relays Ollama's streamed chunks to the browser as they are generated.
+
+Server-Sent Events:
+    POST /ai/chat/stream  (alias /api/ai/chat/stream), same body as /ai/chat
+    event: queued data: {"position": n}        (while waiting for a model slot)
+    event: token  data: {"delta": "..."}
+    event: done   data: {"content": "...", "ttftMs": n, "totalMs": n, "cached"?: true, "intent"?: "..."}
+    event: error  data: {"error": "...", "fallback"?: "...", "retryAfter"?: n}
+
+Socket.IO:
+    emit('ai.chat.start', {requestId, message, history})
+    <- 'ai.chat.queued' {requestId, position}
+    <- 'ai.chat.token' {requestId, delta}
+    <- 'ai.chat.done'  {requestId, content, ttftMs, totalMs}
+    <- 'ai.chat.error' {requestId, error}
+    emit('ai.chat.cancel', {requestId})
+
+A closed SSE connection, ai.chat.cancel or a socket disconnect closes the
+upstream Ollama request so generation stops.
+"""
+
+import json
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from flask import Response, jsonify, request, stream_with_context
+import metrics
+import ollama_client
+from ai_scheduler import get_ai_scheduler, priority_for, SchedulerRejected
+from ai_response_cache import response_cache
+import ai_intents
+import ai_retrieval
+from ai_memory import get_conversation_memory
+from ai_conversations import chat_messages, record_exchange, SessionAccessError
+import ai_health
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _unavailable(retry_after: float) -> Dict[str, Any]:
+    return {'error': 'AI model is temporarily unavailable', 'fallback': ai_health.FALLBACK_MESSAGE,
+            'retryAfter': round(retry_after, 1)}
+
+
+def _reply_meta(result: Dict[str, Any]) -> Dict[str, Any]:
+    """How a streamed reply was produced, stored with it for ai_analytics"""
+    return {'source': 'llm', 'latencyMs': round(result['totalMs'] or 0), 'ttftMs': round(result['ttftMs'] or 0)}
+
+
+class TimedRelay:
+    """
+    Iterates the content deltas of a streamed chat while recording
+    time-to-first-token, total time and cancellations. close() stops it early.
+    """
+
+    def __init__(self, messages):
+        self.start = time.perf_counter()
+        self.stream = ollama_client.ChatStream(messages)
+        self.ttft_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+        self.parts = []
+        self.completed = False
+        self.failed = False
+        self._closed = False
+        metrics.incr('ai.stream.started')
+
+    def __iter__(self):
+        try:
+            for delta in self.stream:
+                if self.ttft_ms is None:
+                    self.ttft_ms = (time.perf_counter() - self.start) * 1000.0
+                    metrics.observe('ai.stream.ttft_ms', self.ttft_ms)
+                self.parts.append(delta)
+                metrics.incr('ai.stream.chunks')
+                yield delta
+            self.completed = True
+            self.total_ms = (time.perf_counter() - self.start) * 1000.0
+            metrics.observe('ai.stream.total_ms', self.total_ms)
+        except Exception:
+            self.failed = True
+            metrics.incr('ai.stream.errors')
+            raise
+        finally:
+            self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.stream.close()
+        if not self.completed and not self.failed:
+            metrics.incr('ai.stream.cancelled')
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            'content': ''.join(self.parts),
+            'ttftMs': round(self.ttft_ms, 1) if self.ttft_ms is not None else None,
+            'totalMs': round(self.total_ms, 1) if self.total_ms is not None else None,
+        }
+
+
+class _SocketStreams:
+    """Active socket streams by (sid, requestId), for cancellation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Dict[tuple, threading.Event] = {}
+
+    def open(self, sid: str, request_id: str) -> threading.Event:
+        flag = threading.Event()
+        with self._lock:
+            self._active[(sid, request_id)] = flag
+        return flag
+
+    def close(self, sid: str, request_id: str):
+        with self._lock:
+            self._active.pop((sid, request_id), None)
+
+    def cancel(self, sid: str, request_id: Optional[str] = None) -> int:
+        """Cancel one request, or every request of a connection"""
+        with self._lock:
+            keys = [k for k in self._active if k[0] == sid and (request_id is None or k[1] == request_id)]
+            for k in keys:
+                self._active[k].set()
+        return len(keys)
+
+
+socket_streams = _SocketStreams()
+
+
+def cancel_connection_streams(sid: str) -> int:
+    """Called from the socket disconnect handler"""
+    return socket_streams.cancel(sid)
+
+
+def register_ai_streaming_endpoints(app, socketio=None):
+    """Register the SSE endpoints and the ai.chat.* socket handlers"""
+
+    def ai_chat_stream():
+        body = request.get_json(force=True)
+        account_id = request.headers.get('X-User-Id') or body.get('userId')
+        user_id = account_id or request.remote_addr
+        try:
+            messages, session_id = chat_messages(body, account_id)
+        except SessionAccessError as e:
+            return jsonify(error=str(e)), 403
+
+        def generate():
+            fast = ai_intents.answer(messages[-1]['content'], account_id)
+            if fast is not None:
+                record_exchange(session_id, account_id, messages, fast['content'],
+                                {'source': 'intent', 'intent': fast['intent']})
+                yield _sse('token', {'delta': fast['content']})
+                yield _sse('done', {'content': fast['content'], 'ttftMs': 0, 'totalMs': 0, 'intent': fast['intent']})
+                return
+            cached = response_cache.get(messages)
+            if cached is not None:
+                record_exchange(session_id, account_id, messages, cached, {'source': 'cache'})
+                yield _sse('token', {'delta': cached})
+                yield _sse('done', {'content': cached, 'ttftMs': 0, 'totalMs': 0, 'cached': True})
+                return
+            if ai_health.unavailable():
+                yield _sse('error', _unavailable(ai_health.get_ai_health().breaker.retry_after()))
+                return
+            scheduler = get_ai_scheduler()
+            relay = None
+            try:
+                ticket = scheduler.submit(user_id, priority_for(account_id))
+            except SchedulerRejected as e:
+                yield _sse('error', {'error': e.reason, 'retryAfter': e.retry_after})
+                return
+            # If the browser goes away the pending yield raises GeneratorExit and
+            # the finally below frees the slot and drops the upstream request
+            try:
+                last = None
+                while not scheduler.wait(ticket, timeout=1.0):
+                    pos = scheduler.position(ticket)
+                    if pos != last:
+                        yield _sse('queued', {'position': pos})
+                    last = pos
+                relay = TimedRelay(ai_retrieval.augment(
+                    get_conversation_memory().fit(session_id, messages, account_id)))
+                for delta in relay:
+                    yield _sse('token', {'delta': delta})
+                result = relay.result()
+                response_cache.put(messages, result['content'], result['totalMs'])
+                record_exchange(session_id, account_id, messages, result['content'], _reply_meta(result))
+                yield _sse('done', result)
+            except GeneratorExit:
+                raise
+            except SchedulerRejected as e:
+                yield _sse('error', {'error': e.reason, 'retryAfter': e.retry_after})
+            except ollama_client.OllamaUnavailable as e:
+                yield _sse('error', _unavailable(e.retry_after))
+            except Exception as e:
+                yield _sse('error', {'error': str(e)})
+            finally:
+                if relay is not None:
+                    relay.close()
+                scheduler.release(ticket)
+
+        return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+
+    app.add_url_rule('/ai/chat/stream', 'ai_chat_stream', ai_chat_stream, methods=['POST'])
+    app.add_url_rule('/api/ai/chat/stream', 'api_ai_chat_stream', ai_chat_stream, methods=['POST'])
+
+    if socketio is None:
+        return
+
+    @socketio.on('ai.chat.start')
+    def on_ai_chat_start(data=None):
+        data = data or {}
+        sid = request.sid
+        request_id = str(data.get('requestId') or uuid.uuid4())
+        account_id = data.get('userId') or request.args.get('userId')
+        user_id = account_id or sid
+        try:
+            messages, session_id = chat_messages(data, account_id)
+        except SessionAccessError as e:
+            socketio.emit('ai.chat.error', {'requestId': request_id, 'error': str(e)}, to=sid)
+            return {'requestId': request_id}
+        flag = socket_streams.open(sid, request_id)
+
+        def _queued(position):
+            socketio.emit('ai.chat.queued', {'requestId': request_id, 'position': position}, to=sid)
+
+        def _run():
+            relay = None
+            fast = ai_intents.answer(messages[-1]['content'], account_id)
+            if fast is not None:
+                record_exchange(session_id, account_id, messages, fast['content'],
+                                {'source': 'intent', 'intent': fast['intent']})
+                socketio.emit('ai.chat.token', {'requestId': request_id, 'delta': fast['content']}, to=sid)
+                socketio.emit('ai.chat.done', {'requestId': request_id, 'content': fast['content'],
+                                               'ttftMs': 0, 'totalMs': 0, 'intent': fast['intent']}, to=sid)
+                socket_streams.close(sid, request_id)
+                return
+            cached = response_cache.get(messages)
+            if cached is not None:
+                record_exchange(session_id, account_id, messages, cached, {'source': 'cache'})
+                socketio.emit('ai.chat.token', {'requestId': request_id, 'delta': cached}, to=sid)
+                socketio.emit('ai.chat.done', {'requestId': request_id, 'content': cached,
+                                               'ttftMs': 0, 'totalMs': 0, 'cached': True}, to=sid)
+                socket_streams.close(sid, request_id)
+                return
+            if ai_health.unavailable():
+                socketio.emit('ai.chat.error', {'requestId': request_id,
+                                                **_unavailable(ai_health.get_ai_health().breaker.retry_after())}, to=sid)
+                socket_streams.close(sid, request_id)
+                return
+            try:
+                with get_ai_scheduler().slot(user_id, on_position=_queued, cancelled=flag.is_set,
+                                             priority=priority_for(account_id)):
+                    if flag.is_set():
+                        return
+                    relay = TimedRelay(ai_retrieval.augment(
+                        get_conversation_memory().fit(session_id, messages, account_id)))
+                    for delta in relay:
+                        if flag.is_set():
+                            break
+                        socketio.emit('ai.chat.token', {'requestId': request_id, 'delta': delta}, to=sid)
+                    relay.close()
+                if relay.completed:
+                    result = relay.result()
+                    response_cache.put(messages, result['content'], result['totalMs'])
+                    record_exchange(session_id, account_id, messages, result['content'], _reply_meta(result))
+                    socketio.emit('ai.chat.done', {'requestId': request_id, **result}, to=sid)
+            except SchedulerRejected as e:
+                if not flag.is_set():
+                    socketio.emit('ai.chat.error', {'requestId': request_id, 'error': e.reason, 'retryAfter': e.retry_after}, to=sid)
+            except ollama_client.OllamaUnavailable as e:
+                socketio.emit('ai.chat.error', {'requestId': request_id, **_unavailable(e.retry_after)}, to=sid)
+            except Exception as e:
+                socketio.emit('ai.chat.error', {'requestId': request_id, 'error': str(e)}, to=sid)
+            finally:
+                if relay is not None:
+                    relay.close()
+                socket_streams.close(sid, request_id)
+
+        socketio.start_background_task(_run)
+        return {'requestId': request_id}
+
+    @socketio.on('ai.chat.cancel')
+    def on_ai_chat_cancel(data=None):
+        request_id = (data or {}).get('requestId')
+        return {'cancelled': socket_streams.cancel(request.sid, request_id)}
+
+    print("✅ AI streaming registered")
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+AI Model Warm-up
+Keeps MODEL_NAME loaded in Ollama while the library is open so the first
+chat of the day (or after a quiet hour) doesn't pay the model load time:
+
+- at startup the model is preloaded (an empty /api/generate request)
+- during library hours (AI_WARMUP_DAYS, AI_WARMUP_START - AI_WARMUP_END) it
+  is pinged every AI_WARMUP_PING_SECONDS with keep_alive AI_WARMUP_KEEP_ALIVE
+- when the hours end it is unloaded (keep_alive 0) and chats after hours
+  use the short AI_WARMUP_OFF_HOURS_KEEP_ALIVE
+- ollama_client classifies every response as cold or warm from its
+  load_duration; ai.first_token_ms.cold / .warm and ai.model.cold_starts
+  are reported by GET /api/ai/warmup
+
+Usage:
+    python ai_warmup.py measure     # unload, then cold vs warm first-token latency
+"""
+
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Set
+
+import metrics
+import ollama_client
+from ai_intents import LIBRARY_CLOSE, LIBRARY_OPEN
+
+AI_WARMUP_ENABLED = os.getenv('AI_WARMUP_ENABLED', 'true').lower() == 'true'
+AI_WARMUP_DAYS = os.getenv('AI_WARMUP_DAYS', 'mon-fri')
+AI_WARMUP_LEAD_MINUTES = int(os.getenv('AI_WARMUP_LEAD_MINUTES', '15'))
+AI_WARMUP_START = os.getenv('AI_WARMUP_START') or LIBRARY_OPEN
+AI_WARMUP_END = os.getenv('AI_WARMUP_END') or LIBRARY_CLOSE
+AI_WARMUP_PING_SECONDS = int(os.getenv('AI_WARMUP_PING_SECONDS', '600'))
+AI_WARMUP_KEEP_ALIVE = os.getenv('AI_WARMUP_KEEP_ALIVE') or ollama_client.OLLAMA_KEEP_ALIVE
+AI_WARMUP_OFF_HOURS_KEEP_ALIVE = os.getenv('AI_WARMUP_OFF_HOURS_KEEP_ALIVE', '5m')
+AI_WARMUP_TICK_SECONDS = 60
+
+_DAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+
+def parse_days(spec: str) -> Set[int]:
+    """'mon-fri', 'mon,wed,sat', 'mon-sat' -> weekday numbers (Monday = 0)"""
+    days: Set[int] = set()
+    for part in re.split(r'[,\s]+', spec.strip().lower()):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        start, end = _DAYS.index(first[:3]), _DAYS.index((last or first)[:3])
+        days.update(_DAYS.index(d) for d in (_DAYS + _DAYS)[start:start + (end - start) % 7 + 1])
+    return days
+
+
+def parse_clock(hhmm: str) -> int:
+    """'08:00' -> minutes after midnight"""
+    t = datetime.strptime(hhmm.strip(), '%H:%M')
+    return t.hour * 60 + t.minute
+
+
+class WarmupManager:
+    """Preloads, pings and unloads the model on the library-hours schedule"""
+
+    def __init__(
+        self,
+        days: str = AI_WARMUP_DAYS,
+        start: str = AI_WARMUP_START,
+        end: str = AI_WARMUP_END,
+        lead_minutes: int = AI_WARMUP_LEAD_MINUTES,
+        ping_seconds: int = AI_WARMUP_PING_SECONDS,
+        keep_alive: str = AI_WARMUP_KEEP_ALIVE,
+        off_hours_keep_alive: str = AI_WARMUP_OFF_HOURS_KEEP_ALIVE,
+        load: Callable[[str], Dict[str, Any]] = ollama_client.load_model,
+        now: Callable[[], datetime] = datetime.now,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.days = parse_days(days)
+        self.start = parse_clock(start) - lead_minutes
+        self.end = parse_clock(end)
+        self.ping_seconds = ping_seconds
+        self.keep_alive = keep_alive
+        self.off_hours_keep_alive = off_hours_keep_alive
+        self.load = load
+        self.now = now
+        self.sleep = sleep
+        self.loaded = False
+        self.in_hours: Optional[bool] = None
+        self.last_ping = 0.0
+        self.last_result: Dict[str, Any] = {}
+
+    def open_at(self, when: datetime) -> bool:
+        minutes = when.hour * 60 + when.minute
+        return when.weekday() in self.days and self.start <= minutes < self.end
+
+    def preload(self, keep_alive: Optional[str] = None) -> Dict[str, Any]:
+        """Load (or keep) the model; records whether it was cold and how long loading took"""
+        keep_alive = keep_alive or self.keep_alive
+        start = time.perf_counter()
+        try:
+            reply = self.load(keep_alive)
+        except Exception as e:
+            self.loaded = False
+            self.last_result = {'action': 'preload', 'ok': False, 'error': str(e), 'at': time.time()}
+            metrics.incr('ai.warmup.failures')
+            return self.last_result
+        cold = ollama_client.was_cold(reply)
+        self.loaded = True
+        self.last_ping = time.monotonic()
+        self.last_result = {
+            'action': 'preload', 'ok': True, 'cold': cold, 'keepAlive': keep_alive, 'at': time.time(),
+            'loadMs': round((reply.get('load_duration') or 0) / 1e6, 1),
+            'totalMs': round((time.perf_counter() - start) * 1000.0, 1),
+        }
+        metrics.incr('ai.warmup.pings')
+        if cold:
+            metrics.incr('ai.warmup.loads')
+            metrics.observe('ai.warmup.load_ms', self.last_result['loadMs'])
+        return self.last_result
+
+    def unload(self) -> Dict[str, Any]:
+        try:
+            self.load('0')
+            self.loaded = False
+            self.last_result = {'action': 'unload', 'ok': True, 'at': time.time()}
+            metrics.incr('ai.warmup.unloads')
+        except Exception as e:
+            self.last_result = {'action': 'unload', 'ok': False, 'error': str(e), 'at': time.time()}
+            metrics.incr('ai.warmup.failures')
+        return self.last_result
+
+    def tick(self):
+        """Apply the schedule once: ping in hours, unload when the hours end"""
+        open_now = self.open_at(self.now())
+        changed = open_now != self.in_hours
+        first = self.in_hours is None
+        self.in_hours = open_now
+        ollama_client.set_keep_alive(self.keep_alive if open_now else self.off_hours_keep_alive)
+        metrics.set_gauge('ai.warmup.in_hours', 1 if open_now else 0)
+        if open_now:
+            if changed or not self.loaded or time.monotonic() - self.last_ping >= self.ping_seconds:
+                self.preload()
+        elif first:
+            # Startup after hours: still warm up, but only for the short off-hours keep_alive
+            self.preload(self.off_hours_keep_alive)
+        elif changed:
+            self.unload()
+        metrics.set_gauge('ai.warmup.loaded', 1 if self.loaded else 0)
+
+    def run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Error in AI warm-up: {e}")
+            self.sleep(min(AI_WARMUP_TICK_SECONDS, self.ping_seconds))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': AI_WARMUP_ENABLED,
+            'model': ollama_client.MODEL_NAME,
+            'inHours': self.in_hours,
+            'loaded': self.loaded,
+            'keepAlive': ollama_client.get_keep_alive(),
+            'schedule': {
+                'days': [_DAYS[d] for d in sorted(self.days)],
+                'start': f'{self.start // 60:02d}:{self.start % 60:02d}',
+                'end': f'{self.end // 60:02d}:{self.end % 60:02d}',
+                'pingSeconds': self.ping_seconds,
+            },
+            'last': self.last_result,
+            'coldStarts': metrics.counter('ai.model.cold_starts'),
+            'firstTokenMs': {
+                'cold': metrics.summary('ai.first_token_ms.cold'),
+                'warm': metrics.summary('ai.first_token_ms.warm'),
+            },
+            'loadMs': metrics.summary('ai.model.load_ms'),
+        }
+
+
+_manager: Optional[WarmupManager] = None
+
+
+def get_warmup_manager() -> WarmupManager:
+    global _manager
+    if _manager is None:
+        _manager = WarmupManager()
+    return _manager
+
+
+def register_ai_warmup_endpoints(app, socketio=None):
+    """Start the warm-up schedule in the background and expose its status"""
+    from flask import jsonify, request
+    global _manager
+    _manager = WarmupManager(sleep=socketio.sleep if socketio is not None else time.sleep)
+    manager = _manager
+
+    @app.route('/api/ai/warmup', methods=['GET'])
+    def ai_warmup_status():
+        return jsonify(manager.stats())
+
+    @app.route('/api/admin/ai-warmup', methods=['POST'])
+    def ai_warmup_action():
+        """{"action": "preload" | "unload"}"""
+        action = (request.get_json(silent=True) or {}).get('action', 'preload')
+        if action not in ('preload', 'unload'):
+            return jsonify(ok=False, error='action must be preload or unload'), 400
+        result = manager.preload() if action == 'preload' else manager.unload()
+        return jsonify(result), (200 if result['ok'] else 502)
+
+    if AI_WARMUP_ENABLED and socketio is not None:
+        socketio.start_background_task(manager.run)
+    print("✅ AI warm-up endpoints registered")
+
+
+def measure(prompt: str = "Say hello in five words.") -> Dict[str, Any]:
+    """Unload the model, then time the first token of a cold and of a warm chat"""
+    manager = get_warmup_manager()
+    manager.unload()
+    out = {}
+    for label in ('cold', 'warm'):
+        stream = ollama_client.ChatStream([{"role": "user", "content": prompt}], options={"num_predict": 16})
+        for _ in stream:
+            pass
+        out[label] = {
+            'firstTokenMs': round(stream.first_token_ms or 0, 1),
+            'loadMs': round((stream.final.get('load_duration') or 0) / 1e6, 1),
+            'classifiedCold': ollama_client.was_cold(stream.final),
+        }
+    out['savedMs'] = round(out['cold']['firstTokenMs'] - out['warm']['firstTokenMs'], 1)
+    return out
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'measure':
+        import json
+        print(json.dumps(measure(), indent=2))
+    else:
+        print(__doc__)
@@ -6,8 +6,6 @@ import json
 import os
 import time
 import uuid
-import requests
-import bleach
 import threading
 import json as pyjson
 from flask_socketio import SocketIO, emit, join_room, leave_room
@@ -25,6 +23,15 @@ ALLOWED_ORIGINS = set((os.getenv("ALLOWED_ORIGINS") or "http://localhost:8080,ht
 # Socket.IO for realtime notifications
 socketio = SocketIO(app, cors_allowed_origins=list(ALLOWED_ORIGINS) or "*")
 
+# Per-user sequenced event log for reconnect delta sync (SOCKET_SYNC_LOG_SIZE)
+import socket_sync
+
+# Per-room emit batching (SOCKET_BATCH_TICK_MS / SOCKET_BATCH_MAX; tick 0 disables),
+# fanned out to other workers through SOCKETIO_PUBSUB (see socket_pubsub.py).
+# Each worker stamps user-room frames as it delivers them to its own clients.
+from socket_batching import init_emit_batcher
+emit_batcher = init_emit_batcher(socketio, prepare=socket_sync.stamp_frame)
+
 # In-memory stores (dev only)
 NOTIFICATIONS = {}  # user_id -> list[notification]
 PASSWORD_RESET_REQUESTS = {}  # req_id -> record
@@ -150,8 +157,26 @@ JRMSU Library System
         return False
 
 
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
-MODEL_NAME = os.getenv("OLLAMA_MODEL", "llama3:8b-instruct-q4_K_M")
+import ollama_client
+from ollama_client import OllamaError, OllamaUnavailable
+# Cached Ollama health + circuit breaker transitions (AI_HEALTH_* / AI_BREAKER_*)
+import ai_health
+ai_health.init_ai_health(socketio)
+# Fair per-user queue in front of Ollama (AI_MAX_CONCURRENCY / AI_QUEUE_*)
+from ai_scheduler import init_ai_scheduler, priority_for, SchedulerRejected
+ai_scheduler = init_ai_scheduler(socketio)
+# LRU+TTL cache of answers to repeated questions (AI_CACHE_*)
+from ai_response_cache import response_cache
+# Database answers for simple intents (hours, my borrowed books, ...) before the LLM
+import ai_intents
+# Top-k catalog/policy snippets added to the system prompt (AI_RETRIEVAL_*)
+import ai_retrieval
+# Token-budgeted history with rolling summaries per ai_chat_sessions session (AI_CONTEXT_TOKENS / AI_MEMORY_*)
+from ai_memory import init_conversation_memory
+conversation_memory = init_conversation_memory(socketio)
+# Server-held sanitized turns per session; clients send {sessionId, message}
+from ai_conversations import init_conversation_store, chat_messages, record_exchange, SessionAccessError
+init_conversation_store(socketio)
 
 @app.before_request
 def handle_preflight():
@@ -908,14 +933,29 @@ def api_category_dist():
 # ---------- Socket.IO ----------
 @socketio.on('connect')
 def on_connect():
-    user_id = request.args.get('userId') or request.headers.get('X-User-Id') or 'guest'
+    user_id = _socket_user_id()
     join_room(f'user:{user_id}')
-    emit('connected', {'ok': True, 'userId': user_id})
+    emit('connected', {
+        'ok': True,
+        'userId': user_id,
+        'seq': socket_sync.event_log.latest(user_id),
+        'epoch': socket_sync.EPOCH,
+    })
 
 @socketio.on('disconnect')
 def on_disconnect():
-    # Rooms are auto-learned; no explicit leave required here
-    pass
+    # Rooms are auto-learned; no explicit leave required here.
+    # Stop any AI generation this connection was streaming.
+    try:
+        from ai_streaming import cancel_connection_streams
+        cancel_connection_streams(request.sid)
+    except Exception:
+        pass
+
+def _socket_user_id():
+    return request.args.get('userId') or request.headers.get('X-User-Id') or 'guest'
+
+socket_sync.register_sync_events(socketio, _socket_user_id)
 
 # Helpers
 
@@ -928,7 +968,7 @@ def _ensure_user_store(user_id: str):
     return NOTIFICATIONS[user_id]
 
 def _emit(event: str, user_id: str, payload: dict):
-    socketio.emit(event, payload, room=f'user:{user_id}')
+    emit_batcher.emit(event, payload, f'user:{user_id}')
 
 def _new_notif_id():
     return f"notif-{uuid.uuid4()}"
@@ -1037,51 +1077,58 @@ def _map_admin_row_to_user(r: dict) -> dict:
     return out
 
 @app.route('/ai/health')
-def ai_health():
-    try:
-        r = requests.get(f"{OLLAMA_URL}/api/tags", timeout=3)
-        return jsonify(ollama=r.ok)
-    except Exception:
-        return jsonify(ollama=False), 503
+def ai_health_status():
+    prober = ai_health.get_ai_health()
+    status = prober.snapshot() if prober.status['checkedAt'] else prober.probe_once()
+    return jsonify(status), (200 if status['ollama'] and status['breaker'] != 'open' else 503)
+
+def _ai_fallback(retry_after):
+    """Friendly answer while the AI circuit breaker is open"""
+    resp = jsonify(content=ai_health.FALLBACK_MESSAGE, fallback=True, retryAfter=round(retry_after, 1))
+    resp.headers['Retry-After'] = str(int(retry_after + 0.5))
+    return resp, 503
 
 @app.route('/ai/chat', methods=['POST'])
 def ai_chat():
     body = request.get_json(force=True)
-    raw_message = (body.get('message') or '').strip()
-    # Sanitize input to prevent prompt injection / XSS
-    message = bleach.clean(raw_message, strip=True)
-    history = body.get('history') or []
-    messages = [{"role": "system", "content": "You are Jose, the JRMSU Library AI assistant."}]
-    # Include up to last 5 history messages, sanitized
-    for h in history[-5:]:
-        role = h.get('role') in ('user', 'assistant', 'system') and h.get('role') or 'user'
-        content = bleach.clean(str(h.get('content') or ''), strip=True)
-        messages.append({"role": role, "content": content})
-    messages.append({"role": "user", "content": message})
+    account_id = request.headers.get('X-User-Id') or body.get('userId')
+    user_id = account_id or request.remote_addr
+    # Sanitized system prompt + session history (server-held, or the client's for old clients) + message
+    try:
+        messages, session_id = chat_messages(body, account_id)
+    except SessionAccessError as e:
+        return jsonify(error=str(e)), 403
+
+    fast = ai_intents.answer(messages[-1]['content'], account_id)
+    if fast is not None:
+        record_exchange(session_id, account_id, messages, fast['content'], {'source': 'intent', 'intent': fast['intent']})
+        return jsonify(content=fast['content'], intent=fast['intent'])
+
+    cached = response_cache.get(messages)
+    if cached is not None:
+        record_exchange(session_id, account_id, messages, cached, {'source': 'cache'})
+        return jsonify(content=cached, cached=True)
+
+    if ai_health.unavailable():
+        return _ai_fallback(ai_health.get_ai_health().breaker.retry_after())
 
     try:
-        r = requests.post(
-            f"{OLLAMA_URL}/api/chat",
-            json={
-                "model": MODEL_NAME,
-                "messages": messages,
-                "stream": False,
-                "options": {
-                    "temperature": 0.2,
-                    "top_p": 0.9,
-                    "repeat_penalty": 1.1,
-                    "num_ctx": 2048,
-                    "num_predict": 256,
-                    "keep_alive": "30m"
-                }
-            },
-            timeout=60,
-        )
-        if not r.ok:
-            return jsonify(error="Ollama request failed", details=r.text), 502
-        data = r.json()
-        content = (data.get('message') or {}).get('content', '')
+        with ai_scheduler.slot(user_id, priority=priority_for(account_id)):
+            started = time.perf_counter()
+            fitted = conversation_memory.fit(session_id, messages, account_id)
+            content = ollama_client.chat(ai_retrieval.augment(fitted))
+            latency = (time.perf_counter() - started) * 1000.0
+            response_cache.put(messages, content, latency)
+        record_exchange(session_id, account_id, messages, content, {'source': 'llm', 'latencyMs': round(latency)})
         return jsonify(content=content)
+    except SchedulerRejected as e:
+        resp = jsonify(error=e.reason, retryAfter=e.retry_after)
+        resp.headers['Retry-After'] = str(int(e.retry_after + 0.5))
+        return resp, 429
+    except OllamaUnavailable as e:
+        return _ai_fallback(e.retry_after)
+    except OllamaError as e:
+        return jsonify(error="Ollama request failed", details=e.details), 502
     except Exception as e:
         return jsonify(error=str(e)), 500
 
@@ -1406,6 +1453,14 @@ try:
 except Exception as e:
     print(f'⚠️  Library book endpoints not loaded: {e}')
 
+# Register live occupancy counters (snapshot endpoint + rate-limited push)
+try:
+    from library_occupancy import register_occupancy_endpoints
+    register_occupancy_endpoints(app, socketio)
+    print('✅ Library occupancy loaded')
+except Exception as e:
+    print(f'⚠️  Library occupancy not loaded: {e}')
+
 # Register password management endpoints
 try:
     from password_endpoints import register_password_endpoints
@@ -1414,6 +1469,110 @@ try:
 except Exception as e:
     print(f'⚠️  Password endpoints not loaded: {e}')
 
+# Register notification/activity retention endpoints
+try:
+    from notification_retention import register_retention_endpoints
+    register_retention_endpoints(app)
+    print('✅ Retention endpoints loaded')
+except Exception as e:
+    print(f'⚠️  Retention endpoints not loaded: {e}')
+
+# Register notification digest endpoints and start the burst flusher
+try:
+    from notification_coalescer import register_coalescer_endpoints
+    register_coalescer_endpoints(app, socketio)
+    print('✅ Notification coalescer loaded')
+except Exception as e:
+    print(f'⚠️  Notification coalescer not loaded: {e}')
+
+# Register AI response cache stats/invalidation endpoints
+try:
+    from ai_response_cache import register_ai_cache_endpoints
+    register_ai_cache_endpoints(app)
+    print('✅ AI cache endpoints loaded')
+except Exception as e:
+    print(f'⚠️  AI cache endpoints not loaded: {e}')
+
+# Register AI intent fast-path stats endpoint
+try:
+    from ai_intents import register_ai_intent_endpoints
+    register_ai_intent_endpoints(app)
+    print('✅ AI intent endpoints loaded')
+except Exception as e:
+    print(f'⚠️  AI intent endpoints not loaded: {e}')
+
+# Register AI retrieval index (books + policy) and its refresh loop
+try:
+    from ai_retrieval import register_ai_retrieval_endpoints
+    register_ai_retrieval_endpoints(app, socketio)
+    print('✅ AI retrieval index loaded')
+except Exception as e:
+    print(f'⚠️  AI retrieval index not loaded: {e}')
+
+# Register pre-generated Jose message pool (logout reminders) and its background reload
+try:
+    from ai_message_pool import register_ai_message_pool_endpoints
+    register_ai_message_pool_endpoints(app, socketio)
+    print('✅ AI message pool loaded')
+except Exception as e:
+    print(f'⚠️  AI message pool not loaded: {e}')
+
+# Register model warm-up: preload at startup, keep-alive pings in library hours, unload after (AI_WARMUP_*)
+try:
+    from ai_warmup import register_ai_warmup_endpoints
+    register_ai_warmup_endpoints(app, socketio)
+    print('✅ AI warm-up loaded')
+except Exception as e:
+    print(f'⚠️  AI warm-up not loaded: {e}')
+
+# Register per-session prompt prefix reuse stats and its idle-session sweep (AI_SESSION_CONTEXT_*)
+try:
+    from ai_session_context import register_ai_session_context_endpoints
+    register_ai_session_context_endpoints(app, socketio)
+    print('✅ AI session context loaded')
+except Exception as e:
+    print(f'⚠️  AI session context not loaded: {e}')
+
+# Register AI analytics rollups (ai_analytics) and the periodic incremental run (AI_ANALYTICS_*)
+try:
+    from ai_analytics import register_ai_analytics_endpoints
+    register_ai_analytics_endpoints(app, socketio)
+    print('✅ AI analytics loaded')
+except Exception as e:
+    print(f'⚠️  AI analytics not loaded: {e}')
+
+# Register admin full-text search over chat and search history (ai_history_search)
+try:
+    from ai_history_search import register_ai_history_search_endpoints
+    register_ai_history_search_endpoints(app)
+    print('✅ AI history search loaded')
+except Exception as e:
+    print(f'⚠️  AI history search not loaded: {e}')
+
+# Register AI queue status endpoint
+try:
+    from ai_scheduler import register_ai_queue_endpoints
+    register_ai_queue_endpoints(app)
+    print('✅ AI queue endpoint loaded')
+except Exception as e:
+    print(f'⚠️  AI queue endpoint not loaded: {e}')
+
+# Register AI token streaming (SSE + Socket.IO)
+try:
+    from ai_streaming import register_ai_streaming_endpoints
+    register_ai_streaming_endpoints(app, socketio)
+    print('✅ AI streaming endpoints loaded')
+except Exception as e:
+    print(f'⚠️  AI streaming endpoints not loaded: {e}')
+
+# Register metrics endpoint
+try:
+    from metrics import register_metrics_endpoints
+    register_metrics_endpoints(app)
+    print('✅ Metrics endpoint loaded')
+except Exception as e:
+    print(f'⚠️  Metrics endpoint not loaded: {e}')
+
 if __name__ == '__main__':
     print('🚀 Backend running at http://localhost:5000')
     socketio.run(app, host='0.0.0.0', port=5000)
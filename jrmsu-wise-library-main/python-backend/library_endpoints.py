@@ -8,12 +8,18 @@ import time
 import uuid
 from flask import request, jsonify
 from db import execute_query
+from notification_coalescer import coalescer
+from library_occupancy import occupancy
 
 # In-memory library sessions storage (dev only)
 LIBRARY_SESSIONS = {}  # session_id -> session_data
 
 def _notify_all_admins(app, message: str, notification_type: str = 'library', meta: dict = None):
-    """Notify all admin users"""
+    """Notify all admin users (entry/exit bursts are coalesced into digests)"""
+    coalescer.submit(notification_type, message, meta or {}, _deliver_to_admins)
+
+def _deliver_to_admins(message: str, notification_type: str, meta: dict = None):
+    """Fan a notification out to every admin's store and socket room"""
     from db import AdminDB
     try:
         admins = AdminDB.list_all_admins()
@@ -24,7 +30,7 @@ def _notify_all_admins(app, message: str, notification_type: str = 'library', me
                 notif = {
                     'id': _new_notif_id(),
                     'user_id': admin_id,
-                    'title': 'Library Activity',
+                    'title': 'Library Activity Digest' if (meta or {}).get('digest') else 'Library Activity',
                     'body': message,
                     'type': notification_type,
                     'meta': meta or {},
@@ -41,7 +47,12 @@ def _notify_all_admins(app, message: str, notification_type: str = 'library', me
         print(f"Error notifying admins: {e}")
 
 def register_library_endpoints(app):
-    """Register all library-related endpoints"""
+    """
+    Register all library-related endpoints.
+    Note: library_session_manager registers /api/library/login first, so this
+    fails on the duplicate library_login view and none of these routes load;
+    live routes (active sessions, logout warnings) belong in library_session_manager.
+    """
     
     @app.route('/api/library/login', methods=['POST'])
     def library_login():
@@ -73,6 +84,7 @@ def register_library_endpoints(app):
         session_data['borrowedBooks'] = []
         
         LIBRARY_SESSIONS[session_id] = session_data
+        occupancy.enter(user_id, user_type, (body.get('department') or '').strip() or None)
         
         # Notify all admins
         _notify_all_admins(app, f"{full_name} ({user_id}) entered the library", 'library_entry', {
@@ -105,6 +117,7 @@ def register_library_endpoints(app):
             
             print(f"✅ Library exit: {session['fullName']} ({user_id})")
             del LIBRARY_SESSIONS[session_id]
+            occupancy.leave(session['userId'])
             
         return jsonify(ok=True)
     
@@ -272,26 +285,6 @@ def register_library_endpoints(app):
         print(f"✅ Return time activated: {book_id} by {user_id}")
         return jsonify(ok=True, message='Return time activated successfully')
     
-    @app.route('/api/library/active-sessions', methods=['GET'])
-    def library_active_sessions():
-        """Get all active library sessions"""
-        user_type = request.args.get('userType', None)
-        active = [s for s in LIBRARY_SESSIONS.values() if s.get('status') == 'active']
-        
-        if user_type:
-            active = [s for s in active if s.get('userType') == user_type]
-        
-        # Count by type
-        students = len([s for s in active if s.get('userType') == 'student'])
-        admins = len([s for s in active if s.get('userType') == 'admin'])
-        
-        return jsonify(
-            sessions=active, 
-            count=len(active),
-            students=students,
-            admins=admins
-        )
-    
     @app.route('/api/library/forgotten-logouts', methods=['GET'])
     def library_forgotten_logouts():
         """Check for users who forgot to logout (run at 5 PM)"""
@@ -310,8 +303,8 @@ def register_library_endpoints(app):
             user_id = session['userId']
             full_name = session['fullName']
             
-            # Generate AI warning (TODO: integrate with Ollama)
-            warning_message = f"Reminder: {full_name}, you forgot to logout from the library. Please logout before leaving. The library closes at 5 PM."
+            from ai_message_pool import forgotten_logout_message
+            warning_message = forgotten_logout_message(full_name, user_id)
             
             # Notify all admins
             _notify_all_admins(app, f"{full_name} ({user_id}) forgot to logout", 'forgotten_logout', {
@@ -344,27 +337,4 @@ def register_library_endpoints(app):
         
         return jsonify(forgotten=forgotten, count=len(forgotten))
     
-    @app.route('/api/ai/generate-logout-warning', methods=['POST'])
-    def ai_generate_logout_warning():
-        """Generate varied AI warning message for forgotten logout"""
-        body = request.get_json(force=True)
-        full_name = (body.get('fullName') or 'User').strip()
-        user_type = (body.get('userType') or 'student').strip()
-        login_time = body.get('loginTime', int(time.time()))
-        
-        # TODO: Integrate with Ollama AI (LLaMA 3)
-        # For now, return varied messages
-        import random
-        messages = [
-            f"Hi {full_name}! We noticed you're still logged in at the library. Please remember to logout before leaving. The library closes at 5 PM.",
-            f"Hello {full_name}! You forgot to logout from the library system. Kindly logout before you leave to help us track library usage accurately.",
-            f"Good afternoon {full_name}! Your library session is still active. Please logout before leaving the premises. Thank you!",
-            f"Reminder for {full_name}: You're still logged in at the library. Please logout before leaving. Library hours end at 5 PM.",
-            f"Hey {full_name}! Don't forget to logout from the library system before you go. Your session is still active."
-        ]
-        
-        warning = random.choice(messages)
-        
-        return jsonify(warning=warning, generated_at=int(time.time()))
-    
     print("✅ Library endpoints registered")
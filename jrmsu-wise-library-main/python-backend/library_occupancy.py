@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Live Library Occupancy
+Incremental counters (total, by userType, by department) updated on library
+login/logout, so dashboards no longer rebuild them from every session.
+
+- GET /api/library/occupancy returns the current snapshot (precomputed, O(1))
+- Socket.IO: emit('occupancy.subscribe') joins the 'occupancy' room, which
+  receives 'library.occupancy' pushes at most once per OCCUPANCY_PUSH_INTERVAL_MS
+
+The counters live in each worker process and only see the logins that worker
+handled, so they are seeded from library_sessions at startup and reconciled
+against it every OCCUPANCY_RECONCILE_SECONDS.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from flask import jsonify
+import metrics
+
+OCCUPANCY_ROOM = 'occupancy'
+OCCUPANCY_EVENT = 'library.occupancy'
+OCCUPANCY_PUSH_INTERVAL_MS = int(os.getenv('OCCUPANCY_PUSH_INTERVAL_MS', '1000'))
+OCCUPANCY_RECONCILE_SECONDS = int(os.getenv('OCCUPANCY_RECONCILE_SECONDS', '15'))
+
+
+def _department_for(user_id: str, user_type: str, hint: Optional[str] = None) -> str:
+    """Department label for a user; only students are looked up"""
+    if hint:
+        return hint
+    if user_type != 'student':
+        return 'Staff' if user_type == 'admin' else 'Unknown'
+    try:
+        from db import StudentDB
+        row = StudentDB.get_student_by_id(user_id) or {}
+        return row.get('department') or row.get('college_department') or 'Unknown'
+    except Exception:
+        return 'Unknown'
+
+
+class OccupancyCounters:
+    """Who is inside, keyed by user id, with running totals"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inside: Dict[str, Tuple[str, str]] = {}  # user_id -> (userType, department)
+        self._by_type: Dict[str, int] = {}
+        self._by_department: Dict[str, int] = {}
+        self._version = 0
+        self._snapshot: Dict[str, Any] = self._build_snapshot()
+
+    def enter(self, user_id: str, user_type: str, department: Optional[str] = None) -> bool:
+        """Count a user as inside; returns False if already counted"""
+        department = _department_for(user_id, user_type, department)
+        with self._lock:
+            if user_id in self._inside:
+                return False
+            self._inside[user_id] = (user_type, department)
+            self._bump(user_type, department, 1)
+        return True
+
+    def leave(self, user_id: str) -> bool:
+        """Stop counting a user; returns False if they weren't inside"""
+        with self._lock:
+            entry = self._inside.pop(user_id, None)
+            if entry is None:
+                return False
+            self._bump(entry[0], entry[1], -1)
+        return True
+
+    def reset(self, rows=()):
+        """Replace state with (user_id, userType, department) rows"""
+        with self._lock:
+            self._replace(rows)
+
+    def reconcile(self, rows, since_version: int) -> bool:
+        """
+        Replace state with (user_id, userType) rows read from the database when
+        they differ. Skipped if a login/logout changed the counters after
+        `since_version` was taken, as the rows may predate it.
+        """
+        rows = dict(rows)
+        with self._lock:
+            if self._version != since_version:
+                return False
+            if rows == {user_id: entry[0] for user_id, entry in self._inside.items()}:
+                return False
+            known = {user_id: entry[1] for user_id, entry in self._inside.items()}
+        # Department lookups hit the database, so only for users not counted yet
+        entries = [(user_id, user_type, known.get(user_id) or _department_for(user_id, user_type))
+                   for user_id, user_type in rows.items()]
+        with self._lock:
+            if self._version != since_version:
+                return False
+            self._replace(entries)
+        return True
+
+    def _replace(self, rows):
+        self._inside.clear()
+        self._by_type.clear()
+        self._by_department.clear()
+        for user_id, user_type, department in rows:
+            if user_id not in self._inside:
+                self._inside[user_id] = (user_type, department)
+                self._bump(user_type, department, 1, rebuild=False)
+        self._version += 1
+        self._snapshot = self._build_snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _bump(self, user_type: str, department: str, delta: int, rebuild: bool = True):
+        for counts, key in ((self._by_type, user_type), (self._by_department, department)):
+            counts[key] = counts.get(key, 0) + delta
+            if counts[key] <= 0:
+                del counts[key]
+        if rebuild:
+            self._version += 1
+            self._snapshot = self._build_snapshot()
+
+    def _build_snapshot(self) -> Dict[str, Any]:
+        # Rebuilt on change (small dicts), so reads are a plain reference return
+        return {
+            'total': len(self._inside),
+            'students': self._by_type.get('student', 0),
+            'admins': self._by_type.get('admin', 0),
+            'byUserType': dict(self._by_type),
+            'byDepartment': dict(self._by_department),
+            'version': self._version,
+            'updatedAt': int(time.time()),
+        }
+
+
+occupancy = OccupancyCounters()
+
+
+def _inside_from_db():
+    from db import execute_query
+    rows = execute_query(
+        "SELECT user_id, user_type FROM library_sessions WHERE status = 'inside_library'",
+        fetch_all=True
+    ) or []
+    return [(r['user_id'], r['user_type']) for r in rows]
+
+
+def seed_from_db():
+    """Load users currently inside from library_sessions"""
+    occupancy.reset((user_id, user_type, _department_for(user_id, user_type)) for user_id, user_type in _inside_from_db())
+
+
+def reconcile_from_db() -> bool:
+    """Correct the counters from library_sessions (logins handled by other workers, missed logouts)"""
+    since = occupancy.version
+    changed = occupancy.reconcile(_inside_from_db(), since)
+    if changed:
+        metrics.incr('occupancy.reconciled')
+    return changed
+
+
+def register_occupancy_endpoints(app, socketio=None):
+    """Register the snapshot endpoint, the subscribe handler and the rate-limited pusher"""
+
+    @app.route('/api/library/occupancy', methods=['GET'])
+    def library_occupancy():
+        return jsonify(occupancy.snapshot())
+
+    try:
+        seed_from_db()
+    except Exception as e:
+        print(f"⚠️  Occupancy not seeded from database: {e}")
+
+    if socketio is None:
+        return
+
+    from flask_socketio import join_room, leave_room, emit
+
+    @socketio.on('occupancy.subscribe')
+    def on_occupancy_subscribe(data=None):
+        join_room(OCCUPANCY_ROOM)
+        emit(OCCUPANCY_EVENT, occupancy.snapshot())
+
+    @socketio.on('occupancy.unsubscribe')
+    def on_occupancy_unsubscribe(data=None):
+        leave_room(OCCUPANCY_ROOM)
+
+    def _push_loop():
+        # Coalesces any number of changes per interval into one push
+        from socket_batching import get_emit_batcher
+        pushed = occupancy.version
+        interval = max(OCCUPANCY_PUSH_INTERVAL_MS, 50) / 1000.0
+        while True:
+            socketio.sleep(interval)
+            if occupancy.version == pushed:
+                continue
+            pushed = occupancy.version
+            try:
+                batcher = get_emit_batcher()
+                if batcher is not None:
+                    batcher.emit(OCCUPANCY_EVENT, occupancy.snapshot(), OCCUPANCY_ROOM)
+                else:
+                    socketio.emit(OCCUPANCY_EVENT, occupancy.snapshot(), room=OCCUPANCY_ROOM)
+            except Exception as e:
+                print(f"Error pushing occupancy: {e}")
+
+    def _reconcile_loop():
+        while True:
+            socketio.sleep(max(OCCUPANCY_RECONCILE_SECONDS, 1))
+            try:
+                reconcile_from_db()
+            except Exception as e:
+                print(f"Error reconciling occupancy: {e}")
+
+    socketio.start_background_task(_push_loop)
+    if OCCUPANCY_RECONCILE_SECONDS > 0:
+        socketio.start_background_task(_reconcile_loop)
+    print("✅ Library occupancy registered")
@@ -8,6 +8,8 @@ import time
 import uuid
 from flask import request, jsonify
 from db import execute_query
+from notification_coalescer import coalescer
+from library_occupancy import occupancy
 
 def get_user_active_session(user_id: str):
     """Check if user has an active library session"""
@@ -151,7 +153,11 @@ def create_logout_session(user_id: str, session_id: str = None):
         raise
 
 def notify_all_admins(app, message: str, notification_type: str, meta: dict = None):
-    """Send notification to all admins"""
+    """Send notification to all admins (login/logout bursts are coalesced into digests)"""
+    coalescer.submit(notification_type, message, meta or {}, _deliver_to_admins)
+
+def _deliver_to_admins(message: str, notification_type: str, meta: dict = None):
+    """Fan a notification out to every admin's store and socket room"""
     from db import AdminDB
     try:
         admins = AdminDB.list_all_admins()
@@ -162,7 +168,7 @@ def notify_all_admins(app, message: str, notification_type: str, meta: dict = No
                 notif = {
                     'id': _new_notif_id(),
                     'user_id': admin_id,
-                    'title': 'Library Activity',
+                    'title': 'Library Activity Digest' if (meta or {}).get('digest') else 'Library Activity',
                     'body': message,
                     'type': notification_type,
                     'meta': meta or {},
@@ -254,6 +260,7 @@ def register_library_session_endpoints(app):
             
             # Create new login session
             session_data = create_login_session(user_id, user_type, full_name, method)
+            occupancy.enter(user_id, user_type, (body.get('department') or '').strip() or None)
             
             # Notify all admins
             notify_all_admins(app, 
@@ -289,6 +296,7 @@ def register_library_session_endpoints(app):
             
             if isinstance(result, tuple):  # Error case
                 return result
+            occupancy.leave(user_id)
             
             # Notify all admins
             notify_all_admins(app, 
@@ -332,11 +340,12 @@ def register_library_session_endpoints(app):
                 # Notify user
                 try:
                     from app import _new_notif_id, _ensure_user_store, _emit
+                    from ai_message_pool import forgotten_logout_message
                     notif = {
                         'id': _new_notif_id(),
                         'user_id': user_id,
                         'title': 'Logout Reminder',
-                        'body': f"Hi {full_name}! You forgot to logout from the library. Please logout before leaving. The library closes at 5 PM.",
+                        'body': forgotten_logout_message(full_name, user_id),
                         'type': 'forgotten_logout',
                         'meta': {'sessionId': session['session_id']},
                         'created_at': int(time.time()),
@@ -360,4 +369,51 @@ def register_library_session_endpoints(app):
             print(f"Error in forgotten_logouts: {e}")
             return jsonify(error=str(e)), 500
     
+    @app.route('/api/library/active-sessions', methods=['GET'])
+    def library_active_sessions():
+        """Get all active library sessions (counts come from the live occupancy counters)"""
+        user_type = request.args.get('userType', None)
+        counts = occupancy.snapshot()
+        # ?countsOnly=1 skips the session query (dashboards only need the numbers)
+        sessions = []
+        if not request.args.get('countsOnly'):
+            try:
+                query = """
+                    SELECT session_id, user_id, user_type, full_name, login_time
+                    FROM library_sessions
+                    WHERE status = 'inside_library' AND (%s IS NULL OR user_type = %s)
+                    ORDER BY login_time DESC
+                """
+                rows = execute_query(query, (user_type, user_type), fetch_all=True) or []
+                sessions = [{
+                    'sessionId': r['session_id'],
+                    'userId': r['user_id'],
+                    'userType': r['user_type'],
+                    'fullName': r['full_name'],
+                    'loginTime': int(r['login_time'].timestamp()) if hasattr(r['login_time'], 'timestamp') else r['login_time'],
+                    'status': 'active',
+                } for r in rows]
+            except Exception as e:
+                print(f"Error listing active sessions: {e}")
+                return jsonify(error=str(e)), 500
+        
+        return jsonify(
+            sessions=sessions,
+            count=counts['byUserType'].get(user_type, 0) if user_type else counts['total'],
+            students=counts['students'],
+            admins=counts['admins']
+        )
+    
+    @app.route('/api/ai/generate-logout-warning', methods=['POST'])
+    def ai_generate_logout_warning():
+        """Generate varied AI warning message for forgotten logout"""
+        body = request.get_json(force=True)
+        full_name = (body.get('fullName') or 'User').strip()
+        
+        # Picked from the pre-generated pool (ai_message_pool.py); no repeats per user until it is exhausted
+        from ai_message_pool import forgotten_logout_message
+        warning = forgotten_logout_message(full_name, body.get('userId'))
+        
+        return jsonify(warning=warning, generated_at=int(time.time()))
+    
     print("✅ Library session endpoints registered")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+In-process Metrics
+Counters, gauges and latency summaries shared by the realtime and AI modules.
+Exposed as JSON at GET /api/metrics (optionally ?prefix=notifications.).
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional, Any
+
+SUMMARY_SAMPLES = 2048  # recent observations kept per summary for percentiles
+
+_LOCK = threading.Lock()
+_COUNTERS: Dict[str, float] = {}
+_GAUGES: Dict[str, float] = {}
+_SUMMARIES: Dict[str, 'Summary'] = {}
+
+
+class Summary:
+    """Running count/sum/min/max plus a window of recent samples"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.samples = deque(maxlen=SUMMARY_SAMPLES)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+        return ordered[idx]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'avg': round(self.total / self.count, 3) if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+def incr(name: str, value: float = 1):
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float):
+    with _LOCK:
+        _GAUGES[name] = value
+
+
+def observe(name: str, value: float):
+    with _LOCK:
+        summary = _SUMMARIES.get(name)
+        if summary is None:
+            summary = _SUMMARIES[name] = Summary()
+        summary.add(value)
+
+
+@contextmanager
+def timer(name: str):
+    """Observe the wall time of the block in milliseconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - start) * 1000.0)
+
+
+def counter(name: str) -> float:
+    with _LOCK:
+        return _COUNTERS.get(name, 0)
+
+
+def summary(name: str) -> Dict[str, Any]:
+    with _LOCK:
+        s = _SUMMARIES.get(name)
+        return s.to_dict() if s else Summary().to_dict()
+
+
+def snapshot(prefix: Optional[str] = None) -> Dict[str, Any]:
+    """All metrics, optionally limited to names starting with prefix"""
+    def keep(name: str) -> bool:
+        return not prefix or name.startswith(prefix)
+
+    with _LOCK:
+        return {
+            'counters': {k: v for k, v in _COUNTERS.items() if keep(k)},
+            'gauges': {k: v for k, v in _GAUGES.items() if keep(k)},
+            'summaries': {k: s.to_dict() for k, s in _SUMMARIES.items() if keep(k)},
+        }
+
+
+def reset():
+    with _LOCK:
+        _COUNTERS.clear()
+        _GAUGES.clear()
+        _SUMMARIES.clear()
+
+
+def register_metrics_endpoints(app):
+    """Register GET /api/metrics"""
+    from flask import request, jsonify
+
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics_snapshot():
+        return jsonify(snapshot(request.args.get('prefix')))
+
+    print("✅ Metrics endpoint registered")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Notification Coalescer
+Merges bursts of same-type admin notifications (library entry/exit at opening
+and closing time) into a single digest per window. The first event of a burst
+is delivered right away; the rest are held until the window closes and then
+delivered as one digest, e.g. "42 students entered the library between
+08:00–08:05". Per-event detail stays available via the digest id.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Any
+
+from flask import jsonify
+import metrics
+
+COALESCE_WINDOW_SECONDS = float(os.getenv('NOTIFICATION_COALESCE_WINDOW', '300'))
+COALESCE_TYPES = [t.strip() for t in os.getenv(
+    'NOTIFICATION_COALESCE_TYPES',
+    'library_login,library_logout,library_entry,library_exit,library_login_manual,'
+    'library_logout_manual,library_login_qr,library_logout_qr'
+).split(',') if t.strip()]
+COALESCE_LEADING = os.getenv('NOTIFICATION_COALESCE_LEADING', 'true').lower() == 'true'
+DIGEST_DETAIL_LIMIT = int(os.getenv('NOTIFICATION_DIGEST_DETAIL_LIMIT', '500'))
+
+# deliver(message, notification_type, meta)
+Deliver = Callable[[str, str, Dict[str, Any]], Any]
+
+_DIGEST_VERBS = {
+    'login': 'entered the library',
+    'entry': 'entered the library',
+    'logout': 'left the library',
+    'exit': 'left the library',
+}
+
+
+def _digest_verb(event_type: str) -> str:
+    for key, verb in _DIGEST_VERBS.items():
+        if key in event_type:
+            return verb
+    return f"triggered {event_type.replace('_', ' ')}"
+
+
+def _plural(n: int, word: str) -> str:
+    return f"{n} {word}" if n == 1 else f"{n} {word}s"
+
+
+def digest_message(event_type: str, events: List[Dict[str, Any]]) -> str:
+    """Human summary for a burst, grouped by userType"""
+    by_type: Dict[str, int] = {}
+    for e in events:
+        kind = (e.get('meta') or {}).get('userType') or 'user'
+        by_type[kind] = by_type.get(kind, 0) + 1
+    who = ' and '.join(_plural(n, kind) for kind, n in sorted(by_type.items(), key=lambda kv: -kv[1]))
+    start = time.strftime('%H:%M', time.localtime(events[0]['at']))
+    end = time.strftime('%H:%M', time.localtime(events[-1]['at']))
+    if start == end:
+        return f"{who} {_digest_verb(event_type)} at {start}"
+    return f"{who} {_digest_verb(event_type)} between {start}–{end}"
+
+
+class NotificationCoalescer:
+    """Per-(channel, event type) burst windows with leading-edge delivery"""
+
+    def __init__(
+        self,
+        window_seconds: float = COALESCE_WINDOW_SECONDS,
+        event_types: Optional[List[str]] = None,
+        leading: bool = COALESCE_LEADING,
+        detail_limit: int = DIGEST_DETAIL_LIMIT
+    ):
+        self.window_seconds = window_seconds
+        self.event_types = set(COALESCE_TYPES if event_types is None else event_types)
+        self.leading = leading
+        self.detail_limit = detail_limit
+        self._lock = threading.Lock()
+        self._windows: Dict[tuple, Dict[str, Any]] = {}
+        self._digests: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+    def submit(self, event_type: str, message: str, meta: Optional[Dict[str, Any]], deliver: Deliver, channel: str = 'admins') -> Any:
+        """
+        Route one event. Returns deliver()'s result if the event was delivered
+        immediately, or None if it was held for the window's digest.
+        """
+        metrics.incr('notifications.coalescer.events_in')
+        if self.window_seconds <= 0 or event_type not in self.event_types:
+            return self._deliver(deliver, message, event_type, meta or {})
+
+        now = time.time()
+        self.flush_due(now)
+        key = (channel, event_type)
+        with self._lock:
+            win = self._windows.get(key)
+            deliver_now = win is None and self.leading
+            if win is None:
+                win = self._windows[key] = {'opened': now, 'events': [], 'eventType': event_type}
+            win['deliver'] = deliver
+            if not deliver_now:
+                win['events'].append({'message': message, 'meta': meta or {}, 'at': now})
+        if deliver_now:
+            return self._deliver(deliver, message, event_type, meta or {})
+        return None
+
+    def flush_due(self, now: Optional[float] = None) -> int:
+        """Close windows older than window_seconds; returns notifications delivered"""
+        now = now or time.time()
+        with self._lock:
+            due = [k for k, w in self._windows.items() if now - w['opened'] >= self.window_seconds]
+            closed = [self._windows.pop(k) for k in due]
+        return sum(self._close(w) for w in closed)
+
+    def flush_all(self) -> int:
+        with self._lock:
+            closed = list(self._windows.values())
+            self._windows.clear()
+        return sum(self._close(w) for w in closed)
+
+    def get_digest(self, digest_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._digests.get(digest_id)
+
+    def stats(self) -> Dict[str, Any]:
+        events_in = metrics.counter('notifications.coalescer.events_in')
+        delivered = metrics.counter('notifications.coalescer.delivered')
+        with self._lock:
+            pending = sum(len(w['events']) for w in self._windows.values())
+        return {
+            'windowSeconds': self.window_seconds,
+            'eventTypes': sorted(self.event_types),
+            'eventsIn': events_in,
+            'delivered': delivered,
+            'digests': metrics.counter('notifications.coalescer.digests'),
+            'pending': pending,
+            'reductionRatio': round(1 - delivered / events_in, 4) if events_in else 0.0,
+        }
+
+    # ---- internals ----
+
+    def _deliver(self, deliver: Deliver, message: str, notification_type: str, meta: Dict[str, Any]) -> Any:
+        metrics.incr('notifications.coalescer.delivered')
+        try:
+            return deliver(message, notification_type, meta)
+        except Exception as e:
+            print(f"Error delivering notification ({notification_type}): {e}")
+            return None
+
+    def _close(self, win: Dict[str, Any]) -> int:
+        events = win['events']
+        if not events:
+            return 0
+        event_type = win['eventType']
+        if len(events) == 1:
+            e = events[0]
+            self._deliver(win['deliver'], e['message'], event_type, e['meta'])
+            return 1
+
+        digest_id = f"digest-{uuid.uuid4()}"
+        with self._lock:
+            self._digests[digest_id] = {
+                'id': digest_id,
+                'eventType': event_type,
+                'from': int(events[0]['at']),
+                'to': int(events[-1]['at']),
+                'events': [{'message': e['message'], 'meta': e['meta'], 'at': int(e['at'])} for e in events],
+            }
+            while len(self._digests) > self.detail_limit:
+                self._digests.popitem(last=False)
+        metrics.incr('notifications.coalescer.digests')
+        self._deliver(win['deliver'], digest_message(event_type, events), event_type, {
+            'digest': True,
+            'digestId': digest_id,
+            'count': len(events),
+            'from': int(events[0]['at']),
+            'to': int(events[-1]['at']),
+        })
+        return 1
+
+
+# Shared instance used by the library session/entry modules
+coalescer = NotificationCoalescer()
+
+
+def register_coalescer_endpoints(app, socketio=None):
+    """Register digest/metrics endpoints and start the window flusher"""
+
+    @app.route('/api/notifications/digest/<digest_id>', methods=['GET'])
+    def notifications_digest(digest_id: str):
+        digest = coalescer.get_digest(digest_id)
+        if not digest:
+            return jsonify(error='Digest not found or expired'), 404
+        return jsonify(digest)
+
+    @app.route('/api/notifications/coalescer/stats', methods=['GET'])
+    def notifications_coalescer_stats():
+        return jsonify(coalescer.stats())
+
+    if socketio is not None and coalescer.window_seconds > 0:
+        def _flush_loop():
+            interval = max(1.0, min(10.0, coalescer.window_seconds / 10))
+            while True:
+                socketio.sleep(interval)
+                try:
+                    coalescer.flush_due()
+                except Exception as e:
+                    print(f"Error flushing notification digests: {e}")
+
+        socketio.start_background_task(_flush_loop)
+
+    print("✅ Notification coalescer registered")
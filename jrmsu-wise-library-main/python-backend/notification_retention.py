@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Notification / Activity Log Retention
+Maintains monthly partitions for notifications and activity_log, applies
+per-event-type retention windows and archives expired data to gzip files
+that can be restored on demand.
+
+Usage:
+    python notification_retention.py run          # partitions + retention
+    python notification_retention.py partitions   # only add upcoming partitions
+    python notification_retention.py list         # list archive files
+    python notification_retention.py restore <file>
+"""
+
+import gzip
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Any, Tuple
+
+from flask import request, jsonify
+from db import get_db_connection
+
+# Table layout: which column partitions by time and which one holds the event type
+RETENTION_TABLES = {
+    'notifications': {'time_column': 'created_at', 'type_column': 'type'},
+    'activity_log': {'time_column': 'timestamp', 'type_column': 'event_type'},
+}
+
+# Retention windows in days per table; 'default' applies to unlisted types.
+# Override with RETENTION_POLICY='{"activity_log": {"library_login": 30}}'
+DEFAULT_RETENTION_POLICY = {
+    'notifications': {'default': 180},
+    'activity_log': {'default': 365, 'library_login': 90, 'library_logout': 90},
+}
+
+ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', os.path.join(os.path.dirname(__file__), 'archive'))
+PARTITION_MONTHS_AHEAD = int(os.getenv('RETENTION_PARTITION_MONTHS_AHEAD', '2'))
+DELETE_CHUNK_SIZE = int(os.getenv('RETENTION_DELETE_CHUNK', '5000'))
+FUTURE_PARTITION = 'p_future'
+
+
+def load_retention_policy() -> Dict[str, Dict[str, int]]:
+    """Default policy merged with the RETENTION_POLICY env override"""
+    policy = {t: dict(p) for t, p in DEFAULT_RETENTION_POLICY.items()}
+    raw = os.getenv('RETENTION_POLICY')
+    if raw:
+        try:
+            for table, windows in json.loads(raw).items():
+                if table in RETENTION_TABLES:
+                    policy.setdefault(table, {}).update({k: int(v) for k, v in windows.items()})
+        except (ValueError, AttributeError) as e:
+            print(f"⚠️  Ignoring invalid RETENTION_POLICY: {e}")
+    return policy
+
+
+# ---------- Partition helpers ----------
+
+def _partition_name(month_start: date) -> str:
+    return f"p{month_start.year:04d}{month_start.month:02d}"
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + (d.month // 12), d.month % 12 + 1, 1)
+
+
+def list_partitions(table: str) -> List[Dict[str, Any]]:
+    """Partitions of a table ordered by position, with their upper bound (unix ts or None for MAXVALUE)"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS bound, TABLE_ROWS AS row_estimate
+                FROM INFORMATION_SCHEMA.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+                ORDER BY PARTITION_ORDINAL_POSITION
+            """, (table,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    for r in rows:
+        r['bound'] = None if (r['bound'] or '').upper() == 'MAXVALUE' else int(r['bound'])
+    return rows
+
+
+def ensure_future_partitions(table: str, months_ahead: int = PARTITION_MONTHS_AHEAD, today: Optional[date] = None) -> List[str]:
+    """
+    Split the MAXVALUE partition so that every month up to `months_ahead`
+    from now has its own partition. Returns names of partitions created.
+    """
+    today = today or date.today()
+    parts = list_partitions(table)
+    if not parts or parts[-1]['bound'] is not None:
+        print(f"⚠️  {table} is not range-partitioned; run database/notifications_partitioning_migration.sql")
+        return []
+
+    bounded = [p for p in parts if p['bound'] is not None]
+    if bounded:
+        cursor_month = datetime.fromtimestamp(bounded[-1]['bound']).date().replace(day=1)
+    else:
+        cursor_month = today.replace(day=1)
+
+    target = today.replace(day=1)
+    for _ in range(months_ahead + 1):
+        target = _next_month(target)
+
+    new_parts = []
+    while cursor_month < target:
+        upper = _next_month(cursor_month)
+        new_parts.append((_partition_name(cursor_month), upper))
+        cursor_month = upper
+    if not new_parts:
+        return []
+
+    defs = ', '.join(
+        f"PARTITION {name} VALUES LESS THAN (UNIX_TIMESTAMP('{upper.isoformat()} 00:00:00'))"
+        for name, upper in new_parts
+    )
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"ALTER TABLE {table} REORGANIZE PARTITION {FUTURE_PARTITION} INTO "
+                f"({defs}, PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE)"
+            )
+        finally:
+            cursor.close()
+    return [name for name, _ in new_parts]
+
+
+# ---------- Archive files ----------
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+def _archive_path(name: str) -> str:
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    return os.path.join(ARCHIVE_DIR, name)
+
+
+def _write_archive(cursor, name: str, meta: Dict[str, Any], keep_empty: bool = True) -> Tuple[int, Optional[str]]:
+    """
+    Stream an executed SELECT into a gzip JSON Lines file; first line is metadata.
+    The file is named `<name>-<run time>.jsonl.gz` (plus a counter if that is
+    taken) so a later run never replaces an earlier archive. Returns the row
+    count and the file name, or None when nothing was kept.
+    """
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{name}-", suffix='.tmp', dir=ARCHIVE_DIR)
+    count = 0
+    columns = [c[0] for c in cursor.description]
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'_archive': meta}) + '\n')
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for row in rows:
+                    f.write(json.dumps({c: _jsonable(v) for c, v in zip(columns, row)}) + '\n')
+                count += len(rows)
+        if count == 0 and not keep_empty:
+            return 0, None
+        return count, _publish_archive(tmp_path, name, meta['archived_at'])
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _publish_archive(tmp_path: str, name: str, archived_at: int) -> str:
+    """Hard-link the finished tmp file under a free archive name; never overwrites"""
+    stem = f"{name}-{time.strftime('%Y%m%dT%H%M%S', time.localtime(archived_at))}"
+    for n in range(1000):
+        filename = f"{stem}.jsonl.gz" if n == 0 else f"{stem}-{n}.jsonl.gz"
+        try:
+            os.link(tmp_path, _archive_path(filename))
+            return filename
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"No free archive name for {stem}")
+
+
+def archive_partition(table: str, partition: str) -> Dict[str, Any]:
+    """Export one partition to ARCHIVE_DIR and drop it"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT * FROM {table} PARTITION ({partition})")
+            count, filename = _write_archive(cursor, f"{table}-{partition}", {
+                'table': table, 'partition': partition, 'archived_at': int(time.time())
+            })
+            cursor.execute(f"ALTER TABLE {table} DROP PARTITION {partition}")
+        finally:
+            cursor.close()
+    print(f"📦 Archived {table}.{partition}: {count} rows -> {filename}")
+    return {'table': table, 'partition': partition, 'rows': count, 'file': filename}
+
+
+def archive_expired_rows(table: str, event_types: Optional[List[str]], exclude: List[str], cutoff: datetime) -> Dict[str, Any]:
+    """
+    Archive and delete rows older than `cutoff` for the given event types
+    (or for every type not in `exclude` when event_types is None).
+    """
+    cfg = RETENTION_TABLES[table]
+    time_col, type_col = cfg['time_column'], cfg['type_column']
+    where = f"{time_col} < %s"
+    params: List[Any] = [cutoff]
+    if event_types is not None:
+        where += f" AND {type_col} IN ({','.join(['%s'] * len(event_types))})"
+        params.extend(event_types)
+    elif exclude:
+        where += f" AND {type_col} NOT IN ({','.join(['%s'] * len(exclude))})"
+        params.extend(exclude)
+
+    label = event_types[0] if event_types and len(event_types) == 1 else 'default'
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT * FROM {table} WHERE {where}", params)
+            count, filename = _write_archive(cursor, f"{table}-{label}-before-{cutoff.strftime('%Y%m%d')}", {
+                'table': table, 'event_type': label, 'before': cutoff.isoformat(), 'archived_at': int(time.time())
+            }, keep_empty=False)
+            if count == 0:
+                return {'table': table, 'event_type': label, 'rows': 0}
+            # Delete in chunks to keep lock time short
+            while True:
+                cursor.execute(f"DELETE FROM {table} WHERE {where} LIMIT {DELETE_CHUNK_SIZE}", params)
+                conn.commit()
+                if cursor.rowcount < DELETE_CHUNK_SIZE:
+                    break
+        finally:
+            cursor.close()
+    print(f"📦 Archived {count} {label} rows from {table} -> {filename}")
+    return {'table': table, 'event_type': label, 'rows': count, 'file': filename}
+
+
+def list_archives() -> List[Dict[str, Any]]:
+    """Archive files available for restore"""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    items = []
+    for name in sorted(os.listdir(ARCHIVE_DIR)):
+        if not name.endswith('.jsonl.gz'):
+            continue
+        path = os.path.join(ARCHIVE_DIR, name)
+        items.append({'file': name, 'bytes': os.path.getsize(path), 'modified': int(os.path.getmtime(path))})
+    return items
+
+
+def restore_archive(filename: str) -> Dict[str, Any]:
+    """
+    Load an archive file into `<table>_restored` (same columns, not partitioned)
+    so it can be queried without being swept up by the next retention run.
+    """
+    name = os.path.basename(filename)
+    if not re.match(r'^[\w.-]+\.jsonl\.gz$', name):
+        raise ValueError('Invalid archive file name')
+    path = os.path.join(ARCHIVE_DIR, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(name)
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        meta = json.loads(f.readline()).get('_archive') or {}
+        table = meta.get('table')
+        if table not in RETENTION_TABLES:
+            raise ValueError(f'Unknown archive table: {table}')
+        target = f"{table}_restored"
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS {target} LIKE {table}")
+                cursor.execute("""
+                    SELECT COUNT(*) FROM INFORMATION_SCHEMA.PARTITIONS
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+                """, (target,))
+                if cursor.fetchone()[0]:
+                    cursor.execute(f"ALTER TABLE {target} REMOVE PARTITIONING")
+
+                count = 0
+                batch: List[Dict[str, Any]] = []
+
+                def flush():
+                    if not batch:
+                        return
+                    cols = list(batch[0].keys())
+                    cursor.executemany(
+                        f"REPLACE INTO {target} ({', '.join(cols)}) VALUES ({', '.join(['%s'] * len(cols))})",
+                        [tuple(r.get(c) for c in cols) for r in batch]
+                    )
+                    conn.commit()
+                    batch.clear()
+
+                for line in f:
+                    if not line.strip():
+                        continue
+                    row = json.loads(line)
+                    for k, v in row.items():
+                        if isinstance(v, (dict, list)):
+                            row[k] = json.dumps(v)
+                    batch.append(row)
+                    count += 1
+                    if len(batch) >= 1000:
+                        flush()
+                flush()
+            finally:
+                cursor.close()
+
+    print(f"♻️  Restored {count} rows from {name} into {target}")
+    return {'file': name, 'table': target, 'rows': count}
+
+
+# ---------- Retention run ----------
+
+def apply_retention(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Add upcoming partitions, archive+drop whole partitions past the longest
+    window of each table, then trim event types with shorter windows.
+    """
+    now = now or datetime.now()
+    policy = load_retention_policy()
+    summary: Dict[str, Any] = {'partitionsCreated': {}, 'partitionsArchived': [], 'rowsArchived': []}
+
+    for table in RETENTION_TABLES:
+        windows = policy.get(table) or {}
+        if not windows:
+            continue
+        try:
+            summary['partitionsCreated'][table] = ensure_future_partitions(table, today=now.date())
+        except Exception as e:
+            print(f"Error creating partitions for {table}: {e}")
+
+        longest = max(windows.values())
+        partition_cutoff = int((now - timedelta(days=longest)).timestamp())
+        try:
+            for part in list_partitions(table):
+                if part['bound'] is not None and part['bound'] <= partition_cutoff:
+                    summary['partitionsArchived'].append(archive_partition(table, part['name']))
+        except Exception as e:
+            print(f"Error archiving partitions for {table}: {e}")
+
+        listed = [t for t in windows if t != 'default']
+        for event_type, days in windows.items():
+            if days >= longest:
+                continue
+            cutoff = now - timedelta(days=days)
+            try:
+                if event_type == 'default':
+                    result = archive_expired_rows(table, None, listed, cutoff)
+                else:
+                    result = archive_expired_rows(table, [event_type], [], cutoff)
+                if result['rows']:
+                    summary['rowsArchived'].append(result)
+            except Exception as e:
+                print(f"Error applying {event_type} retention on {table}: {e}")
+
+    return summary
+
+
+def register_retention_endpoints(app):
+    """Register admin endpoints for retention runs and archive restore"""
+
+    @app.route('/api/admin/retention/run', methods=['POST'])
+    def retention_run():
+        try:
+            return jsonify(ok=True, **apply_retention())
+        except Exception as e:
+            print(f"Error in retention_run: {e}")
+            return jsonify(error=str(e)), 500
+
+    @app.route('/api/admin/retention/policy', methods=['GET'])
+    def retention_policy():
+        return jsonify(policy=load_retention_policy())
+
+    @app.route('/api/admin/retention/archives', methods=['GET'])
+    def retention_archives():
+        return jsonify(items=list_archives())
+
+    @app.route('/api/admin/retention/restore', methods=['POST'])
+    def retention_restore():
+        body = request.get_json(force=True) or {}
+        try:
+            return jsonify(ok=True, **restore_archive(body.get('file') or ''))
+        except FileNotFoundError:
+            return jsonify(error='Archive not found'), 404
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        except Exception as e:
+            print(f"Error in retention_restore: {e}")
+            return jsonify(error=str(e)), 500
+
+    print("✅ Retention endpoints registered")
+
+
+if __name__ == '__main__':
+    cmd = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    if cmd == 'run':
+        print(json.dumps(apply_retention(), indent=2, default=str))
+    elif cmd == 'partitions':
+        for t in RETENTION_TABLES:
+            print(t, ensure_future_partitions(t))
+    elif cmd == 'list':
+        for a in list_archives():
+            print(f"{a['file']}\t{a['bytes']} bytes")
+    elif cmd == 'restore' and len(sys.argv) > 2:
+        print(restore_archive(sys.argv[2]))
+    else:
+        print(__doc__)
@@ -11,6 +11,8 @@ from notifications_service import (
     notify_user,
     log_activity
 )
+from notification_coalescer import coalescer
+from socket_batching import get_emit_batcher
 from datetime import datetime
 
 notifications_bp = Blueprint('notifications', __name__)
@@ -26,7 +28,7 @@ def get_notifications():
     role = request.args.get('role', 'admin')  # Default to admin
     filter_type = request.args.get('filter', 'all')
     limit = int(request.args.get('limit', 50))
-    offset = int(request.args.get('page', 1)) - 1) * limit
+    offset = (int(request.args.get('page', 1)) - 1) * limit
     
     notifications = NotificationsService.get_notifications(
         user_id=user_id,
@@ -59,11 +61,13 @@ def get_notification(notification_id):
 
 @notifications_bp.route('/api/notifications/mark-read', methods=['POST'])
 def mark_read():
-    """Mark notifications as read"""
+    """Mark notifications as read for the requesting user only"""
+    user_id = request.headers.get('X-User-Id')
+    role = request.args.get('role', 'admin')
     data = request.json
     notification_ids = data.get('notificationIds', [])
     
-    NotificationsService.mark_as_read(notification_ids)
+    NotificationsService.mark_as_read(notification_ids, user_id=user_id, role=role)
     
     return jsonify({'success': True})
 
@@ -128,14 +132,48 @@ def create_notification():
 # Notification Handlers
 # ============================================
 
+def notify_all_admins_coalesced(event_type, title, variables, details=None, source='MAIN'):
+    """
+    Notify all admins through the burst coalescer. Returns the notification
+    ID when created immediately, or None when the event was held for the
+    window's digest (see notification_coalescer.py).
+    """
+    def deliver(message, notification_type, meta):
+        if meta.get('digest'):
+            notif_id = notify_all_admins(
+                event_type='library_activity_digest',
+                title=f'{title} Digest',
+                variables={'summary': message},
+                details=meta,
+                source=source
+            )
+        else:
+            notif_id = notify_all_admins(
+                event_type=notification_type,
+                title=meta.get('title', title),
+                variables=meta.get('variables', {}),
+                details=meta.get('details'),
+                source=meta.get('source', source)
+            )
+        emit_notification_to_admins(notif_id)
+        return notif_id
+
+    return coalescer.submit(event_type, title, {
+        'title': title,
+        'variables': variables,
+        'details': details,
+        'source': source,
+        'userType': (details or {}).get('userType'),
+    }, deliver)
+
 def handle_library_login_manual(data, timestamp):
     """Handle library login (manual) notification"""
     user_id = data.get('userId')
     full_name = data.get('fullName')
     user_type = data.get('userType')
     
-    # Notify all admins
-    notif_id = notify_all_admins(
+    # Notify all admins (bursts are folded into a digest)
+    notif_id = notify_all_admins_coalesced(
         event_type='library_login_manual',
         title='Library Login (Manual)',
         variables={'userId': user_id, 'timestamp': timestamp},
@@ -152,9 +190,6 @@ def handle_library_login_manual(data, timestamp):
         source='MIRROR'
     )
     
-    # Emit WebSocket event
-    emit_notification_to_admins(notif_id)
-    
     return notif_id
 
 def handle_library_logout_manual(data, timestamp):
@@ -163,8 +198,8 @@ def handle_library_logout_manual(data, timestamp):
     full_name = data.get('fullName')
     user_type = data.get('userType')
     
-    # Notify all admins
-    notif_id = notify_all_admins(
+    # Notify all admins (bursts are folded into a digest)
+    notif_id = notify_all_admins_coalesced(
         event_type='library_logout_manual',
         title='Library Logout (Manual)',
         variables={'userId': user_id, 'timestamp': timestamp},
@@ -181,9 +216,6 @@ def handle_library_logout_manual(data, timestamp):
         source='MIRROR'
     )
     
-    # Emit WebSocket event
-    emit_notification_to_admins(notif_id)
-    
     return notif_id
 
 def handle_library_login_qr(data, timestamp):
@@ -192,8 +224,8 @@ def handle_library_login_qr(data, timestamp):
     full_name = data.get('fullName')
     user_type = data.get('userType')
     
-    # Notify all admins
-    notif_id = notify_all_admins(
+    # Notify all admins (bursts are folded into a digest)
+    notif_id = notify_all_admins_coalesced(
         event_type='library_login_qr',
         title='Library Login (QR Code)',
         variables={'userId': user_id, 'timestamp': timestamp},
@@ -210,9 +242,6 @@ def handle_library_login_qr(data, timestamp):
         source='MIRROR'
     )
     
-    # Emit WebSocket event
-    emit_notification_to_admins(notif_id)
-    
     return notif_id
 
 def handle_library_logout_qr(data, timestamp):
@@ -221,8 +250,8 @@ def handle_library_logout_qr(data, timestamp):
     full_name = data.get('fullName')
     user_type = data.get('userType')
     
-    # Notify all admins
-    notif_id = notify_all_admins(
+    # Notify all admins (bursts are folded into a digest)
+    notif_id = notify_all_admins_coalesced(
         event_type='library_logout_qr',
         title='Library Logout (QR Code)',
         variables={'userId': user_id, 'timestamp': timestamp},
@@ -239,9 +268,6 @@ def handle_library_logout_qr(data, timestamp):
         source='MIRROR'
     )
     
-    # Emit WebSocket event
-    emit_notification_to_admins(notif_id)
-    
     return notif_id
 
 def handle_book_reserved(data, timestamp):
@@ -371,24 +397,29 @@ def handle_book_overdue(data, timestamp):
 
 def emit_notification_to_admins(notification_id):
     """Emit notification to all connected admin clients"""
-    from app import socketio  # Import here to avoid circular dependency
-    
     # Get notification details
     notifications = NotificationsService.get_notifications(role='admin', limit=1000)
     notification = next((n for n in notifications if n['id'] == notification_id), None)
     
     if notification:
-        socketio.emit('notification:new', notification, room='admins')
+        _emit_to_room('notification:new', notification, 'admins')
 
 def emit_notification_to_user(user_id, notification_id):
     """Emit notification to specific user"""
-    from app import socketio
-    
     notifications = NotificationsService.get_notifications(user_id=user_id, limit=1000)
     notification = next((n for n in notifications if n['id'] == notification_id), None)
     
     if notification:
-        socketio.emit('notification:new', notification, room=f'user_{user_id}')
+        _emit_to_room('notification:new', notification, f'user_{user_id}')
+
+def _emit_to_room(event, payload, room):
+    """Emit through the shared batcher when the main app has one"""
+    batcher = get_emit_batcher()
+    if batcher is not None:
+        batcher.emit(event, payload, room)
+    else:
+        from app import socketio
+        socketio.emit(event, payload, room=room)
 
 # ============================================
 # WebSocket Events
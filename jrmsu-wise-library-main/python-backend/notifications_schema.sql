@@ -1,6 +1,11 @@
 -- Notifications Table (Actionable items in Notification Bell)
+-- Range-partitioned by month on created_at; notification_retention.py adds
+-- upcoming monthly partitions and archives/drops expired ones.
+-- Existing installs: run database/notifications_read_state_migration.sql, then
+-- database/notifications_partitioning_migration.sql.
 CREATE TABLE IF NOT EXISTS notifications (
-    id VARCHAR(50) PRIMARY KEY,
+    id VARCHAR(50) NOT NULL,
+    seq BIGINT NOT NULL AUTO_INCREMENT,  -- Monotonic order used by per-recipient read marks
     type VARCHAR(50) NOT NULL,
     title VARCHAR(255) NOT NULL,
     message TEXT NOT NULL,
@@ -8,30 +13,62 @@ CREATE TABLE IF NOT EXISTS notifications (
     source ENUM('MAIN', 'MIRROR') NOT NULL DEFAULT 'MAIN',
     target_role VARCHAR(20),  -- 'admin' for all admins, NULL for specific user
     target_user_id VARCHAR(50),  -- Specific user ID, NULL for all admins
-    read_flag BOOLEAN DEFAULT FALSE,
+    read_flag BOOLEAN DEFAULT FALSE,  -- Legacy shared flag; per-recipient state lives in notification_read_*
     action_required BOOLEAN DEFAULT FALSE,
     action_type VARCHAR(50),  -- 'grant_decline', 'view_profile', 'download_qr', etc.
     action_payload JSON,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at),  -- Partition key must be part of every unique key
     INDEX idx_target_role (target_role),
     INDEX idx_target_user (target_user_id),
     INDEX idx_created (created_at),
-    INDEX idx_read (read_flag)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    INDEX idx_read (read_flag),
+    UNIQUE KEY uq_seq (seq, created_at),
+    INDEX idx_role_seq (target_role, seq),
+    INDEX idx_user_seq (target_user_id, seq)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+    PARTITION p_start VALUES LESS THAN (UNIX_TIMESTAMP('2025-10-01 00:00:00')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
 
 -- Activity Log Table (Read-only audit trail in Recent Activity)
+-- Partitioned the same way as notifications (monthly on timestamp)
 CREATE TABLE IF NOT EXISTS activity_log (
-    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    id BIGINT AUTO_INCREMENT,
     event_type VARCHAR(50) NOT NULL,
     user_id VARCHAR(50) NOT NULL,
     summary VARCHAR(255) NOT NULL,
     details JSON,
     source ENUM('MAIN', 'MIRROR') NOT NULL DEFAULT 'MAIN',
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp),
     INDEX idx_user (user_id),
     INDEX idx_event_type (event_type),
     INDEX idx_timestamp (timestamp)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION p_start VALUES LESS THAN (UNIX_TIMESTAMP('2025-10-01 00:00:00')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
+
+-- Per-recipient read state (role notifications are stored once and shared)
+-- High-water mark: everything visible to the user with seq <= read_upto_seq is read
+CREATE TABLE IF NOT EXISTS notification_read_marks (
+    user_id VARCHAR(50) PRIMARY KEY,
+    read_upto_seq BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Exception set: notifications read individually above the user's high-water mark
+CREATE TABLE IF NOT EXISTS notification_read_receipts (
+    user_id VARCHAR(50) NOT NULL,
+    notification_id VARCHAR(50) NOT NULL,
+    seq BIGINT NOT NULL,
+    read_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, notification_id),
+    INDEX idx_user_seq (user_id, seq)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Notification Deduplication Tracking
@@ -105,6 +142,9 @@ INSERT INTO jose_message_templates (event_type, template, variables) VALUES
 ('library_logout_qr', '{userId} exited the library (QR code) at {timestamp}.', '["userId", "timestamp"]'),
 ('library_logout_qr', 'QR logout completed by {userId} at {timestamp}.', '["userId", "timestamp"]'),
 
+-- Library activity digest (coalesced login/logout bursts)
+('library_activity_digest', '{summary}.', '["summary"]'),
+
 -- Book reserved
 ('book_reserved', '{userId} reserved "{bookTitle}" ({bookId}) at {timestamp}.', '["userId", "bookId", "bookTitle", "timestamp"]'),
 ('book_reserved', 'Reservation created: "{bookTitle}" ({bookId}) by {userId} at {timestamp}.', '["userId", "bookId", "bookTitle", "timestamp"]'),
@@ -3,6 +3,7 @@ Notifications Service with Jose AI Message Generation
 Handles creating, retrieving, and managing notifications with unique AI-generated messages
 """
 
+import os
 import random
 import json
 from datetime import datetime
@@ -10,6 +11,10 @@ from typing import List, Dict, Optional, Any
 import mysql.connector
 from db import get_db_connection
 
+# Feed queries only look this far back so MySQL prunes to the recent monthly
+# partitions (see notification_retention.py); 0 disables the bound.
+FEED_WINDOW_DAYS = int(os.getenv('NOTIFICATION_FEED_WINDOW_DAYS', '90'))
+
 class JoseAI:
     """Jose AI - Generates unique notification messages"""
     
@@ -25,34 +30,148 @@ class JoseAI:
         Returns:
             Unique AI-generated message
         """
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with get_db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
         
-        try:
-            # Get all templates for this event type
-            cursor.execute(
-                "SELECT template FROM jose_message_templates WHERE event_type = %s",
-                (event_type,)
-            )
-            templates = cursor.fetchall()
+            try:
+                # Get all templates for this event type
+                cursor.execute(
+                    "SELECT template FROM jose_message_templates WHERE event_type = %s",
+                    (event_type,)
+                )
+                templates = cursor.fetchall()
+            
+                if not templates:
+                    # Fallback generic message
+                    return f"Event: {event_type} - {json.dumps(variables)}"
+            
+                # Randomly select a template
+                template = random.choice(templates)['template']
+            
+                # Replace variables in template
+                message = template
+                for key, value in variables.items():
+                    message = message.replace(f'{{{key}}}', str(value))
             
-            if not templates:
-                # Fallback generic message
-                return f"Event: {event_type} - {json.dumps(variables)}"
+                return message
+            
+            finally:
+                cursor.close()
+
+class ReadState:
+    """
+    Per-recipient read state for notifications.
+    
+    Each user has a high-water mark (notification_read_marks.read_upto_seq):
+    every notification visible to them with seq at or below it is read.
+    Notifications read individually above the mark are kept in a small
+    exception set (notification_read_receipts). "Mark all read" just moves
+    the mark and clears the exceptions, independent of how many admins share
+    the same role notifications.
+    """
+    
+    # SQL predicate for "n is read by the joined user" (aliases n, m, r)
+    READ_EXPR = "(n.seq <= COALESCE(m.read_upto_seq, 0) OR r.notification_id IS NOT NULL)"
+    
+    @staticmethod
+    def _get_mark(cursor, user_id: str) -> int:
+        cursor.execute(
+            "SELECT read_upto_seq FROM notification_read_marks WHERE user_id = %s",
+            (user_id,)
+        )
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+    
+    @staticmethod
+    def mark_read(user_id: str, notification_ids: List[str], role: Optional[str] = None):
+        """Add notifications above the user's mark to their exception set"""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            try:
+                mark = ReadState._get_mark(cursor, user_id)
+                placeholders = ','.join(['%s'] * len(notification_ids))
+                # Anything at or below the mark is already read; skip it
+                cursor.execute(f"""
+                    INSERT INTO notification_read_receipts (user_id, notification_id, seq)
+                    SELECT %s, id, seq FROM notifications
+                    WHERE id IN ({placeholders}) AND seq > %s
+                      AND (target_user_id = %s OR target_role = %s)
+                    ON DUPLICATE KEY UPDATE read_at = read_at
+                """, [user_id, *notification_ids, mark, user_id, role])
+                # Keep the legacy flag in sync for personal notifications
+                cursor.execute(f"""
+                    UPDATE notifications SET read_flag = TRUE
+                    WHERE id IN ({placeholders}) AND target_user_id = %s
+                """, [*notification_ids, user_id])
+                conn.commit()
             
-            # Randomly select a template
-            template = random.choice(templates)['template']
+            finally:
+                cursor.close()
+    
+    @staticmethod
+    def mark_all_read(user_id: str, role: Optional[str] = None):
+        """Move the user's mark to the newest visible notification"""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            try:
+                cursor.execute("""
+                    SELECT COALESCE(MAX(seq), 0) FROM notifications
+                    WHERE target_user_id = %s OR target_role = %s
+                """, (user_id, role))
+                newest = int(cursor.fetchone()[0])
+                cursor.execute("""
+                    INSERT INTO notification_read_marks (user_id, read_upto_seq)
+                    VALUES (%s, %s)
+                    ON DUPLICATE KEY UPDATE read_upto_seq = GREATEST(read_upto_seq, VALUES(read_upto_seq))
+                """, (user_id, newest))
+                cursor.execute(
+                    "DELETE FROM notification_read_receipts WHERE user_id = %s AND seq <= %s",
+                    (user_id, newest)
+                )
+                cursor.execute(
+                    "UPDATE notifications SET read_flag = TRUE WHERE target_user_id = %s AND read_flag = FALSE",
+                    (user_id,)
+                )
+                conn.commit()
             
-            # Replace variables in template
-            message = template
-            for key, value in variables.items():
-                message = message.replace(f'{{{key}}}', str(value))
+            finally:
+                cursor.close()
+    
+    @staticmethod
+    def unread_count(user_id: str, role: Optional[str] = None) -> int:
+        """
+        Count unread notifications for one user
+        
+        Only rows above the user's mark are touched (idx_role_seq /
+        idx_user_seq), so the cost tracks what is actually unread rather
+        than the size of the notifications table. Like the feed, only the
+        last FEED_WINDOW_DAYS are counted.
+        """
+        window = " AND created_at >= NOW() - INTERVAL %s DAY" if FEED_WINDOW_DAYS else ""
+        window_args = (FEED_WINDOW_DAYS,) if FEED_WINDOW_DAYS else ()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            try:
+                mark = ReadState._get_mark(cursor, user_id)
+                cursor.execute(f"""
+                    SELECT
+                        (SELECT COUNT(*) FROM notifications
+                         WHERE target_user_id = %s AND seq > %s{window})
+                      + (SELECT COUNT(*) FROM notifications
+                         WHERE target_role = %s AND seq > %s
+                           AND (target_user_id IS NULL OR target_user_id <> %s){window})
+                      - (SELECT COUNT(*) FROM notification_read_receipts r
+                         JOIN notifications ON notifications.id = r.notification_id
+                         WHERE r.user_id = %s AND r.seq > %s{window.replace('created_at', 'notifications.created_at')})
+                """, (user_id, mark, *window_args, role, mark, user_id, *window_args, user_id, mark, *window_args))
             
-            return message
+                return max(0, int(cursor.fetchone()[0] or 0))
             
-        finally:
-            cursor.close()
-            conn.close()
+            finally:
+                cursor.close()
 
 class NotificationsService:
     """Service for managing notifications and activity logs"""
@@ -92,58 +211,57 @@ class NotificationsService:
         Returns:
             Notification ID
         """
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        try:
-            # Check deduplication if key provided
-            if dedup_key and target_user_id:
-                cursor.execute(
-                    "SELECT id FROM notification_dedup WHERE user_id = %s AND event_type = %s AND event_key = %s",
-                    (target_user_id, event_type, dedup_key)
-                )
-                if cursor.fetchone():
-                    print(f"Notification deduplicated: {dedup_key}")
-                    return None
+            try:
+                # Check deduplication if key provided
+                if dedup_key and target_user_id:
+                    cursor.execute(
+                        "SELECT id FROM notification_dedup WHERE user_id = %s AND event_type = %s AND event_key = %s",
+                        (target_user_id, event_type, dedup_key)
+                    )
+                    if cursor.fetchone():
+                        print(f"Notification deduplicated: {dedup_key}")
+                        return None
                 
-                # Record dedup entry
-                cursor.execute(
-                    "INSERT INTO notification_dedup (user_id, event_type, event_key) VALUES (%s, %s, %s)",
-                    (target_user_id, event_type, dedup_key)
-                )
+                    # Record dedup entry
+                    cursor.execute(
+                        "INSERT INTO notification_dedup (user_id, event_type, event_key) VALUES (%s, %s, %s)",
+                        (target_user_id, event_type, dedup_key)
+                    )
             
-            # Generate unique message with Jose AI
-            message = JoseAI.generate_message(event_type, variables)
+                # Generate unique message with Jose AI
+                message = JoseAI.generate_message(event_type, variables)
             
-            # Generate notification ID
-            notif_id = f"NT-{int(datetime.now().timestamp() * 1000)}-{random.randint(1000, 9999)}"
+                # Generate notification ID
+                notif_id = f"NT-{int(datetime.now().timestamp() * 1000)}-{random.randint(1000, 9999)}"
             
-            # Insert notification
-            cursor.execute("""
-                INSERT INTO notifications 
-                (id, type, title, message, details, source, target_role, target_user_id, 
-                 action_required, action_type, action_payload)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                notif_id,
-                type,
-                title,
-                message,
-                json.dumps(details) if details else None,
-                source,
-                target_role,
-                target_user_id,
-                action_required,
-                action_type,
-                json.dumps(action_payload) if action_payload else None
-            ))
+                # Insert notification
+                cursor.execute("""
+                    INSERT INTO notifications 
+                    (id, type, title, message, details, source, target_role, target_user_id, 
+                     action_required, action_type, action_payload)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (
+                    notif_id,
+                    type,
+                    title,
+                    message,
+                    json.dumps(details) if details else None,
+                    source,
+                    target_role,
+                    target_user_id,
+                    action_required,
+                    action_type,
+                    json.dumps(action_payload) if action_payload else None
+                ))
             
-            conn.commit()
-            return notif_id
+                conn.commit()
+                return notif_id
             
-        finally:
-            cursor.close()
-            conn.close()
+            finally:
+                cursor.close()
     
     @staticmethod
     def create_activity_log(
@@ -163,26 +281,25 @@ class NotificationsService:
             details: Additional details as JSON
             source: 'MAIN' or 'MIRROR'
         """
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        try:
-            cursor.execute("""
-                INSERT INTO activity_log (event_type, user_id, summary, details, source)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (
-                event_type,
-                user_id,
-                summary,
-                json.dumps(details) if details else None,
-                source
-            ))
+            try:
+                cursor.execute("""
+                    INSERT INTO activity_log (event_type, user_id, summary, details, source)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (
+                    event_type,
+                    user_id,
+                    summary,
+                    json.dumps(details) if details else None,
+                    source
+                ))
             
-            conn.commit()
+                conn.commit()
             
-        finally:
-            cursor.close()
-            conn.close()
+            finally:
+                cursor.close()
     
     @staticmethod
     def get_notifications(
@@ -203,119 +320,159 @@ class NotificationsService:
             offset: Offset for pagination
         
         Returns:
-            List of notifications
+            List of notifications. When user_id is given, read_flag reflects
+            that user's own read state rather than the shared flag.
         """
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with get_db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
         
-        try:
-            query = """
-                SELECT * FROM notifications 
-                WHERE (target_user_id = %s OR target_role = %s)
-            """
-            params = [user_id, role]
-            
-            if filter == 'unread':
-                query += " AND read_flag = FALSE"
+            try:
+                if user_id:
+                    query = f"""
+                        SELECT n.*, {ReadState.READ_EXPR} AS read_flag
+                        FROM notifications n
+                        LEFT JOIN notification_read_marks m ON m.user_id = %s
+                        LEFT JOIN notification_read_receipts r
+                            ON r.user_id = %s AND r.notification_id = n.id
+                        WHERE (n.target_user_id = %s OR n.target_role = %s)
+                    """
+                    params = [user_id, user_id, user_id, role]
+                    if FEED_WINDOW_DAYS:
+                        query += " AND n.created_at >= NOW() - INTERVAL %s DAY"
+                        params.append(FEED_WINDOW_DAYS)
+                    if filter == 'unread':
+                        query += f" AND NOT {ReadState.READ_EXPR}"
+                    query += " ORDER BY n.created_at DESC LIMIT %s OFFSET %s"
+                else:
+                    query = """
+                        SELECT * FROM notifications 
+                        WHERE (target_user_id = %s OR target_role = %s)
+                    """
+                    params = [user_id, role]
+                    if FEED_WINDOW_DAYS:
+                        query += " AND created_at >= NOW() - INTERVAL %s DAY"
+                        params.append(FEED_WINDOW_DAYS)
+                    if filter == 'unread':
+                        query += " AND read_flag = FALSE"
+                    query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
+                params.extend([limit, offset])
             
-            query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-            params.extend([limit, offset])
+                cursor.execute(query, params)
+                notifications = cursor.fetchall()
             
-            cursor.execute(query, params)
-            notifications = cursor.fetchall()
+                # Parse JSON fields
+                for notif in notifications:
+                    notif['read_flag'] = bool(notif['read_flag'])
+                    if notif['details']:
+                        notif['details'] = json.loads(notif['details'])
+                    if notif['action_payload']:
+                        notif['action_payload'] = json.loads(notif['action_payload'])
             
-            # Parse JSON fields
-            for notif in notifications:
-                if notif['details']:
-                    notif['details'] = json.loads(notif['details'])
-                if notif['action_payload']:
-                    notif['action_payload'] = json.loads(notif['action_payload'])
+                return notifications
             
-            return notifications
-            
-        finally:
-            cursor.close()
-            conn.close()
+            finally:
+                cursor.close()
     
     @staticmethod
     def get_unread_count(user_id: Optional[str] = None, role: Optional[str] = None) -> int:
         """Get count of unread notifications"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        if user_id:
+            return ReadState.unread_count(user_id, role)
+        
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        try:
-            cursor.execute("""
-                SELECT COUNT(*) FROM notifications 
-                WHERE (target_user_id = %s OR target_role = %s) AND read_flag = FALSE
-            """, (user_id, role))
+            try:
+                cursor.execute("""
+                    SELECT COUNT(*) FROM notifications 
+                    WHERE (target_user_id = %s OR target_role = %s) AND read_flag = FALSE
+                """, (user_id, role))
             
-            return cursor.fetchone()[0]
+                return cursor.fetchone()[0]
             
-        finally:
-            cursor.close()
-            conn.close()
+            finally:
+                cursor.close()
     
     @staticmethod
-    def mark_as_read(notification_ids: List[str]):
-        """Mark notifications as read"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    def mark_as_read(
+        notification_ids: List[str],
+        user_id: Optional[str] = None,
+        role: Optional[str] = None
+    ):
+        """
+        Mark notifications as read
         
-        try:
-            placeholders = ','.join(['%s'] * len(notification_ids))
-            cursor.execute(
-                f"UPDATE notifications SET read_flag = TRUE WHERE id IN ({placeholders})",
-                notification_ids
-            )
-            conn.commit()
+        With a user_id only that recipient's read state changes, so a shared
+        admin notification stays unread for the other admins.
+        """
+        if not notification_ids:
+            return
+        if user_id:
+            ReadState.mark_read(user_id, notification_ids, role)
+            return
+        
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            try:
+                placeholders = ','.join(['%s'] * len(notification_ids))
+                cursor.execute(
+                    f"UPDATE notifications SET read_flag = TRUE WHERE id IN ({placeholders})",
+                    notification_ids
+                )
+                conn.commit()
             
-        finally:
-            cursor.close()
-            conn.close()
+            finally:
+                cursor.close()
     
     @staticmethod
     def mark_all_as_read(user_id: Optional[str] = None, role: Optional[str] = None):
         """Mark all notifications as read for a user or role"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        if user_id:
+            ReadState.mark_all_read(user_id, role)
+            return
+        
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        try:
-            cursor.execute("""
-                UPDATE notifications 
-                SET read_flag = TRUE 
-                WHERE (target_user_id = %s OR target_role = %s)
-            """, (user_id, role))
-            conn.commit()
+            try:
+                cursor.execute("""
+                    UPDATE notifications 
+                    SET read_flag = TRUE 
+                    WHERE (target_user_id = %s OR target_role = %s)
+                """, (user_id, role))
+                conn.commit()
             
-        finally:
-            cursor.close()
-            conn.close()
+            finally:
+                cursor.close()
     
     @staticmethod
     def get_activity_log(limit: int = 100, offset: int = 0) -> List[Dict]:
         """Get recent activity log entries"""
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with get_db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
         
-        try:
-            cursor.execute("""
-                SELECT * FROM activity_log 
-                ORDER BY timestamp DESC 
-                LIMIT %s OFFSET %s
-            """, (limit, offset))
+            try:
+                query = "SELECT * FROM activity_log"
+                params = []
+                if FEED_WINDOW_DAYS:
+                    query += " WHERE timestamp >= NOW() - INTERVAL %s DAY"
+                    params.append(FEED_WINDOW_DAYS)
+                query += " ORDER BY timestamp DESC LIMIT %s OFFSET %s"
+                params.extend([limit, offset])
+                cursor.execute(query, params)
             
-            activities = cursor.fetchall()
+                activities = cursor.fetchall()
             
-            # Parse JSON fields
-            for activity in activities:
-                if activity['details']:
-                    activity['details'] = json.loads(activity['details'])
+                # Parse JSON fields
+                for activity in activities:
+                    if activity['details']:
+                        activity['details'] = json.loads(activity['details'])
             
-            return activities
+                return activities
             
-        finally:
-            cursor.close()
-            conn.close()
+            finally:
+                cursor.close()
 
 # Helper functions for common notification patterns
 
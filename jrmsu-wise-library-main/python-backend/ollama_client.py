@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Ollama Client
+Shared request building and calls to the local Ollama server, used by the
+blocking /ai/chat endpoint and the streaming endpoints. All calls go through
+one pooled keep-alive session instead of a new TCP connection per request,
+and through a circuit breaker that fails fast while Ollama is down.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import bleach
+import requests
+import requests.adapters
+
+import metrics
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+MODEL_NAME = os.getenv("OLLAMA_MODEL", "llama3:8b-instruct-q4_K_M")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "60"))
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "8"))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "3"))
+AI_BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+# Turns accepted from the client; ai_memory fits them into the context budget
+HISTORY_MAX_TURNS = int(os.getenv("AI_HISTORY_MAX_TURNS", "40"))
+# How long Ollama keeps the model loaded after a request (a top-level request field, not an option);
+# ai_warmup shortens it after library hours
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# A response whose load_duration exceeds this had to load the model first (cold start)
+COLD_LOAD_MS = float(os.getenv("AI_COLD_LOAD_MS", "500"))
+
+SYSTEM_PROMPT = "You are Jose, the JRMSU Library AI assistant."
+CHAT_OPTIONS = {
+    "temperature": 0.2,
+    "top_p": 0.9,
+    "repeat_penalty": 1.1,
+    "num_ctx": 2048,
+    "num_predict": 256,
+}
+_keep_alive = OLLAMA_KEEP_ALIVE
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting"""
+    return len(text or '') // 4 + 1
+
+
+_session: Optional[requests.Session] = None
+
+
+def session() -> requests.Session:
+    """Process-wide keep-alive session (one connection pool to Ollama)"""
+    global _session
+    if _session is None:
+        s = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE)
+        s.mount('http://', adapter)
+        s.mount('https://', adapter)
+        _session = s
+    return _session
+
+
+class OllamaError(Exception):
+    """Ollama answered with a non-2xx status"""
+
+    def __init__(self, status: int, details: str):
+        super().__init__(f"Ollama request failed ({status})")
+        self.status = status
+        self.details = details
+
+
+class OllamaUnavailable(OllamaError):
+    """The circuit breaker is open; the request was not sent"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(503, "AI model is temporarily unavailable")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive failures; open -> half_open
+    once `reset_seconds` have passed, letting one trial call (or health
+    probe) through; its success closes the breaker, its failure re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failures: int = AI_BREAKER_FAILURES, reset_seconds: float = AI_BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._failed = 0
+        self._trial = False
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str, str], None]] = []
+
+    def on_change(self, listener: Callable[[str, str], None]):
+        """listener(old_state, new_state), called outside the lock"""
+        self._listeners.append(listener)
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def is_open(self) -> bool:
+        """Open and still cooling down (no state change)"""
+        return self.state == self.OPEN and self.retry_after() > 0
+
+    def allow(self) -> bool:
+        """May a call go out now? In half_open only one trial is let through"""
+        with self._lock:
+            old = self.state
+            if self.state == self.OPEN:
+                if self.retry_after() > 0:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.HALF_OPEN:
+                if self._trial:
+                    allowed = False
+                else:
+                    self._trial = allowed = True
+            else:
+                allowed = True
+            new = self.state
+        self._notify(old, new)
+        return allowed
+
+    def record_success(self):
+        with self._lock:
+            old = self.state
+            self.state = self.CLOSED
+            self._failed = 0
+            self._trial = False
+        self._notify(old, self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            old = self.state
+            self._failed += 1
+            if self.state == self.HALF_OPEN or self._failed >= self.failures:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._trial = False
+            new = self.state
+        self._notify(old, new)
+
+    def _notify(self, old: str, new: str):
+        if old == new:
+            return
+        for listener in self._listeners:
+            try:
+                listener(old, new)
+            except Exception as e:
+                print(f"Error in circuit breaker listener: {e}")
+
+
+breaker = CircuitBreaker()
+
+
+def _guarded(send: Callable[[], Any]) -> Any:
+    """Run a request through the breaker; connection errors and 5xx/404 count as failures"""
+    if not breaker.allow():
+        raise OllamaUnavailable(breaker.retry_after())
+    try:
+        result = send()
+    except requests.RequestException:
+        breaker.record_failure()
+        raise
+    except OllamaError as e:
+        if e.status >= 500 or e.status == 404:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+    breaker.record_success()
+    return result
+
+
+def build_chat_messages(body: Dict[str, Any]) -> List[Dict[str, str]]:
+    """System prompt + last HISTORY_MAX_TURNS history turns + the new message, all sanitized"""
+    raw_message = (body.get('message') or '').strip()
+    # Sanitize input to prevent prompt injection / XSS
+    message = bleach.clean(raw_message, strip=True)
+    history = body.get('history') or []
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    for h in history[-HISTORY_MAX_TURNS:]:
+        role = h.get('role') in ('user', 'assistant', 'system') and h.get('role') or 'user'
+        content = bleach.clean(str(h.get('content') or ''), strip=True)
+        messages.append({"role": role, "content": content})
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+def set_keep_alive(value: str):
+    """keep_alive sent with every chat from now on (e.g. '30m' in library hours, '5m' after)"""
+    global _keep_alive
+    _keep_alive = value
+
+
+def get_keep_alive() -> str:
+    return _keep_alive
+
+
+def _chat_payload(messages: List[Dict[str, str]], stream: bool, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "model": MODEL_NAME,
+        "messages": messages,
+        "stream": stream,
+        "keep_alive": _keep_alive,
+        "options": {**CHAT_OPTIONS, **(options or {})},
+    }
+
+
+def was_cold(final: Dict[str, Any]) -> bool:
+    """Did this response include loading the model? (load_duration is in nanoseconds)"""
+    return (final.get('load_duration') or 0) / 1e6 > COLD_LOAD_MS
+
+
+def _observe_reply(final: Dict[str, Any], first_token_ms: Optional[float]):
+    """ai.first_token_ms.cold / .warm, ai.model.cold_starts and prompt evaluation cost"""
+    if final.get('prompt_eval_count') is not None:
+        metrics.observe('ai.prompt_eval.tokens', final['prompt_eval_count'])
+        metrics.observe('ai.prompt_eval.ms', (final.get('prompt_eval_duration') or 0) / 1e6)
+    cold = was_cold(final)
+    if cold:
+        metrics.incr('ai.model.cold_starts')
+        metrics.observe('ai.model.load_ms', final['load_duration'] / 1e6)
+    if first_token_ms is not None:
+        metrics.observe(f"ai.first_token_ms.{'cold' if cold else 'warm'}", first_token_ms)
+
+
+def chat(messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None, timeout: float = OLLAMA_TIMEOUT) -> str:
+    """Blocking chat; returns the assistant content"""
+    def send():
+        r = session().post(f"{OLLAMA_URL}/api/chat", json=_chat_payload(messages, False, options), timeout=timeout)
+        if not r.ok:
+            raise OllamaError(r.status_code, r.text)
+        return r
+    data = _guarded(send).json()
+    _observe_reply(data, None)
+    return (data.get('message') or {}).get('content', '')
+
+
+class ChatStream:
+    """
+    Iterates content deltas of a streamed chat. close() drops the upstream
+    connection, which makes Ollama stop generating.
+    """
+
+    def __init__(self, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None, timeout: float = OLLAMA_TIMEOUT):
+        self.started = time.perf_counter()
+        self.first_token_ms: Optional[float] = None
+
+        def send():
+            resp = session().post(
+                f"{OLLAMA_URL}/api/chat",
+                json=_chat_payload(messages, True, options),
+                stream=True,
+                timeout=timeout,
+            )
+            if not resp.ok:
+                details = resp.text
+                resp.close()
+                raise OllamaError(resp.status_code, details)
+            return resp
+        self._resp = _guarded(send)
+        self.final: Dict[str, Any] = {}
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for line in self._resp.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    raise OllamaError(500, chunk['error'])
+                delta = (chunk.get('message') or {}).get('content', '')
+                if delta:
+                    if self.first_token_ms is None:
+                        self.first_token_ms = (time.perf_counter() - self.started) * 1000.0
+                    yield delta
+                if chunk.get('done'):
+                    self.final = chunk
+                    _observe_reply(chunk, self.first_token_ms)
+                    break
+        finally:
+            self.close()
+
+    def close(self):
+        self._resp.close()
+
+
+def tags(timeout: float = 3) -> List[str]:
+    """Names of the installed models (raises on connection errors / non-2xx)"""
+    r = session().get(f"{OLLAMA_URL}/api/tags", timeout=timeout)
+    if not r.ok:
+        raise OllamaError(r.status_code, r.text)
+    return [m.get('name', '') for m in r.json().get('models') or []]
+
+
+def load_model(keep_alive: str, timeout: float = OLLAMA_TIMEOUT) -> Dict[str, Any]:
+    """
+    Load MODEL_NAME (an empty generate request) and keep it for `keep_alive`;
+    keep_alive '0' unloads it. Returns Ollama's reply (load_duration, done_reason).
+    """
+    def send():
+        r = session().post(f"{OLLAMA_URL}/api/generate",
+                           json={"model": MODEL_NAME, "keep_alive": keep_alive}, timeout=timeout)
+        if not r.ok:
+            raise OllamaError(r.status_code, r.text)
+        return r
+    return _guarded(send).json()
+
+
+def loaded_models(timeout: float = 3) -> List[Dict[str, Any]]:
+    """Models currently in memory (GET /api/ps) with their expires_at"""
+    r = session().get(f"{OLLAMA_URL}/api/ps", timeout=timeout)
+    if not r.ok:
+        raise OllamaError(r.status_code, r.text)
+    return r.json().get('models') or []
+
+
+def health(timeout: float = 3) -> bool:
+    r = session().get(f"{OLLAMA_URL}/api/tags", timeout=timeout)
+    return r.ok
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Socket.IO Slow-Consumer Backpressure
+Room emits are fanned out into a bounded outbound queue per connection. A
+frame is handed to the connection's transport only while the transport's own
+queue (engineio) is shallow, so a kiosk on bad Wi-Fi can't make it grow without
+limit. Batch frames (socket_batching) are split into their events before
+queueing, so policies and latency metrics apply per event, and queued events
+are re-batched when handed to the transport. When a connection's queue is
+full the event's policy decides what goes:
+
+    drop_oldest  - discard the oldest queued event (default)
+    drop_newest  - discard the incoming event
+    collapse     - keep only the latest event of that name (e.g. occupancy)
+
+Sequenced events (user-room frames carrying _seq, see socket_sync) are never
+collapsed, and never discarded while an unsequenced one can go instead. If
+one must be dropped it is the oldest queued one, so a newer sequenced frame
+always follows it: the client sees the gap in _seq and replays the missing
+events with sync (or reloads, if they already left the sync log).
+scripts/socket_backpressure_check.py checks that a slow client recovers.
+
+Metrics (GET /api/metrics?prefix=socket.):
+    socket.queue.depth.total / .max / .connections, socket.queue.depth.room.<room>
+    socket.queue.dropped(.<event>), socket.queue.collapsed(.<event>), socket.queue.dropped_sequenced
+    socket.emit_latency_ms.<event>   queue -> transport handoff
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import metrics
+from socket_batching import BATCH_EVENT, SOCKET_BATCH_MAX
+
+SOCKET_QUEUE_MAX = int(os.getenv('SOCKET_QUEUE_MAX', '200'))
+SOCKET_QUEUE_TRANSPORT_MAX = int(os.getenv('SOCKET_QUEUE_TRANSPORT_MAX', '16'))
+SOCKET_QUEUE_TICK_MS = int(os.getenv('SOCKET_QUEUE_TICK_MS', '25'))
+SOCKET_QUEUE_DEFAULT_POLICY = os.getenv('SOCKET_QUEUE_DEFAULT_POLICY', 'drop_oldest')
+# event=policy pairs, e.g. "library.occupancy=collapse,notification.new=drop_oldest"
+SOCKET_QUEUE_POLICIES = dict(
+    pair.split('=', 1) for pair in os.getenv('SOCKET_QUEUE_POLICIES', 'library.occupancy=collapse').split(',')
+    if '=' in pair
+)
+POLICIES = ('drop_oldest', 'drop_newest', 'collapse')
+NAMESPACE = '/'
+
+
+def _events(event: str, data: Any):
+    """(name, payload) of every event in a frame; batch frames are unpacked"""
+    if event == BATCH_EVENT and isinstance(data, dict):
+        return [(e.get('event'), e.get('data')) for e in data.get('events') or []]
+    return [(event, data)]
+
+
+def _sequenced(item: tuple) -> bool:
+    return isinstance(item[1], dict) and '_seq' in item[1]
+
+
+class OutboundQueues:
+    """Per-connection bounded queues in front of socketio.emit(..., to=sid)"""
+
+    def __init__(
+        self,
+        socketio,
+        max_queue: int = SOCKET_QUEUE_MAX,
+        transport_max: int = SOCKET_QUEUE_TRANSPORT_MAX,
+        default_policy: str = SOCKET_QUEUE_DEFAULT_POLICY,
+        policies: Optional[Dict[str, str]] = None
+    ):
+        self.socketio = socketio
+        self.max_queue = max(1, max_queue)
+        self.transport_max = transport_max
+        self.default_policy = default_policy if default_policy in POLICIES else 'drop_oldest'
+        self.policies = {k.strip(): v.strip() for k, v in (SOCKET_QUEUE_POLICIES if policies is None else policies).items()}
+        self._lock = threading.Lock()
+        self._queues: Dict[str, deque] = {}  # sid -> deque of (event, data, room, enqueued_at)
+        self._room_gauges: set = set()
+        self._started = False
+
+    def policy_for(self, event: str) -> str:
+        policy = self.policies.get(event, self.default_policy)
+        return policy if policy in POLICIES else self.default_policy
+
+    def emit(self, event: str, data: Any, room: Optional[str] = None):
+        """Queue a frame's events for every connection in room (all connections if None)"""
+        sids = self._participants(room)
+        if sids is None:
+            # Room membership unavailable from this socketio version; emit unguarded
+            self.socketio.emit(event, data, room=room)
+            return
+        if not sids:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            backlog = any(self._queues.get(sid) for sid in sids)
+        if not backlog and all((self._transport_depth(sid) or 0) < self.transport_max for sid in sids):
+            # Fast path: everyone keeps up, so encode once and emit to the room
+            self.socketio.emit(event, data, room=room)
+            elapsed = (time.perf_counter() - now) * 1000.0
+            for name, _ in _events(event, data):
+                metrics.observe(f'socket.emit_latency_ms.{name}', elapsed)
+            return
+        with self._lock:
+            for name, payload in _events(event, data):
+                policy = self.policy_for(name)
+                for sid in sids:
+                    self._enqueue_locked(sid, (name, payload, room, now), policy)
+        self.pump()
+
+    def pump(self) -> int:
+        """Hand queued frames to transports that have room; returns frames sent"""
+        with self._lock:
+            ready = [sid for sid, q in self._queues.items() if q]
+        sent = 0
+        for sid in ready:
+            sent += self._pump_sid(sid)
+        return sent
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+
+        def _loop():
+            interval = SOCKET_QUEUE_TICK_MS / 1000.0
+            while True:
+                self.socketio.sleep(interval)
+                try:
+                    self.pump()
+                    self._update_gauges()
+                except Exception as e:
+                    print(f"Error pumping socket queues: {e}")
+
+        self.socketio.start_background_task(_loop)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            depths = {sid: len(q) for sid, q in self._queues.items()}
+        return {
+            'maxQueue': self.max_queue,
+            'transportMax': self.transport_max,
+            'defaultPolicy': self.default_policy,
+            'policies': self.policies,
+            'connections': len(depths),
+            'depthTotal': sum(depths.values()),
+            'depthMax': max(depths.values(), default=0),
+            'dropped': metrics.counter('socket.queue.dropped'),
+            'collapsed': metrics.counter('socket.queue.collapsed'),
+        }
+
+    # ---- internals ----
+
+    def _enqueue_locked(self, sid: str, item: tuple, policy: str):
+        queue = self._queues.get(sid)
+        if queue is None:
+            queue = self._queues[sid] = deque()
+        event = item[0]
+        if policy == 'collapse' and not _sequenced(item):
+            kept = [x for x in queue if x[0] != event or _sequenced(x)]
+            if len(kept) != len(queue):
+                metrics.incr('socket.queue.collapsed')
+                metrics.incr(f'socket.queue.collapsed.{event}', len(queue) - len(kept))
+                queue.clear()
+                queue.extend(kept)
+        if len(queue) >= self.max_queue:
+            if policy == 'drop_newest' and not _sequenced(item):
+                self._dropped(item)
+                return
+            victim = next((x for x in queue if not _sequenced(x)), None)
+            if victim is None and not _sequenced(item):
+                # Only sequenced events are queued; the incoming one is the cheapest loss
+                self._dropped(item)
+                return
+            if victim is None:
+                victim = queue[0]
+            queue.remove(victim)
+            self._dropped(victim)
+        queue.append(item)
+
+    def _dropped(self, item: tuple):
+        event = item[0]
+        metrics.incr('socket.queue.dropped')
+        metrics.incr(f'socket.queue.dropped.{event}')
+        if _sequenced(item):
+            metrics.incr('socket.queue.dropped_sequenced')
+
+    def _pump_sid(self, sid: str) -> int:
+        depth = self._transport_depth(sid)
+        if depth is None:
+            # Connection is gone; forget its backlog
+            with self._lock:
+                self._queues.pop(sid, None)
+            return 0
+        sent = 0
+        while depth + sent < self.transport_max:
+            with self._lock:
+                queue = self._queues.get(sid)
+                if not queue:
+                    break
+                items = [queue.popleft() for _ in range(min(len(queue), SOCKET_BATCH_MAX))]
+            if len(items) == 1:
+                self.socketio.emit(items[0][0], items[0][1], to=sid)
+            else:
+                self.socketio.emit(BATCH_EVENT, {
+                    'count': len(items),
+                    'events': [{'event': e, 'data': d} for e, d, _, _ in items],
+                }, to=sid)
+            now = time.perf_counter()
+            for event, _, _, enqueued_at in items:
+                metrics.observe(f'socket.emit_latency_ms.{event}', (now - enqueued_at) * 1000.0)
+            sent += 1
+        return sent
+
+    def _participants(self, room: Optional[str]):
+        try:
+            return [p[0] if isinstance(p, tuple) else p
+                    for p in self.socketio.server.manager.get_participants(NAMESPACE, room)]
+        except KeyError:
+            return []  # room has no members
+        except AttributeError:
+            return None
+
+    def _transport_depth(self, sid: str) -> Optional[int]:
+        """Frames waiting in the engineio socket queue; None if disconnected"""
+        server = self.socketio.server
+        try:
+            eio_sid = server.manager.eio_sid_from_sid(sid, NAMESPACE)
+        except AttributeError:
+            eio_sid = sid
+        if eio_sid is None:
+            return None
+        eio_socket = getattr(server.eio, 'sockets', {}).get(eio_sid)
+        if eio_socket is None or getattr(eio_socket, 'closed', False):
+            return None
+        queue = getattr(eio_socket, 'queue', None)
+        try:
+            return queue.qsize() if queue is not None else 0
+        except NotImplementedError:
+            return 0
+
+    def _update_gauges(self):
+        with self._lock:
+            depths = {sid: len(q) for sid, q in self._queues.items()}
+            by_room: Dict[str, int] = {}
+            for q in self._queues.values():
+                for item in q:
+                    room = item[2] or '*'
+                    by_room[room] = by_room.get(room, 0) + 1
+        metrics.set_gauge('socket.queue.connections', len(depths))
+        metrics.set_gauge('socket.queue.depth.total', sum(depths.values()))
+        metrics.set_gauge('socket.queue.depth.max', max(depths.values(), default=0))
+        for room in self._room_gauges - set(by_room):
+            metrics.set_gauge(f'socket.queue.depth.room.{room}', 0)
+        for room, depth in by_room.items():
+            metrics.set_gauge(f'socket.queue.depth.room.{room}', depth)
+        self._room_gauges = set(by_room)
+
+
+_queues: Optional[OutboundQueues] = None
+
+
+def init_outbound_queues(socketio) -> OutboundQueues:
+    """Create and start the process-wide outbound queues"""
+    global _queues
+    _queues = OutboundQueues(socketio)
+    _queues.start()
+    return _queues
+
+
+def get_outbound_queues() -> Optional[OutboundQueues]:
+    return _queues
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Socket.IO Emit Batching
+Collects events per room for one tick and sends them as a single 'batch'
+frame instead of one frame per event. A room with a single pending event
+still gets that event under its own name, so old clients keep working.
+
+Frame format:
+    socket.on('batch', frame)  ->  {'count': n, 'events': [{'event': name, 'data': payload}, ...]}
+"""
+
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+
+SOCKET_BATCH_TICK_MS = int(os.getenv('SOCKET_BATCH_TICK_MS', '50'))
+SOCKET_BATCH_MAX = int(os.getenv('SOCKET_BATCH_MAX', '100'))
+BATCH_EVENT = 'batch'
+
+
+class EmitBatcher:
+    """Per-room emit buffer flushed every tick (or when max_batch is reached)"""
+
+    def __init__(self, socketio, tick_ms: int = SOCKET_BATCH_TICK_MS, max_batch: int = SOCKET_BATCH_MAX, emitter=None):
+        self.socketio = socketio
+        # Anything with emit(event, data, room=...); the cluster emitter fans out to other workers
+        self.emitter = emitter or socketio
+        self.tick_ms = tick_ms
+        self.max_batch = max(1, max_batch)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Tuple[str, Any]]] = {}
+        self._started = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.tick_ms > 0
+
+    def emit(self, event: str, payload: Any, room: str):
+        """Queue an event for a room; sends immediately when batching is off"""
+        metrics.incr('socket.batch.events')
+        if not self.enabled:
+            self._send(room, [(event, payload)])
+            return
+        full = None
+        with self._lock:
+            queue = self._pending.setdefault(room, [])
+            queue.append((event, payload))
+            if len(queue) >= self.max_batch:
+                full = self._pending.pop(room)
+        if full:
+            self._send(room, full)
+
+    def flush(self) -> int:
+        """Send everything pending; returns number of frames sent"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return sum(self._send(room, events) for room, events in pending.items())
+
+    def start(self):
+        if self._started or not self.enabled:
+            return
+        self._started = True
+
+        def _loop():
+            interval = self.tick_ms / 1000.0
+            while True:
+                self.socketio.sleep(interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Error flushing socket batches: {e}")
+
+        self.socketio.start_background_task(_loop)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = sum(len(v) for v in self._pending.values())
+        return {
+            'tickMs': self.tick_ms,
+            'maxBatch': self.max_batch,
+            'events': metrics.counter('socket.batch.events'),
+            'frames': metrics.counter('socket.batch.frames'),
+            'framesSaved': metrics.counter('socket.batch.frames_saved'),
+            'pending': pending,
+        }
+
+    def _send(self, room: str, events: List[Tuple[str, Any]]) -> int:
+        frames = 0
+        for start in range(0, len(events), self.max_batch):
+            chunk = events[start:start + self.max_batch]
+            if len(chunk) == 1:
+                event, payload = chunk[0]
+                self.emitter.emit(event, payload, room=room)
+            else:
+                self.emitter.emit(BATCH_EVENT, {
+                    'count': len(chunk),
+                    'events': [{'event': e, 'data': d} for e, d in chunk],
+                }, room=room)
+            frames += 1
+        metrics.incr('socket.batch.frames', frames)
+        metrics.incr('socket.batch.frames_saved', len(events) - frames)
+        return frames
+
+
+_batcher: Optional[EmitBatcher] = None
+
+
+def init_emit_batcher(socketio, prepare=None) -> EmitBatcher:
+    """
+    Create and start the process-wide batcher: batcher -> pub/sub fan-out ->
+    prepare (e.g. socket_sync.stamp_frame, on the delivering worker) -> per-connection queues
+    """
+    global _batcher
+    from socket_pubsub import init_cluster_emitter
+    from socket_backpressure import init_outbound_queues
+    emitter = init_cluster_emitter(socketio, local=init_outbound_queues(socketio), prepare=prepare)
+    _batcher = EmitBatcher(socketio, emitter=emitter)
+    _batcher.start()
+    return _batcher
+
+
+def get_emit_batcher() -> Optional[EmitBatcher]:
+    return _batcher
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Socket.IO Cross-Process Pub/Sub
+Fans room emits out to every worker process so a client gets its events no
+matter which worker it is connected to. Each worker emits locally and
+publishes the frame; other workers re-emit it to their own clients.
+
+Backends (SOCKETIO_PUBSUB):
+    inprocess  - subscribers in the same Python process (default, single worker)
+    unix       - newline-delimited JSON over a Unix domain socket broker at
+                 SOCKETIO_PUBSUB_PATH; the first worker starts the broker when
+                 SOCKETIO_PUBSUB_AUTOSTART is on, or run it standalone:
+                     python socket_pubsub.py broker
+                 Workers reconnect with backoff when the broker goes away and
+                 one of them takes over as broker if its socket is gone.
+"""
+
+import abc
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+SOCKETIO_PUBSUB = os.getenv('SOCKETIO_PUBSUB', 'inprocess').lower()
+SOCKETIO_PUBSUB_PATH = os.getenv('SOCKETIO_PUBSUB_PATH', '/tmp/jrmsu-socketio.sock')
+SOCKETIO_PUBSUB_AUTOSTART = os.getenv('SOCKETIO_PUBSUB_AUTOSTART', 'true').lower() == 'true'
+SOCKETIO_PUBSUB_POLL_MS = int(os.getenv('SOCKETIO_PUBSUB_POLL_MS', '20'))
+SOCKETIO_PUBSUB_RECONNECT_MAX_MS = int(os.getenv('SOCKETIO_PUBSUB_RECONNECT_MAX_MS', '5000'))
+
+# handler(message) where message = {'origin', 'event', 'data', 'room'}
+Handler = Callable[[Dict[str, Any]], None]
+# prepare(event, data, room) -> data actually delivered to this worker's clients
+Prepare = Callable[[str, Any, Optional[str]], Any]
+
+
+def _metric(name: str, value: float = 1):
+    # metrics is optional so the broker can run on its own
+    try:
+        import metrics
+        metrics.incr(name, value)
+    except ImportError:
+        pass
+
+
+def _shutdown(sock: socket.socket):
+    # shutdown() first: close() alone leaves the fd open while a makefile() reader holds it
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    try:
+        sock.close()
+    except OSError:
+        pass
+
+
+class PubSubBackend(abc.ABC):
+    """Publish/subscribe transport for emit frames"""
+
+    name = 'base'
+
+    @abc.abstractmethod
+    def publish(self, message: Dict[str, Any]):
+        ...
+
+    @abc.abstractmethod
+    def subscribe(self, handler: Handler):
+        ...
+
+    def close(self):
+        pass
+
+
+class InProcessBackend(PubSubBackend):
+    """Delivers to subscribers on the same channel inside this process"""
+
+    name = 'inprocess'
+    _channels: Dict[str, List[Handler]] = {}
+    _channels_lock = threading.Lock()
+
+    def __init__(self, channel: str = 'default'):
+        self.channel = channel
+        self._handlers: List[Handler] = []
+
+    def publish(self, message: Dict[str, Any]):
+        with self._channels_lock:
+            handlers = list(self._channels.get(self.channel, ()))
+        for handler in handlers:
+            handler(message)
+
+    def subscribe(self, handler: Handler):
+        with self._channels_lock:
+            self._channels.setdefault(self.channel, []).append(handler)
+        self._handlers.append(handler)
+
+    def close(self):
+        with self._channels_lock:
+            subs = self._channels.get(self.channel, [])
+            for handler in self._handlers:
+                if handler in subs:
+                    subs.remove(handler)
+        self._handlers = []
+
+
+class UnixSocketBroker:
+    """Relays every line from one client to all other connected clients"""
+
+    def __init__(self, path: str = SOCKETIO_PUBSUB_PATH):
+        self.path = path
+        self._server: Optional[socket.socket] = None
+        self._clients: List[socket.socket] = []
+        self._lock = threading.Lock()
+
+    def bind(self):
+        """Bind the socket; raises OSError if a live broker already owns the path"""
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+                raise OSError(f"broker already running at {self.path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.path)  # stale socket file from a dead broker
+            finally:
+                probe.close()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(64)
+        self._server = server
+
+    def serve_forever(self):
+        if self._server is None:
+            self.bind()
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return  # closed
+            with self._lock:
+                self._clients.append(conn)
+            threading.Thread(target=self._relay, args=(conn,), daemon=True).start()
+
+    def start(self) -> 'UnixSocketBroker':
+        if self._server is None:
+            self.bind()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        if self._server is not None:
+            _shutdown(self._server)
+            self._server = None
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for conn in clients:
+            _shutdown(conn)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _relay(self, conn: socket.socket):
+        reader = conn.makefile('rb')
+        try:
+            for line in reader:
+                with self._lock:
+                    targets = [c for c in self._clients if c is not conn]
+                for target in targets:
+                    try:
+                        target.sendall(line)
+                    except OSError:
+                        self._drop(target)
+        except OSError:
+            pass
+        finally:
+            self._drop(conn)
+
+    def _drop(self, conn: socket.socket):
+        with self._lock:
+            if conn in self._clients:
+                self._clients.remove(conn)
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+
+class UnixSocketBackend(PubSubBackend):
+    """Client of a UnixSocketBroker; optionally starts the broker itself"""
+
+    name = 'unix'
+
+    def __init__(self, path: str = SOCKETIO_PUBSUB_PATH, autostart: bool = SOCKETIO_PUBSUB_AUTOSTART,
+                 reconnect_max_ms: int = SOCKETIO_PUBSUB_RECONNECT_MAX_MS):
+        self.path = path
+        self.autostart = autostart
+        self.reconnect_max_ms = reconnect_max_ms
+        self.broker: Optional[UnixSocketBroker] = None
+        self._handlers: List[Handler] = []
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._sock = self._connect(autostart)
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def publish(self, message: Dict[str, Any]):
+        line = (json.dumps(message, default=str, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._send_lock:
+            self._sock.sendall(line)
+
+    def subscribe(self, handler: Handler):
+        self._handlers.append(handler)
+
+    def close(self):
+        self._closed = True
+        _shutdown(self._sock)
+        if self.broker is not None:
+            self.broker.close()
+
+    def _connect(self, autostart: bool) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            return sock
+        except (ConnectionRefusedError, FileNotFoundError):
+            if not autostart:
+                sock.close()
+                raise
+        # No broker yet: become it (another worker may win the race, so retry connect)
+        try:
+            self.broker = UnixSocketBroker(self.path).start()
+        except OSError:
+            pass
+        sock.close()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock
+
+    def _read_loop(self):
+        while True:
+            sock = self._sock
+            error = 'broker closed the connection'
+            try:
+                for line in sock.makefile('rb'):
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        continue
+                    for handler in list(self._handlers):
+                        handler(message)
+            except OSError as e:
+                error = str(e)
+            if self._closed:
+                return
+            print(f"⚠️  Socket.IO pub/sub disconnected from {self.path}: {error}; reconnecting")
+            _metric('socket.pubsub.disconnects')
+            if not self._reconnect():
+                return
+
+    def _reconnect(self) -> bool:
+        """Reconnect with exponential backoff (becoming the broker if autostart); False once closed"""
+        delay = 0.05
+        while not self._closed:
+            time.sleep(delay)
+            try:
+                sock = self._connect(self.autostart)
+            except OSError:
+                delay = min(delay * 2, max(self.reconnect_max_ms, 50) / 1000.0)
+                continue
+            with self._send_lock:
+                old, self._sock = self._sock, sock
+            _shutdown(old)
+            role = ' as broker' if self.broker is not None and self.broker._server is not None else ''
+            print(f"✅ Socket.IO pub/sub reconnected to {self.path}{role}")
+            _metric('socket.pubsub.reconnects')
+            return True
+        return False
+
+
+def create_backend(kind: str = SOCKETIO_PUBSUB) -> PubSubBackend:
+    if kind == 'unix':
+        return UnixSocketBackend()
+    if kind == 'inprocess':
+        return InProcessBackend()
+    raise ValueError(f"Unknown SOCKETIO_PUBSUB backend: {kind}")
+
+
+class ClusterEmitter:
+    """
+    Drop-in for socketio.emit(event, data, room=...) that also reaches clients
+    on other workers. Remote frames are queued by the backend thread and
+    re-emitted from a socketio background task (drain()).
+
+    Frames are published as given; `prepare` runs on each worker right before
+    its own local delivery, so per-connection state such as sync sequence
+    numbers comes from the worker that owns the socket.
+    """
+
+    def __init__(self, socketio, backend: PubSubBackend, poll_ms: int = SOCKETIO_PUBSUB_POLL_MS, local=None,
+                 prepare: Optional[Prepare] = None):
+        self.socketio = socketio
+        # Local delivery target (anything with emit(event, data, room=...))
+        self.local = local or socketio
+        self.prepare = prepare
+        self.backend = backend
+        self.poll_ms = poll_ms
+        self.origin = uuid.uuid4().hex
+        self._inbox: deque = deque()
+        self._started = False
+        backend.subscribe(self._on_message)
+
+    def emit(self, event: str, data: Any, room: Optional[str] = None):
+        self._deliver(event, data, room)
+        try:
+            self.backend.publish({'origin': self.origin, 'event': event, 'data': data, 'room': room})
+            _metric('socket.pubsub.published')
+        except Exception as e:
+            _metric('socket.pubsub.publish_errors')
+            print(f"Error publishing socket event {event}: {e}")
+
+    def drain(self) -> int:
+        """Emit queued remote frames to local clients; returns how many"""
+        count = 0
+        while self._inbox:
+            message = self._inbox.popleft()
+            self._deliver(message['event'], message.get('data'), message.get('room'))
+            count += 1
+        if count:
+            _metric('socket.pubsub.received', count)
+        return count
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+
+        def _loop():
+            interval = self.poll_ms / 1000.0
+            while True:
+                self.socketio.sleep(interval)
+                try:
+                    self.drain()
+                except Exception as e:
+                    print(f"Error delivering remote socket events: {e}")
+
+        self.socketio.start_background_task(_loop)
+
+    def _deliver(self, event: str, data: Any, room: Optional[str]):
+        if self.prepare is not None:
+            data = self.prepare(event, data, room)
+        self.local.emit(event, data, room=room)
+
+    def _on_message(self, message: Dict[str, Any]):
+        if message.get('origin') != self.origin:
+            self._inbox.append(message)
+
+
+def init_cluster_emitter(socketio, local=None, prepare: Optional[Prepare] = None) -> ClusterEmitter:
+    """Create the process-wide emitter for the configured backend"""
+    emitter = ClusterEmitter(socketio, create_backend(), local=local, prepare=prepare)
+    emitter.start()
+    print(f"✅ Socket.IO pub/sub backend: {emitter.backend.name}")
+    return emitter
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'broker':
+        path = sys.argv[2] if len(sys.argv) > 2 else SOCKETIO_PUBSUB_PATH
+        broker = UnixSocketBroker(path)
+        broker.bind()
+        print(f"Socket.IO pub/sub broker listening on {path}")
+        try:
+            broker.serve_forever()
+        except KeyboardInterrupt:
+            broker.close()
+    else:
+        print("usage: python socket_pubsub.py broker [path]")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Socket.IO Delta Sync
+Every event delivered to a user room gets a per-user, monotonically increasing
+sequence number and is kept in a bounded per-user log. Numbering happens on
+the worker that delivers the frame to its own clients (stamp_frame, called by
+socket_pubsub.ClusterEmitter after the cross-worker fan-out), so a socket only
+ever sees one worker's contiguous sequence; its seq/epoch pair is meaningless
+on another worker, and reconnecting to a different worker gets a full resync. After a reconnect the
+client calls sync(since=<last seq>) and only the missed events are replayed;
+if the gap is older than the log (or the server restarted) the client is told
+to do a full resync via /api/notifications and /api/activity instead.
+
+Client protocol:
+    'connected'  -> {..., 'seq': latest, 'epoch': EPOCH}
+    emit('sync', {'since': seq, 'epoch': epoch}, ack)
+        ack <- {'resync': bool, 'seq': latest, 'epoch': EPOCH,
+                'events': [{'seq': n, 'event': name, 'data': payload}, ...]}
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, Optional
+
+import metrics
+from socket_batching import BATCH_EVENT
+
+SYNC_LOG_SIZE = int(os.getenv('SOCKET_SYNC_LOG_SIZE', '200'))
+SYNC_MAX_USERS = int(os.getenv('SOCKET_SYNC_MAX_USERS', '5000'))
+
+# Changes on every process start, so clients can tell their seq is from a previous run
+EPOCH = uuid.uuid4().hex[:12]
+
+
+class UserEventLog:
+    """Bounded per-user event logs keyed by sequence number"""
+
+    def __init__(self, size: int = SYNC_LOG_SIZE, max_users: int = SYNC_MAX_USERS):
+        self.size = size
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._seq: Dict[str, int] = {}
+        self._logs: Dict[str, deque] = {}
+        self._touched: Dict[str, float] = {}
+
+    def record(self, user_id: str, event: str, payload: Any) -> int:
+        """Append an event and return its sequence number"""
+        with self._lock:
+            seq = self._seq.get(user_id, 0) + 1
+            self._seq[user_id] = seq
+            log = self._logs.get(user_id)
+            if log is None:
+                log = self._logs[user_id] = deque(maxlen=self.size)
+            log.append((seq, event, payload))
+            self._touched[user_id] = time.time()
+            if len(self._logs) > self.max_users:
+                self._evict_locked()
+        return seq
+
+    def latest(self, user_id: str) -> int:
+        with self._lock:
+            return self._seq.get(user_id, 0)
+
+    def since(self, user_id: str, since: int, epoch: Optional[str] = None) -> Dict[str, Any]:
+        """Events after `since`, or resync=True when they can't be replayed exactly"""
+        metrics.incr('socket.sync.requests')
+        with self._lock:
+            latest = self._seq.get(user_id, 0)
+            log = list(self._logs.get(user_id) or ())
+        oldest = log[0][0] if log else latest + 1
+        resync = (
+            (epoch is not None and epoch != EPOCH)
+            or since > latest
+            or since < oldest - 1
+        )
+        if resync:
+            metrics.incr('socket.sync.full_resyncs')
+            return {'resync': True, 'seq': latest, 'epoch': EPOCH, 'events': []}
+        events = [{'seq': s, 'event': e, 'data': d} for s, e, d in log if s > since]
+        metrics.incr('socket.sync.replayed_events', len(events))
+        return {'resync': False, 'seq': latest, 'epoch': EPOCH, 'events': events}
+
+    def _evict_locked(self):
+        # Drop the least recently active users; they fall back to a full resync
+        for user_id, _ in sorted(self._touched.items(), key=lambda kv: kv[1])[:max(1, self.max_users // 10)]:
+            self._logs.pop(user_id, None)
+            self._touched.pop(user_id, None)
+            # Keep _seq so numbering stays monotonic for the user
+
+
+event_log = UserEventLog()
+
+
+def stamp(user_id: str, event: str, payload: Any) -> Any:
+    """
+    Record an outgoing user-room event; returns the payload to send (with _seq).
+    Only dict payloads can carry _seq, so other payloads are not numbered (a
+    number the client never sees would look like a gap).
+    """
+    if not isinstance(payload, dict):
+        return payload
+    seq = event_log.record(user_id, event, payload)
+    return {**payload, '_seq': seq}
+
+
+def stamp_frame(event: str, data: Any, room: Optional[str]) -> Any:
+    """
+    ClusterEmitter prepare hook: stamp a frame for this worker's clients.
+    Only user rooms ('user:<id>') are sequenced; batch frames get every
+    inner event stamped.
+    """
+    if not room or not room.startswith('user:'):
+        return data
+    user_id = room[len('user:'):]
+    if event == BATCH_EVENT and isinstance(data, dict):
+        return {**data, 'events': [{'event': e['event'], 'data': stamp(user_id, e['event'], e['data'])}
+                                   for e in data.get('events') or []]}
+    return stamp(user_id, event, data)
+
+
+def register_sync_events(socketio, get_user_id):
+    """Register the 'sync' socket handler; get_user_id() resolves the caller"""
+
+    @socketio.on('sync')
+    def on_sync(data=None):
+        data = data or {}
+        try:
+            since = int(data.get('since') or 0)
+        except (TypeError, ValueError):
+            since = 0
+        return event_log.since(get_user_id(), since, data.get('epoch'))
+
+    print("✅ Socket sync handler registered")
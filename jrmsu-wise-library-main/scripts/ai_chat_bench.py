@@ -0,0 +1,277 @@
+"""
+ai_chat_bench.py
+Latency benchmark of the AI chat path under concurrency. Virtual users replay
+conversation traces (hours and borrowing questions, book searches, follow-ups
+that lean on earlier turns) against /ai/chat and /ai/chat/stream, each
+keeping its own history, and the script reports per concurrency level:
+p50/p95/p99 latency, time to first token, throughput and how the replies were
+produced (intent, cache, model).
+
+By default nothing external is needed: it starts scripts/ollama_stub.py on a
+free port, imports the backend in-process with OLLAMA_URL pointing at it and
+calls the endpoints through Flask's test client (traces send their history
+with each message, so no MySQL session tables are touched). --url drives a
+running backend over HTTP instead; start that one with OLLAMA_URL at a stub
+or a real Ollama. The response cache is cleared before each level.
+
+Usage: python scripts/ai_chat_bench.py [--concurrency 1,4,8] [--users 16] [--endpoint chat|stream|both]
+       [--no-cache] [--think-ms 0] [--url http://localhost:5000] [--json results.json] [stub options]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'python-backend'))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import ollama_stub  # noqa: E402
+
+TRACES = [
+    ["What time does the library close today?",
+     "Can you recommend a good introduction to marine biology for a first-year student?",
+     "Is that one available right now?",
+     "How do I reserve a book?"],
+    ["Do you have anything on calculus that explains limits with lots of worked examples?",
+     "What about something shorter, like a review guide?",
+     "How long can I keep a book if I take it outside the campus?"],
+    ["I need sources for a research paper on climate change in the Philippines.",
+     "Which of those are journals and which are books?",
+     "Can you summarize what each one covers?",
+     "Thanks! What are the borrowing rules for theses?"],
+    ["Are you open on Saturday?",
+     "Recommend some Filipino novels for a literature class.",
+     "Tell me more about the second one."],
+    ["What happens if I return a book one day late?",
+     "Is there a grace period for students with a medical excuse?",
+     "Where do I pay overdue fines?"],
+    ["I'm looking for books on data structures and algorithms in Python.",
+     "Which one is best for a beginner?",
+     "Is there an e-book version of it?",
+     "Summarize what we talked about so far in two sentences."],
+]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))]
+
+
+def _source(data):
+    if data.get('intent'):
+        return 'intent'
+    if data.get('cached'):
+        return 'cache'
+    return 'model'
+
+
+class InProcessClient:
+    """Calls the endpoints through the Flask test client; one REMOTE_ADDR per virtual user"""
+
+    def __init__(self, app, response_cache):
+        self.app = app
+        self.response_cache = response_cache
+
+    def reset(self):
+        self.response_cache.invalidate('')
+
+    def chat(self, user, body):
+        client = self.app.test_client()
+        environ = {'REMOTE_ADDR': f"10.0.{user // 250}.{user % 250 + 1}"}
+        start = time.perf_counter()
+        resp = client.post('/ai/chat', json=body, environ_base=environ)
+        latency = (time.perf_counter() - start) * 1000.0
+        data = resp.get_json(silent=True) or {}
+        return resp.status_code, data, latency, latency
+
+    def stream(self, user, body):
+        client = self.app.test_client()
+        environ = {'REMOTE_ADDR': f"10.0.{user // 250}.{user % 250 + 1}"}
+        start = time.perf_counter()
+        resp = client.post('/ai/chat/stream', json=body, environ_base=environ, buffered=False)
+        return _read_sse(resp.status_code, resp.response, start)
+
+
+class HttpClient:
+    """Calls a running backend; X-User-Id keeps the virtual users apart in the scheduler"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def reset(self):
+        self.session.post(f"{self.base_url}/api/admin/ai-cache/invalidate", json={}, timeout=10)
+
+    def chat(self, user, body):
+        start = time.perf_counter()
+        resp = self.session.post(f"{self.base_url}/ai/chat", json=body,
+                                 headers={'X-User-Id': f"bench-{user}"}, timeout=120)
+        latency = (time.perf_counter() - start) * 1000.0
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {}
+        return resp.status_code, data, latency, latency
+
+    def stream(self, user, body):
+        start = time.perf_counter()
+        resp = self.session.post(f"{self.base_url}/ai/chat/stream", json=body,
+                                 headers={'X-User-Id': f"bench-{user}"}, stream=True, timeout=120)
+        try:
+            return _read_sse(resp.status_code, resp.iter_content(chunk_size=None), start)
+        finally:
+            resp.close()
+
+
+def _read_sse(status, chunks, start):
+    """(status, done/error payload, total ms, first token ms) of an SSE response"""
+    ttft, data, buffer = None, {}, b''
+    for chunk in chunks:
+        buffer += chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+        while b'\n\n' in buffer:
+            frame, buffer = buffer.split(b'\n\n', 1)
+            lines = dict(line.split(': ', 1) for line in frame.decode('utf-8').split('\n') if ': ' in line)
+            event = lines.get('event')
+            if event == 'token' and ttft is None:
+                ttft = (time.perf_counter() - start) * 1000.0
+            elif event in ('done', 'error'):
+                data = json.loads(lines.get('data') or '{}')
+                if event == 'error':
+                    status = 503 if data.get('fallback') else 500
+    latency = (time.perf_counter() - start) * 1000.0
+    return status, data, latency, ttft if ttft is not None else latency
+
+
+def run_level(client, endpoint, concurrency, users, think_ms, seed):
+    """Replay one trace per virtual user, `concurrency` users at a time"""
+    samples, lock = [], threading.Lock()
+    rng = random.Random(seed)
+    plans = [(u, TRACES[(u + seed) % len(TRACES)], rng.random()) for u in range(users)]
+
+    def virtual_user(plan):
+        user, trace, jitter = plan
+        history = []
+        for message in trace:
+            body = {'message': message, 'history': list(history)}
+            call = client.stream if endpoint == 'stream' else client.chat
+            status, data, latency, ttft = call(user, body)
+            ok = status == 200 and bool(data.get('content'))
+            with lock:
+                samples.append({'ok': ok, 'status': status, 'latencyMs': latency, 'ttftMs': ttft,
+                                'source': _source(data) if ok else 'error',
+                                'chars': len(data.get('content') or '')})
+            if not ok:
+                return
+            history += [{'role': 'user', 'content': message}, {'role': 'assistant', 'content': data['content']}]
+            if think_ms:
+                time.sleep(think_ms * (0.5 + jitter) / 1000.0)
+
+    client.reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(virtual_user, plans))
+    elapsed = time.perf_counter() - start
+    return summarize(endpoint, concurrency, samples, elapsed)
+
+
+def summarize(endpoint, concurrency, samples, elapsed):
+    ok = [s for s in samples if s['ok']]
+    model = [s for s in ok if s['source'] == 'model']
+
+    def pcts(values):
+        return {f"p{p}": round(percentile(values, p), 1) if values else None for p in (50, 95, 99)}
+
+    sources = {}
+    for s in samples:
+        sources[s['source']] = sources.get(s['source'], 0) + 1
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'sources': sources,
+        'latencyMs': pcts([s['latencyMs'] for s in ok]),
+        'modelLatencyMs': pcts([s['latencyMs'] for s in model]),
+        'ttftMs': pcts([s['ttftMs'] for s in model]),
+        'throughputRps': round(len(ok) / elapsed, 2) if elapsed else None,
+        'tokensPerSecond': round(sum(s['chars'] // 4 + 1 for s in model) / elapsed, 1) if elapsed else None,
+        'elapsedSeconds': round(elapsed, 2),
+    }
+
+
+def print_table(results):
+    print(f"\n{'endpoint':<8} {'conc':>4} {'reqs':>5} {'err':>4} {'rps':>6} {'tok/s':>7} "
+          f"{'p50':>8} {'p95':>8} {'p99':>8} {'ttft50':>8} {'ttft95':>8} {'ttft99':>8}  sources")
+    for r in results:
+        lat, ttft = r['modelLatencyMs'], r['ttftMs']
+
+        def ms(v):
+            return '-' if v is None else f"{v:.0f}"
+        print(f"{r['endpoint']:<8} {r['concurrency']:>4} {r['requests']:>5} {r['errors']:>4} "
+              f"{r['throughputRps'] or 0:>6.2f} {r['tokensPerSecond'] or 0:>7.1f} "
+              f"{ms(lat['p50']):>8} {ms(lat['p95']):>8} {ms(lat['p99']):>8} "
+              f"{ms(ttft['p50']):>8} {ms(ttft['p95']):>8} {ms(ttft['p99']):>8}  "
+              + ', '.join(f"{k}={v}" for k, v in sorted(r['sources'].items())))
+    print("latency and ttft columns cover model-generated replies (ms); rps counts every successful reply")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', default='1,4,8', help='comma-separated levels')
+    parser.add_argument('--users', type=int, default=16, help='virtual users (one trace each) per level')
+    parser.add_argument('--endpoint', choices=['chat', 'stream', 'both'], default='both')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='average pause between a user\'s messages')
+    parser.add_argument('--no-cache', action='store_true', help='disable the response cache (AI_CACHE_MAX=0)')
+    parser.add_argument('--url', help='benchmark a running backend instead of the in-process app')
+    parser.add_argument('--ollama-url', help='in-process app against this Ollama instead of a stub')
+    parser.add_argument('--json', help='also write the results to this file')
+    ollama_stub.add_stub_arguments(parser)
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+
+    if args.url:
+        client = HttpClient(args.url)
+        target = args.url
+    else:
+        if args.ollama_url:
+            os.environ['OLLAMA_URL'] = args.ollama_url
+        else:
+            server = ollama_stub.serve(ollama_stub.stub_from_args(args), port=0)
+            os.environ['OLLAMA_URL'] = f"http://127.0.0.1:{server.server_port}"
+        # ollama_client was already imported by the stub; point it at the chosen server before the app loads
+        import ollama_client
+        ollama_client.OLLAMA_URL = os.environ['OLLAMA_URL']
+        os.environ.setdefault('AI_MAX_CONCURRENCY', str(args.parallel))
+        os.environ.setdefault('AI_CACHE_PERSIST', 'false')
+        if args.no_cache:
+            os.environ['AI_CACHE_MAX'] = '0'
+        import app as backend
+        from ai_response_cache import response_cache
+        client = InProcessClient(backend.app, response_cache)
+        target = f"in-process app, Ollama at {os.environ['OLLAMA_URL']}"
+
+    print(f"\nBenchmarking {target}: levels {levels}, {args.users} users per level")
+    endpoints = ['chat', 'stream'] if args.endpoint == 'both' else [args.endpoint]
+    results = []
+    for endpoint in endpoints:
+        for level in levels:
+            results.append(run_level(client, endpoint, level, args.users, args.think_ms, args.seed or 0))
+            print(f"  {endpoint} x{level}: {results[-1]['requests']} requests in {results[-1]['elapsedSeconds']}s")
+    print_table(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps({'target': target, 'args': vars(args), 'results': results}, indent=2))
+        print(f"results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+ai_context_bench.py
+Prompt evaluation per turn of a long chat session, for the old prompt layout
+(history window sliding by one turn, retrieval snippets inside the system
+prompt) and the reuse-friendly one (pinned window, snippets before the new
+message; see python-backend/ai_session_context.py).
+
+Offline it estimates how many prompt tokens Ollama must evaluate each turn:
+everything after the longest common prefix with the previous prompt plus its
+reply, which is what the runner still has in its KV cache. With --ollama it
+runs the same conversation against OLLAMA_URL and reports the measured
+prompt_eval_count / prompt_eval_duration instead.
+
+Usage: python scripts/ai_context_bench.py [--turns 24] [--ollama]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'python-backend'))
+
+import ollama_client  # noqa: E402
+from ai_memory import ConversationMemory  # noqa: E402
+from ai_retrieval import with_context  # noqa: E402
+from ai_session_context import SessionContextCache  # noqa: E402
+from ollama_client import SYSTEM_PROMPT, estimate_tokens  # noqa: E402
+
+QUESTIONS = [
+    "Can you recommend a good introduction to marine biology for a first-year student?",
+    "Is the second volume of Philippine History available right now, or should I reserve it?",
+    "How long can I keep a book if I take it outside the campus?",
+    "What happens if I return a book one day late?",
+    "Do you have anything on calculus that explains limits with lots of worked examples?",
+    "Summarize what we talked about so far in two sentences.",
+]
+SNIPPET = ("Library catalog and policy excerpts (use them when relevant):\n"
+           "- Book {n}: Marine Biology Volume {n} by Author {n}. Category: Marine Biology. Available: 2 of 3.\n"
+           "- Policy: Books taken outside the campus are due the next day at 4:00 PM.")
+REPLY = ("Sure! Here is what I found for you. " + "The library has several titles that match your request, "
+         "and I can help you reserve one if it is currently borrowed. " * 6).strip()
+
+
+def sync_spawn(fn, *args):
+    fn(*args)
+
+
+def old_layout(messages, context):
+    """Snippets appended to the system prompt (the previous ai_retrieval.augment)"""
+    return [{**messages[0], 'content': f"{messages[0]['content']}\n\n{context}"}] + messages[1:]
+
+
+def reevaluated(prompt, cached):
+    """Tokens after the longest common message prefix of prompt and cached"""
+    same = 0
+    for a, b in zip(prompt, cached):
+        if a != b:
+            break
+        same += 1
+    return sum(estimate_tokens(m['content']) + 4 for m in prompt[same:])
+
+
+def run(label, memory, layout, turns, reply_fn):
+    history, cached, rows = [], [], []
+    for n in range(turns):
+        question = QUESTIONS[n % len(QUESTIONS)]
+        messages = [{'role': 'system', 'content': SYSTEM_PROMPT}] + history + [{'role': 'user', 'content': question}]
+        prompt = layout(memory.fit('bench-session', messages), SNIPPET.format(n=n))
+        reply, evaluated, ms = reply_fn(prompt, cached)
+        rows.append((sum(estimate_tokens(m['content']) + 4 for m in prompt), evaluated, ms))
+        cached = prompt + [{'role': 'assistant', 'content': reply}]
+        history += [{'role': 'user', 'content': question}, {'role': 'assistant', 'content': reply}]
+    print(f"\n{label}")
+    print(f"{'turn':>4} {'prompt':>8} {'evaluated':>10} {'ms':>8}")
+    for n, (total, evaluated, ms) in enumerate(rows, 1):
+        print(f"{n:>4} {total:>8} {evaluated:>10} {'' if ms is None else f'{ms:8.1f}':>8}")
+    late = rows[len(rows) // 2:]
+    avg = sum(r[1] for r in late) / len(late)
+    print(f"avg evaluated tokens/turn (second half): {avg:.0f}")
+    return avg
+
+
+def offline_reply(prompt, cached):
+    return REPLY, reevaluated(prompt, cached), None
+
+
+def ollama_reply(prompt, cached):
+    start = time.perf_counter()
+    r = ollama_client.session().post(f"{ollama_client.OLLAMA_URL}/api/chat",
+                                     json=ollama_client._chat_payload(prompt, False), timeout=ollama_client.OLLAMA_TIMEOUT)
+    r.raise_for_status()
+    data = r.json()
+    ms = (data.get('prompt_eval_duration') or 0) / 1e6 or (time.perf_counter() - start) * 1000.0
+    return (data.get('message') or {}).get('content', ''), data.get('prompt_eval_count', 0), ms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=24)
+    parser.add_argument('--ollama', action='store_true', help='measure against the Ollama server')
+    args = parser.parse_args()
+    reply_fn = ollama_reply if args.ollama else offline_reply
+
+    def summarize(previous, turns):
+        return f"{previous} The user asked {len(turns) // 2} more questions about books and borrowing.".strip()
+
+    old = ConversationMemory(summarize=summarize, spawn=sync_spawn, persist=False)
+    new = ConversationMemory(summarize=summarize, spawn=sync_spawn, persist=False, session_contexts=SessionContextCache())
+    before = run('sliding window, snippets in system prompt', old, old_layout, args.turns, reply_fn)
+    after = run('pinned window, snippets before the message', new, with_context, args.turns, reply_fn)
+    print(f"\nprompt evaluation per turn: {before:.0f} -> {after:.0f} ({before / max(after, 1):.1f}x less)")
+
+
+if __name__ == '__main__':
+    main()
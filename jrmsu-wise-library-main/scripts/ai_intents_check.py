@@ -0,0 +1,67 @@
+"""
+ai_intents_check.py
+Checks which messages the intent fast-path claims: questions about the
+library itself go to their intent, while look-alikes (a semester that opens,
+a book about opening a business, booking a study room) and open-ended or
+compound questions reach the LLM.
+No database is needed; only the classifier runs.
+
+Usage: python scripts/ai_intents_check.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'python-backend'))
+
+from ai_intents import classify  # noqa: E402
+
+CASES = [
+    ("What time does the library close today?", 'library_hours'),
+    ("When does the library open?", 'library_hours'),
+    ("Are you open on Saturday?", 'library_hours'),
+    ("What are your opening hours?", 'library_hours'),
+    ("library hours", 'library_hours'),
+    ("Is the library closed tomorrow?", 'library_hours'),
+    ("Closing time?", 'library_hours'),
+    ("What are the borrowing rules?", 'borrowing_rules'),
+    ("When are books due?", 'borrowing_rules'),
+    ("How long can I keep a book?", 'borrowing_rules'),
+    ("How do I reserve a book?", 'how_to_reserve'),
+    ("What books do I have borrowed?", 'my_borrowed'),
+    ("When is my book due?", 'my_borrowed'),
+    ("Is my loan due tomorrow?", 'my_borrowed'),
+    ("Show my reservations", 'my_reservations'),
+    ("How can I make a reservation?", 'how_to_reserve'),
+    ("What time does the library open and close?", 'library_hours'),
+    ("Is the library open right now?", 'library_hours'),
+    # Look-alikes that must reach the LLM
+    ("Can you recommend books on opening a business today", None),
+    ("when does the new semester open", None),
+    ("What time does the enrollment office close?", None),
+    ("Thanks for your time", None),
+    ("Is there a book about store opening hours and retail?", None),
+    ("Recommend some Filipino novels for a literature class.", None),
+    ("How do I book a study room?", None),
+    ("Are you open to suggestions for new books?", None),
+    ("What is the borrowing limit and recommend three books about AI", None),
+    ("When are books due? Any good thrillers?", None),
+]
+
+
+def main():
+    failures = 0
+    for message, expected in CASES:
+        match = classify(message)
+        got = match[0] if match else None
+        if got != expected:
+            failures += 1
+            print(f"FAIL {message!r}: expected {expected}, got {got}")
+    print(f"{len(CASES) - failures}/{len(CASES)} cases passed")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
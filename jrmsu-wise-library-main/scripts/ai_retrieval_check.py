@@ -0,0 +1,69 @@
+"""
+ai_retrieval_check.py
+Builds the retrieval index over a synthetic catalog with the deterministic
+hashing embedder, checks that incremental syncs only re-embed what changed
+and that a reloaded (memory-mapped) index returns the expected books, then
+reports search latency.
+
+Usage: python scripts/ai_retrieval_check.py [books]
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'python-backend'))
+
+from ai_retrieval import HashingEmbedder, VectorIndex, book_docs, policy_docs  # noqa: E402
+
+SUBJECTS = ['Algorithms', 'Physics', 'Philippine History', 'Accounting', 'Marine Biology',
+            'Criminology', 'Nursing', 'Calculus', 'Literature', 'Agriculture']
+
+
+def catalog(n):
+    return [{
+        'id': f'B{i:05d}',
+        'title': f'{SUBJECTS[i % len(SUBJECTS)]} Volume {i}',
+        'author': f'Author {i % 97}',
+        'category': SUBJECTS[i % len(SUBJECTS)],
+        'copies': 3,
+        'available': i % 4,
+    } for i in range(n)]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    books = catalog(n)
+    with tempfile.TemporaryDirectory() as path:
+        index = VectorIndex(path, HashingEmbedder())
+        start = time.perf_counter()
+        index.sync(policy_docs(), 'policy:')
+        first = index.sync(book_docs(books), 'book:')
+        print(f"initial build: {first} in {time.perf_counter() - start:.2f}s")
+        assert first['embedded'] == n
+
+        books[1]['available'] = 0
+        changed = index.sync(book_docs(books[:-1]), 'book:')
+        print(f"incremental sync: {changed}")
+        assert changed == {'embedded': 1, 'removed': 1, 'total': n - 1 + len(policy_docs())}
+
+        reloaded = VectorIndex(path, HashingEmbedder())
+        assert reloaded.load() == len(index)
+        assert reloaded.stats()['mmapped']
+        hits = reloaded.search('Marine Biology Volume 4')
+        assert hits and hits[0]['id'] == 'book:B00004', hits
+        assert not reloaded.search('xylophone quantum zebra')
+
+        queries = ['books about calculus', 'philippine history', 'how do I reserve a book', 'nursing volume 17']
+        start = time.perf_counter()
+        rounds = 200
+        for i in range(rounds):
+            reloaded.search(queries[i % len(queries)])
+        per_query = (time.perf_counter() - start) * 1000.0 / rounds
+        print(f"search over {len(reloaded)} docs: {per_query:.2f} ms/query")
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+"""
+ollama_stub.py
+Ollama-compatible stand-in for load tests and CI, where no GPU box with the
+real model is available. Speaks the parts of the API the backend uses:
+
+    POST /api/chat       streamed NDJSON (stream=true) or one JSON reply
+    POST /api/generate   model load/unload (no prompt) or a generated reply
+    POST /api/embed      hashing-trick vectors (ai_retrieval.HashingEmbedder)
+    GET  /api/tags, /api/ps, /api/version
+    GET  /stub/stats     requests, cancellations, cold starts, tokens
+
+Timing follows a simple model of the real runner:
+- --parallel slots (OLLAMA_NUM_PARALLEL); extra requests wait for one
+- a cold model (first request, or keep_alive expired) adds --load-ms
+- each slot keeps its last prompt; only the messages after the longest
+  common prefix are evaluated, at --prompt-rate tokens/s
+- the first token follows --first-token-ms, the rest come at --token-rate
+  tokens/s, up to options.num_predict (default --reply-tokens)
+- --jitter scales every delay by a random factor in [1-j, 1+j]
+Closing the connection mid-stream stops generation, like Ollama.
+
+Usage: python scripts/ollama_stub.py [--port 11434] [--token-rate 40] [--first-token-ms 150] [--parallel 1]
+Then start the backend with OLLAMA_URL=http://localhost:<port>.
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'python-backend'))
+
+from ollama_client import MODEL_NAME, estimate_tokens  # noqa: E402
+
+WORDS = ("the library has several titles on this topic and you can borrow up to three books at a time "
+         "please check the catalog for availability or ask me to reserve a copy for you the reading room "
+         "is open until five in the afternoon and overdue books are charged a small daily fine").split()
+
+
+def keep_alive_seconds(value) -> float:
+    """Ollama keep_alive ('30m', '1h', '90s', '0', seconds, negative = forever) in seconds"""
+    if value is None or value == '':
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float('inf') if value < 0 else float(value)
+    match = re.fullmatch(r'(-?\d+(?:\.\d+)?)(ms|s|m|h)?', str(value).strip())
+    if not match:
+        return 300.0
+    amount = float(match.group(1))
+    if amount < 0:
+        return float('inf')
+    return amount * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, None: 1}[match.group(2)]
+
+
+def _common_prefix(prompt, cached) -> int:
+    same = 0
+    for a, b in zip(prompt, cached):
+        if a != b:
+            break
+        same += 1
+    return same
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class OllamaStub:
+    """Shared model state: slots with their cached prompt, load state and counters"""
+
+    def __init__(self, token_rate=40.0, first_token_ms=150.0, prompt_rate=800.0, load_ms=0.0,
+                 reply_tokens=120, parallel=1, jitter=0.1, seed=None, model=MODEL_NAME):
+        self.token_rate = token_rate
+        self.first_token_ms = first_token_ms
+        self.prompt_rate = prompt_rate
+        self.load_ms = load_ms
+        self.reply_tokens = reply_tokens
+        self.jitter = jitter
+        self.model = model
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(parallel)
+        self._cached = [[] for _ in range(parallel)]  # last prompt per slot
+        self._free = list(range(parallel))
+        self._loaded_until = 0.0
+        self.stats = {'requests': 0, 'completed': 0, 'cancelled': 0, 'coldStarts': 0,
+                      'promptTokens': 0, 'evaluatedTokens': 0, 'replyTokens': 0, 'maxWaiting': 0}
+        self._waiting = 0
+
+    def _delay(self, ms: float) -> float:
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter) if self.jitter else 1
+        return max(0.0, ms * factor) / 1000.0
+
+    def load(self, keep_alive) -> float:
+        """Make the model resident for keep_alive; returns the load time in ms (0 when warm)"""
+        with self._lock:
+            cold = time.time() >= self._loaded_until
+            if cold:
+                self.stats['coldStarts'] += 1
+                self._cached = [[] for _ in self._cached]
+        load_ms = 0.0
+        if cold and self.load_ms:
+            load_ms = self._delay(self.load_ms) * 1000.0
+            time.sleep(load_ms / 1000.0)
+        with self._lock:
+            self._loaded_until = time.time() + keep_alive_seconds(keep_alive)
+        return load_ms
+
+    def unload(self):
+        with self._lock:
+            self._loaded_until = 0.0
+
+    def loaded(self) -> bool:
+        return time.time() < self._loaded_until
+
+    def expires_at(self) -> str:
+        until = self._loaded_until
+        if until == float('inf'):
+            return '2318-01-01T00:00:00Z'
+        return (datetime.now(timezone.utc) + timedelta(seconds=max(0.0, until - time.time()))).isoformat()
+
+    def generate(self, messages, options, keep_alive, field='message'):
+        """
+        Yields (delta, None) per token, then (None, final) with Ollama's
+        timing fields. Closing the generator early counts as a cancellation.
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+            self._waiting += 1
+            self.stats['maxWaiting'] = max(self.stats['maxWaiting'], self._waiting)
+        started = time.perf_counter()
+        prompt = [(m.get('role', ''), m.get('content', '')) for m in messages]
+        self._slots.acquire()
+        with self._lock:
+            self._waiting -= 1
+            # Like the runner, take the free slot whose cached prompt shares the longest prefix
+            same, slot = max((_common_prefix(prompt, self._cached[s]), s) for s in self._free)
+            self._free.remove(slot)
+        done = False
+        try:
+            if not self.loaded():
+                same = 0
+            load_ms = self.load(keep_alive)
+            prompt_tokens = sum(estimate_tokens(c) + 4 for _, c in prompt)
+            evaluated = sum(estimate_tokens(c) + 4 for _, c in prompt[same:])
+            eval_ms = self._delay(evaluated / self.prompt_rate * 1000.0) * 1000.0 if self.prompt_rate else 0.0
+            time.sleep(eval_ms / 1000.0 + self._delay(self.first_token_ms))
+
+            limit = int((options or {}).get('num_predict') or self.reply_tokens)
+            count = max(1, min(self.reply_tokens, limit if limit > 0 else self.reply_tokens))
+            seed = sum(map(ord, prompt[-1][1] if prompt else ''))
+            words = [WORDS[(seed + i * 7) % len(WORDS)] for i in range(count)]
+            gen_start = time.perf_counter()
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(self._delay(1000.0 / self.token_rate))
+                yield word.capitalize() if i == 0 else ' ' + word, None
+            yield '.', None
+            reply = ' '.join(words).capitalize() + '.'
+            with self._lock:
+                self._cached[slot] = prompt + [('assistant', reply)]
+                self.stats['completed'] += 1
+                self.stats['promptTokens'] += prompt_tokens
+                self.stats['evaluatedTokens'] += evaluated
+                self.stats['replyTokens'] += count
+            done = True
+            final = {
+                'model': self.model,
+                'created_at': _now(),
+                'done': True,
+                'done_reason': 'stop' if count < limit else 'length',
+                'total_duration': int((time.perf_counter() - started) * 1e9),
+                'load_duration': int(load_ms * 1e6),
+                'prompt_eval_count': evaluated,
+                'prompt_eval_duration': int(eval_ms * 1e6),
+                'eval_count': count,
+                'eval_duration': int((time.perf_counter() - gen_start) * 1e9),
+            }
+            final[field] = {'role': 'assistant', 'content': ''} if field == 'message' else ''
+            yield None, final
+        finally:
+            if not done:
+                with self._lock:
+                    self.stats['cancelled'] += 1
+                    self._cached[slot] = []
+            with self._lock:
+                self._free.append(slot)
+            self._slots.release()
+
+
+def make_handler(stub: OllamaStub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, data, status=200):
+            body = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                return json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                return None
+
+        def do_GET(self):
+            if self.path == '/api/tags':
+                self._json({'models': [{'name': stub.model, 'model': stub.model, 'size': 4920000000}]})
+            elif self.path == '/api/ps':
+                models = [{'name': stub.model, 'model': stub.model, 'expires_at': stub.expires_at()}] if stub.loaded() else []
+                self._json({'models': models})
+            elif self.path == '/api/version':
+                self._json({'version': '0.0.0-stub'})
+            elif self.path == '/stub/stats':
+                with stub._lock:
+                    self._json(dict(stub.stats))
+            else:
+                self._json({'error': 'not found'}, 404)
+
+        def do_POST(self):
+            body = self._body()
+            if body is None:
+                self._json({'error': 'invalid JSON'}, 400)
+                return
+            if self.path == '/api/embed':
+                self._embed(body)
+                return
+            if body.get('model') and body['model'] != stub.model:
+                self._json({'error': f"model '{body['model']}' not found"}, 404)
+                return
+            if self.path == '/api/chat':
+                self._reply(body, body.get('messages') or [], 'message')
+            elif self.path == '/api/generate':
+                if not body.get('prompt'):
+                    self._load(body)
+                else:
+                    self._reply(body, [{'role': 'user', 'content': body['prompt']}], 'response')
+            else:
+                self._json({'error': 'not found'}, 404)
+
+        def _embed(self, body):
+            from ai_retrieval import HashingEmbedder
+            texts = body.get('input') or []
+            texts = [texts] if isinstance(texts, str) else texts
+            self._json({'model': body.get('model'), 'embeddings': HashingEmbedder().embed(texts).tolist()})
+
+        def _load(self, body):
+            if keep_alive_seconds(body.get('keep_alive')) == 0:
+                stub.unload()
+                reason = 'unload'
+                load_ms = 0.0
+            else:
+                load_ms = stub.load(body.get('keep_alive'))
+                reason = 'load'
+            self._json({'model': stub.model, 'created_at': _now(), 'response': '', 'done': True,
+                        'done_reason': reason, 'load_duration': int(load_ms * 1e6)})
+
+        def _reply(self, body, messages, field):
+            tokens = stub.generate(messages, body.get('options'), body.get('keep_alive'), field)
+            if body.get('stream', True) is False:
+                parts, final = [], {}
+                for delta, last in tokens:
+                    if delta is not None:
+                        parts.append(delta)
+                    else:
+                        final = last
+                final[field] = {'role': 'assistant', 'content': ''.join(parts)} if field == 'message' else ''.join(parts)
+                self._json(final)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                for delta, final in tokens:
+                    chunk = final if final is not None else {
+                        'model': stub.model, 'created_at': _now(), 'done': False,
+                        field: {'role': 'assistant', 'content': delta} if field == 'message' else delta,
+                    }
+                    line = json.dumps(chunk).encode('utf-8') + b'\n'
+                    self.wfile.write(f'{len(line):x}\r\n'.encode('ascii') + line + b'\r\n')
+                    self.wfile.flush()
+                self.wfile.write(b'0\r\n\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+            finally:
+                tokens.close()
+
+    return Handler
+
+
+def serve(stub: OllamaStub, host: str = '127.0.0.1', port: int = 11434) -> ThreadingHTTPServer:
+    """Start the stub on a daemon thread; port 0 picks a free one (see server.server_port)"""
+    server = ThreadingHTTPServer((host, port), make_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--token-rate', type=float, default=40.0, help='generated tokens per second')
+    parser.add_argument('--first-token-ms', type=float, default=150.0, help='delay before the first token')
+    parser.add_argument('--prompt-rate', type=float, default=800.0, help='prompt tokens evaluated per second')
+    parser.add_argument('--load-ms', type=float, default=0.0, help='model load time on a cold start')
+    parser.add_argument('--reply-tokens', type=int, default=120, help='tokens per reply (capped by num_predict)')
+    parser.add_argument('--parallel', type=int, default=1, help='concurrent generations (OLLAMA_NUM_PARALLEL)')
+    parser.add_argument('--jitter', type=float, default=0.1, help='random +/- share applied to every delay')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def stub_from_args(args) -> OllamaStub:
+    return OllamaStub(token_rate=args.token_rate, first_token_ms=args.first_token_ms, prompt_rate=args.prompt_rate,
+                      load_ms=args.load_ms, reply_tokens=args.reply_tokens, parallel=args.parallel,
+                      jitter=args.jitter, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    server = serve(stub_from_args(args), args.host, args.port)
+    print(f"Ollama stub serving {MODEL_NAME} on http://{args.host}:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+socket_backpressure_check.py
+Drives user-room frames through the delivery path of one worker
+(socket_sync.stamp_frame -> socket_backpressure.OutboundQueues) to a client
+that stalls, so its queue overflows and sequenced frames get dropped. The
+simulated client follows src/services/notificationsApi.ts (SeqTracker): every
+stamped frame advances its seq, handled or not, and a gap triggers sync.
+
+Checks that every notification still reaches the client (live, replayed by
+sync, or by a full reload when the gap left the sync log), and that frames the
+client has no handler for (admins.updated) never cause a sync on their own.
+
+Usage: python scripts/socket_backpressure_check.py [events]
+"""
+
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'python-backend'))
+
+import socket_sync  # noqa: E402
+from socket_backpressure import OutboundQueues  # noqa: E402
+from socket_batching import BATCH_EVENT  # noqa: E402
+
+USER = 'u1'
+ROOM = f'user:{USER}'
+TRACKED = {'notification.new'}
+
+
+class FakeTransport:
+    """engineio socket queue whose depth the check controls"""
+
+    def __init__(self):
+        self.depth = 0
+
+    def qsize(self):
+        return self.depth
+
+
+class FakeSocketIO:
+    """flask_socketio.SocketIO with one connection in ROOM; frames go to the client"""
+
+    def __init__(self, client):
+        self.client = client
+        self.transport = FakeTransport()
+        eio_socket = type('EioSocket', (), {'queue': self.transport, 'closed': False})()
+        manager = type('Manager', (), {
+            'get_participants': lambda _self, ns, room: [('sid1', 'eio1')] if room == ROOM else [],
+            'eio_sid_from_sid': lambda _self, sid, ns: 'eio1',
+        })()
+        self.server = type('Server', (), {'manager': manager, 'eio': type('Eio', (), {'sockets': {'eio1': eio_socket}})()})()
+
+    def emit(self, event, data, room=None, to=None):
+        self.client.receive(event, data)
+
+
+class Client:
+    """Python model of NotificationsAPI.connect's delta sync"""
+
+    def __init__(self, server_ids):
+        self.server_ids = server_ids  # what a reload from /api/notifications would return
+        self.last_seq = socket_sync.event_log.latest(USER)
+        self.epoch = socket_sync.EPOCH
+        self.applied = set()
+        self.syncs = 0
+        self.reloads = 0
+
+    def receive(self, event, data):
+        if event == BATCH_EVENT:
+            for inner in data.get('events') or []:
+                self.dispatch(inner['event'], inner['data'])
+        else:
+            self.dispatch(event, data)
+
+    def dispatch(self, event, data):
+        if self.accept(data) and event in TRACKED:
+            self.applied.add(data['id'])
+
+    def accept(self, data):
+        seq = int((data or {}).get('_seq') or 0) if isinstance(data, dict) else 0
+        if not seq:
+            return True
+        if seq <= self.last_seq:
+            return False
+        if seq > self.last_seq + 1:
+            self.sync()
+            return False
+        self.last_seq = seq
+        return True
+
+    def sync(self):
+        self.syncs += 1
+        ack = socket_sync.event_log.since(USER, self.last_seq, self.epoch)
+        if ack['resync']:
+            self.reloads += 1
+            self.last_seq = ack['seq']
+            self.applied |= set(self.server_ids)
+            return
+        for ev in ack['events']:
+            self.dispatch(ev['event'], {**ev['data'], '_seq': ev['seq']})
+
+
+def emit(queues, event, data):
+    queues.emit(event, socket_sync.stamp_frame(event, data, ROOM), room=ROOM)
+
+
+def run(events, max_queue, stall, seed=7):
+    rng = random.Random(seed)
+    server_ids = []
+    client = Client(server_ids)
+    sio = FakeSocketIO(client)
+    queues = OutboundQueues(sio, max_queue=max_queue, transport_max=4, policies={})
+    for i in range(events):
+        # The client stalls for stretches, long enough to overflow its queue
+        sio.transport.depth = 4 if (i // stall) % 2 else 0
+        if rng.random() < 0.3:
+            emit(queues, 'admins.updated', {'count': i})
+        notif = {'id': f'n{i}', 'title': 'Book due'}
+        server_ids.append(notif['id'])
+        if rng.random() < 0.2:
+            emit(queues, BATCH_EVENT, {'count': 2, 'events': [
+                {'event': 'user.updated', 'data': {'id': USER}},
+                {'event': 'notification.new', 'data': notif},
+            ]})
+        else:
+            emit(queues, 'notification.new', notif)
+        queues.pump()
+    sio.transport.depth = 0
+    while queues.pump():
+        pass
+    return client, server_ids
+
+
+def check_untracked_only():
+    """admins.updated then notification.new on a healthy connection: no sync"""
+    client = Client([])
+    sio = FakeSocketIO(client)
+    queues = OutboundQueues(sio, policies={})
+    emit(queues, 'admins.updated', {'count': 1})
+    emit(queues, 'notification.new', {'id': 'x1'})
+    ok = client.syncs == 0 and client.applied == {'x1'}
+    print(f"   {'✅' if ok else '❌'} untracked event before a notification: {client.syncs} syncs")
+    return ok
+
+
+def check_overflow(events, max_queue, stall, replayed):
+    dropped_before = socket_sync.metrics.counter('socket.queue.dropped_sequenced')
+    client, server_ids = run(events, max_queue, stall)
+    dropped = socket_sync.metrics.counter('socket.queue.dropped_sequenced') - dropped_before
+    missing = set(server_ids) - client.applied
+    # Each stall is one gap: one sync, answered by a replay or (past the log) a reload
+    stalls = -(-events // stall) // 2
+    ok = not missing and dropped > 0 and client.syncs <= stalls and (client.reloads == 0) == replayed
+    print(f"   {'✅' if ok else '❌'} queue {max_queue}, stalls of {stall}: {dropped} sequenced frames dropped, "
+          f"{client.syncs} syncs, {client.reloads} reloads, {len(missing)} notifications missing")
+    return ok
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    print("🔍 Socket.IO backpressure recovery check")
+    print("=" * 50)
+    ok = check_untracked_only()
+    # Gaps inside the sync log are replayed; larger ones fall back to a reload
+    ok = check_overflow(events, max_queue=50, stall=60, replayed=True) and ok
+    ok = check_overflow(events, max_queue=50, stall=400, replayed=False) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+socket_pubsub_check.py
+Starts two worker processes on the Unix socket pub/sub backend, emits from one
+and asserts every frame reaches the other. Also checks that workers reconnect
+(one taking over as broker) after the broker goes away, and reports throughput
+for the in-process and Unix socket backends.
+
+Usage: python scripts/socket_pubsub_check.py [events]
+"""
+
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'python-backend'))
+
+from socket_pubsub import ClusterEmitter, InProcessBackend, UnixSocketBackend, UnixSocketBroker  # noqa: E402
+
+
+class FakeSocketIO:
+    """Stands in for flask_socketio.SocketIO: records local emits"""
+
+    def __init__(self):
+        self.emitted = 0
+        self.lock = threading.Lock()
+
+    def emit(self, event, data, room=None):
+        with self.lock:
+            self.emitted += 1
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def start_background_task(self, target, *args):
+        threading.Thread(target=target, args=args, daemon=True).start()
+
+
+def _receiver(path, expected, ready, result):
+    sio = FakeSocketIO()
+    emitter = ClusterEmitter(sio, UnixSocketBackend(path, autostart=False), poll_ms=5)
+    emitter.start()
+    ready.set()
+    deadline = time.time() + 30
+    while sio.emitted < expected and time.time() < deadline:
+        time.sleep(0.01)
+    result.put(('receiver', sio.emitted, time.perf_counter()))
+
+
+def _sender(path, count, go, result):
+    sio = FakeSocketIO()
+    emitter = ClusterEmitter(sio, UnixSocketBackend(path, autostart=False))
+    go.wait()
+    start = time.perf_counter()
+    for i in range(count):
+        emitter.emit('notification.new', {'id': f'notif-{i}', 'title': 'Book due', 'read': False}, room=f'user:{i % 50}')
+    result.put(('sender', sio.emitted, start))
+
+
+def check_two_workers(count):
+    path = os.path.join(tempfile.mkdtemp(), 'socketio.sock')
+    broker = UnixSocketBroker(path).start()
+    ctx = mp.get_context('spawn')
+    ready, go, result = ctx.Event(), ctx.Event(), ctx.Queue()
+    receiver = ctx.Process(target=_receiver, args=(path, count, ready, result))
+    sender = ctx.Process(target=_sender, args=(path, count, go, result))
+    receiver.start()
+    ready.wait(10)
+    sender.start()
+    time.sleep(0.5)  # let the sender connect to the broker
+    go.set()
+    reports = dict((name, (n, t)) for name, n, t in (result.get(timeout=60), result.get(timeout=60)))
+    receiver.join()
+    sender.join()
+    broker.close()
+
+    sent, start = reports['sender']
+    received, end = reports['receiver']
+    status = "✅" if received == count and sent == count else "❌"
+    print(f"   {status} unix: worker A emitted {sent}, worker B delivered {received}/{count}")
+    print(f"   ⏱️ unix: {count / max(end - start, 1e-9):,.0f} events/s end-to-end")
+    return received == count
+
+
+def check_broker_restart():
+    """The worker hosting the broker loses it; both reconnect and frames flow again"""
+    path = os.path.join(tempfile.mkdtemp(), 'socketio.sock')
+    a_sio, b_sio = FakeSocketIO(), FakeSocketIO()
+    a = ClusterEmitter(a_sio, UnixSocketBackend(path, autostart=True, reconnect_max_ms=200), poll_ms=5)
+    b = ClusterEmitter(b_sio, UnixSocketBackend(path, autostart=True, reconnect_max_ms=200), poll_ms=5)
+    a.start()
+    b.start()
+    a.backend.broker.close()
+    delivered = 0
+    deadline = time.time() + 10
+    while delivered == 0 and time.time() < deadline:
+        time.sleep(0.1)
+        a.emit('notification.new', {'id': 'after-restart'}, room='user:1')
+        delivered = b_sio.emitted
+    brokers = [e.backend.broker for e in (a, b) if e.backend.broker is not None and e.backend.broker._server is not None]
+    a.backend.close()
+    b.backend.close()
+    ok = delivered > 0 and len(brokers) == 1
+    print(f"   {'✅' if ok else '❌'} unix: after the broker went away, {len(brokers)} worker took over "
+          f"and {delivered} frames were delivered")
+    return ok
+
+
+def check_in_process(count):
+    a_sio, b_sio = FakeSocketIO(), FakeSocketIO()
+    a = ClusterEmitter(a_sio, InProcessBackend('check'))
+    b = ClusterEmitter(b_sio, InProcessBackend('check'))
+    start = time.perf_counter()
+    for i in range(count):
+        a.emit('notification.new', {'id': f'notif-{i}'}, room='user:1')
+    b.drain()
+    elapsed = time.perf_counter() - start
+    a.backend.close()
+    b.backend.close()
+    status = "✅" if b_sio.emitted == count else "❌"
+    print(f"   {status} inprocess: delivered {b_sio.emitted}/{count}")
+    print(f"   ⏱️ inprocess: {count / max(elapsed, 1e-9):,.0f} events/s")
+    return b_sio.emitted == count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print("🔍 Socket.IO pub/sub check")
+    print("=" * 50)
+    ok = check_in_process(count)
+    ok = check_two_workers(count) and ok
+    ok = check_broker_restart() and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -125,6 +125,7 @@ const Navbar = ({ userType, theme = "system", onThemeChange }: NavbarProps) => {
       onNew: (n) => setNotifications((prev) => [n, ...prev.filter(p=>p.id!==n.id)]),
       onUpdate: (n) => setNotifications((prev) => prev.map(p=>p.id===n.id?n:p)),
       onMarkAll: () => setNotifications((prev)=>prev.map(p=>({...p, read: true}))),
+      onResync: () => reload(),
     });
     
     return () => {
@@ -7,6 +7,7 @@ import { ScrollArea } from "@/components/ui/scroll-area";
 import { Badge } from "@/components/ui/badge";
 import { UserRole } from "@/types/auth";
 import { aiService, type ChatMessage as AIChatMessage, type AdminCommand } from "@/services/aiService";
+import { useAuth } from "@/context/AuthContext";
 import {
   AlertDialog,
   AlertDialogAction,
@@ -42,7 +43,14 @@ export function AIAssistant({ userRole, currentPage }: AIAssistantProps) {
   const [pendingCommand, setPendingCommand] = useState<AdminCommand | null>(null);
   const [showCommandDialog, setShowCommandDialog] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
-  const userId = `user_${userRole}_${Date.now()}`;
+  const { user } = useAuth();
+  const guestIdRef = useRef(`user_${userRole}_${Date.now()}`);
+  const userId = user?.id || guestIdRef.current;
+
+  // The backend keeps this conversation's history per session; start one per user
+  useEffect(() => {
+    aiService.initSession(userId);
+  }, [userId]);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
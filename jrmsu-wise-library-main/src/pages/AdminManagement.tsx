@@ -12,6 +12,7 @@ import AIAssistant from "@/components/Layout/AIAssistant";
 import AdminProfileModal from "@/components/AdminProfileModal";
 import { databaseService, User } from "@/services/database";
 import { useToast } from "@/hooks/use-toast";
+import { LibraryOccupancy } from "@/services/libraryOccupancy";
 import {
   AlertDialog,
   AlertDialogAction,
@@ -47,26 +48,11 @@ const AdminManagement = () => {
   // Library session tracking
   const [activeLibraryAdmins, setActiveLibraryAdmins] = useState<number>(0);
 
-  // Load active library sessions
-  const loadActiveLibrarySessions = async () => {
-    try {
-      const response = await fetch('http://localhost:5000/api/library/active-sessions?userType=admin');
-      if (response.ok) {
-        const data = await response.json();
-        setActiveLibraryAdmins(data.admins || 0);
-      }
-    } catch (error) {
-      console.error('Failed to load active library sessions:', error);
-    }
-  };
-
   // Load admins from database and backend
   useEffect(() => {
     loadAdmins();
-    loadActiveLibrarySessions();
-    
-    // Poll for active sessions every 30 seconds
-    const sessionInterval = setInterval(loadActiveLibrarySessions, 30000);
+    // Live occupancy: one snapshot, then pushed updates
+    const unsubscribeOccupancy = LibraryOccupancy.subscribe((o) => setActiveLibraryAdmins(o.admins || 0));
     
     let t: any = null;
     const tick = async () => {
@@ -85,7 +71,7 @@ const AdminManagement = () => {
     };
     tick();
     t = setInterval(tick, 5000);
-    return () => { if (t) clearInterval(t); };
+    return () => { if (t) clearInterval(t); unsubscribeOccupancy(); };
   }, []);
 
   // Get unique filter values
@@ -11,6 +11,7 @@ import Sidebar from "@/components/Layout/Sidebar";
 import AIAssistant from "@/components/Layout/AIAssistant";
 import { databaseService, User } from "@/services/database";
 import { useToast } from "@/hooks/use-toast";
+import { LibraryOccupancy } from "@/services/libraryOccupancy";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { StudentProfileModal } from "@/components/student/StudentProfileModal";
 
@@ -34,26 +35,11 @@ const StudentManagement = () => {
   // Library session tracking
   const [activeLibraryStudents, setActiveLibraryStudents] = useState<number>(0);
 
-  // Load active library sessions
-  const loadActiveLibrarySessions = async () => {
-    try {
-      const response = await fetch('http://localhost:5000/api/library/active-sessions?userType=student');
-      if (response.ok) {
-        const data = await response.json();
-        setActiveLibraryStudents(data.students || 0);
-      }
-    } catch (error) {
-      console.error('Failed to load active library sessions:', error);
-    }
-  };
-
   // Load students from database and backend
   useEffect(() => {
     loadStudents();
-    loadActiveLibrarySessions();
-    
-    // Poll for active sessions every 30 seconds
-    const sessionInterval = setInterval(loadActiveLibrarySessions, 30000);
+    // Live occupancy: one snapshot, then pushed updates
+    const unsubscribeOccupancy = LibraryOccupancy.subscribe((o) => setActiveLibraryStudents(o.students || 0));
     
     let t: any = null;
     const tick = async () => {
@@ -71,7 +57,7 @@ const StudentManagement = () => {
     };
     tick();
     t = setInterval(tick, 5000);
-    return () => { if (t) clearInterval(t); };
+    return () => { if (t) clearInterval(t); unsubscribeOccupancy(); };
   }, []);
 
   // Get unique filter values
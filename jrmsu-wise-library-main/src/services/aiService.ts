@@ -127,7 +127,11 @@ class AIService {
             },
             body: JSON.stringify({
               message: userMessage,
-              history: conversationHistory.map(msg => ({ role: msg.role, content: msg.content }))
+              userId,
+              // With a session the server holds the (sanitized) history; only new messages are sent
+              ...(this.currentSessionId
+                ? { sessionId: this.currentSessionId }
+                : { history: conversationHistory.map(msg => ({ role: msg.role, content: msg.content })) })
             })
           });
         }
@@ -177,7 +181,8 @@ class AIService {
     userMessage: string,
     userId: string,
     conversationHistory: ChatMessage[] = [],
-    onChunk: (chunk: string) => void
+    onChunk: (chunk: string) => void,
+    signal?: AbortSignal
   ): Promise<ChatMessage> {
     try {
       const isOnline = await this.checkOllamaStatus();
@@ -194,12 +199,14 @@ class AIService {
         { role: 'user', content: userMessage }
       ];
 
-      // Prefer backend proxy if configured (non-streaming fallback)
+      // Prefer backend proxy if configured: SSE stream (/ai/chat/stream), falling back to plain JSON on 404
+      let backendStreaming = false;
       const response = await (async () => {
         if (BACKEND_AI_BASE) {
           await this.ensureAuthToken(userId, 'user');
           const token = localStorage.getItem('auth_token') || '';
-          return fetch(`${API.AI.BASE}${(API.AI as any).CHAT_PROXY_PATH || '/ai/chat'}`, {
+          const chatPath = (API.AI as any).CHAT_PROXY_PATH || '/ai/chat';
+          const init: RequestInit = {
             method: 'POST',
             headers: {
               'Content-Type': 'application/json',
@@ -207,9 +214,26 @@ class AIService {
             },
             body: JSON.stringify({
               message: userMessage,
-              history: conversationHistory.map(msg => ({ role: msg.role, content: msg.content }))
-            })
-          });
+              userId,
+              // With a session the server holds the (sanitized) history; only new messages are sent
+              ...(this.currentSessionId
+                ? { sessionId: this.currentSessionId }
+                : { history: conversationHistory.map(msg => ({ role: msg.role, content: msg.content })) })
+            }),
+            // Aborting closes the connection, which stops generation on the server
+            signal
+          };
+          const streamed = await fetch(`${API.AI.BASE}${chatPath}/stream`, init);
+          if (streamed.ok && (streamed.headers.get('Content-Type') || '').includes('text/event-stream')) {
+            backendStreaming = true;
+            return streamed;
+          }
+          // Only an older backend without the stream route gets the plain JSON retry;
+          // a 429/503 from the queue or breaker must not be sent a second time
+          if (streamed.status !== 404) {
+            return streamed;
+          }
+          return fetch(`${API.AI.BASE}${chatPath}`, init);
         }
         return fetch(`${API.AI.BASE}${API.AI.CHAT_PATH}`, {
           method: 'POST',
@@ -218,7 +242,8 @@ class AIService {
             model: MODEL_NAME,
             messages: messages,
             stream: true
-          })
+          }),
+          signal
         });
       })();
 
@@ -248,6 +273,37 @@ class AIService {
             }
           }
         }
+      } else if (backendStreaming) {
+        // Server-Sent Events: "event: token|done|error" + "data: {json}" blocks
+        const reader = response.body?.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        if (reader) {
+          while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let sep: number;
+            while ((sep = buffer.indexOf('\n\n')) >= 0) {
+              const block = buffer.slice(0, sep);
+              buffer = buffer.slice(sep + 2);
+              const event = /^event: (.*)$/m.exec(block)?.[1];
+              const dataLine = /^data: (.*)$/m.exec(block)?.[1];
+              if (!dataLine) continue;
+              const data = JSON.parse(dataLine);
+              if (event === 'token' && data.delta) {
+                fullContent += data.delta;
+                onChunk(data.delta);
+              } else if (event === 'error' && data.fallback) {
+                // Model is down (circuit breaker open): show the server's friendly fallback
+                fullContent += data.fallback;
+                onChunk(data.fallback);
+              } else if (event === 'error') {
+                throw new Error(data.error || 'AI stream failed');
+              }
+            }
+          }
+        }
       } else {
         const data = await response.json();
         fullContent = (data as any).content ?? '';
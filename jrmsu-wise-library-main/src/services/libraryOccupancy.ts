@@ -0,0 +1,49 @@
+import { API } from "@/config/api";
+import { getIO, onEvents } from "@/services/notificationsApi";
+
+// Live counters maintained by python-backend/library_occupancy.py
+export type Occupancy = {
+  total: number;
+  students: number;
+  admins: number;
+  byUserType: Record<string, number>;
+  byDepartment: Record<string, number>;
+  version: number;
+  updatedAt: number;
+};
+
+export const LibraryOccupancy = {
+  async snapshot(): Promise<Occupancy> {
+    const r = await fetch(`${API.BACKEND.BASE}/api/library/occupancy`, { credentials: "include" });
+    if (!r.ok) throw new Error(await r.text());
+    return r.json();
+  },
+  // Snapshot once, then server pushes (rate limited) instead of polling
+  subscribe(onUpdate: (o: Occupancy) => void) {
+    let sock: any = null;
+    let cancelled = false;
+    let version = -1;
+    const apply = (o: Occupancy) => {
+      if (!o || o.version === version) return;
+      version = o.version;
+      onUpdate(o);
+    };
+    LibraryOccupancy.snapshot().then(apply).catch(() => {});
+    (async () => {
+      try {
+        const io = await getIO();
+        if (cancelled) return;
+        sock = io(API.BACKEND.BASE, { transports: ["websocket"], withCredentials: true });
+        // Rooms don't survive a reconnect, so subscribe on every connect
+        sock.on("connect", () => sock.emit("occupancy.subscribe"));
+        onEvents(sock, { "library.occupancy": apply });
+      } catch (e) {
+        console.warn('Live occupancy disabled (socket.io not available)', e);
+      }
+    })();
+    return () => {
+      cancelled = true;
+      try { sock?.disconnect(); } catch {}
+    };
+  },
+};
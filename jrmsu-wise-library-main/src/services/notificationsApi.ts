@@ -17,7 +17,7 @@ export type NotificationItem = {
 // Soft dependency on socket.io-client with CDN fallback to avoid build-time failures
 let socket: any = null;
 let _io: any = null;
-async function getIO() {
+export async function getIO() {
   if (_io) return _io;
   try {
     // Try local dependency if installed
@@ -33,6 +33,59 @@ async function getIO() {
   return _io;
 }
 
+// Server batches several events per room into one "batch" frame (see python-backend/socket_batching.py)
+export type BatchFrame = { count: number; events: { event: string; data: any }[] };
+
+export function unpackBatch(frame: BatchFrame | null | undefined): { event: string; data: any }[] {
+  return Array.isArray(frame?.events) ? frame!.events : [];
+}
+
+// Register handlers so they fire for both single events and events inside batch frames.
+// `other` sees every event without a handler (single or batched), e.g. to track its _seq.
+export function onEvents(
+  sock: any,
+  handlers: Record<string, (data: any) => void>,
+  other?: (event: string, data: any) => void,
+) {
+  Object.entries(handlers).forEach(([event, fn]) => sock.on(event, fn));
+  sock.on("batch", (frame: BatchFrame) => {
+    for (const { event, data } of unpackBatch(frame)) {
+      const fn = handlers[event];
+      if (fn) fn(data);
+      else other?.(event, data);
+    }
+  });
+  if (other && typeof sock.onAny === "function") {
+    sock.onAny((event: string, data: any) => {
+      if (event !== "batch" && !(event in handlers)) other(event, data);
+    });
+  }
+}
+
+// Delta sync state of one connection (see python-backend/socket_sync.py). The server
+// numbers every frame sent to the user's room, including events this client has no
+// handler for, so each stamped frame must advance lastSeq or the next one looks like a gap.
+export class SeqTracker {
+  lastSeq = 0;
+  epoch: string | null = null;
+  syncing = false;
+
+  constructor(public requestSync: () => void) {}
+
+  // True when the frame should be applied; skips duplicates and frames a pending sync
+  // will replay, and requests a sync when frames were dropped (seq jumped)
+  accept(data: any): boolean {
+    const seq = Number(data?._seq) || 0;
+    if (!seq) return true;
+    if (seq <= this.lastSeq) return false;
+    // Everything after lastSeq comes back with the pending sync
+    if (this.syncing) return false;
+    if (this.epoch !== null && seq > this.lastSeq + 1) { this.requestSync(); return false; }
+    this.lastSeq = seq;
+    return true;
+  }
+}
+
 export const NotificationsAPI = {
   async list(params: { userId: string; filter?: "all"|"unread"; page?: number; limit?: number }) {
     const url = new URL(`${API.BACKEND.BASE}/api/notifications`);
@@ -77,6 +130,8 @@ export const NotificationsAPI = {
     onNew?: (n: NotificationItem) => void;
     onUpdate?: (n: NotificationItem) => void;
     onMarkAll?: (p: { userId: string; timestamp: number }) => void;
+    // Called when missed events can't be replayed (server restart / gap too large); reload lists
+    onResync?: () => void;
   }) {
     if (socket) try { socket.disconnect(); } catch {}
     let cancelled = false;
@@ -85,19 +140,54 @@ export const NotificationsAPI = {
         const io = await getIO();
         if (cancelled) return;
         socket = io(API.BACKEND.BASE, { transports: ["websocket"], withCredentials: true, query: { userId } });
-        socket.on("connected", () => {});
-        socket.on("notification.new", (n: NotificationItem) => handlers.onNew?.(n));
-        socket.on("notification.update", (n: NotificationItem) => handlers.onUpdate?.(n));
-        socket.on("notification.mark_all_read", (p: any) => handlers.onMarkAll?.(p));
-        socket.on("notification.admin_response", (p: any) => handlers.onUpdate?.({
-          id: `admin-${Date.now()}`,
-          user_id: userId,
-          title: "Admin response",
-          body: `Status: ${p?.status}`,
-          type: "admin_response",
-          created_at: Date.now()/1000,
-          read: false,
-        } as any));
+        const events: Record<string, (data: any) => void> = {
+          "notification.new": (n: NotificationItem) => handlers.onNew?.(n),
+          "notification.update": (n: NotificationItem) => handlers.onUpdate?.(n),
+          "notification.mark_all_read": (p: any) => handlers.onMarkAll?.(p),
+          "notification.admin_response": (p: any) => handlers.onUpdate?.({
+            id: `admin-${Date.now()}`,
+            user_id: userId,
+            title: "Admin response",
+            body: `Status: ${p?.status}`,
+            type: "admin_response",
+            created_at: Date.now()/1000,
+            read: false,
+          } as any),
+          "activity.new": () => {},
+        };
+        const sock = socket;
+        // Skip events already applied; remember the latest seq for the next reconnect.
+        // A jump in seq means the server dropped frames for a slow connection; replay them.
+        const tracker = new SeqTracker(() => {
+          tracker.syncing = true;
+          sock.emit("sync", { since: tracker.lastSeq, epoch: tracker.epoch }, (ack: any) => {
+            tracker.syncing = false;
+            if (!ack || ack.resync) {
+              tracker.lastSeq = Number(ack?.seq) || tracker.lastSeq;
+              handlers.onResync?.();
+              return;
+            }
+            for (const ev of ack.events || []) dispatch(ev.event, { ...ev.data, _seq: ev.seq });
+          });
+        });
+        const sequenced: Record<string, (data: any) => void> = {};
+        Object.entries(events).forEach(([event, fn]) => {
+          sequenced[event] = (data: any) => { if (tracker.accept(data)) fn(data); };
+        });
+        // Events without a handler (admins.updated, user.updated, ...) still advance the seq
+        const untracked = (_event: string, data: any) => { tracker.accept(data); };
+        const dispatch = (event: string, data: any) => (sequenced[event] ?? ((d: any) => untracked(event, d)))(data);
+        onEvents(sock, {
+          ...sequenced,
+          "connected": (p: { seq?: number; epoch?: string }) => {
+            const first = tracker.epoch === null;
+            const sameEpoch = !first && p?.epoch === tracker.epoch;
+            tracker.epoch = p?.epoch ?? null;
+            if (first) { tracker.lastSeq = Number(p?.seq) || 0; return; }
+            if (!sameEpoch) { tracker.lastSeq = Number(p?.seq) || 0; handlers.onResync?.(); return; }
+            tracker.requestSync();
+          },
+        }, untracked);
       } catch (e) {
         // If even CDN fails, silently skip realtime
         console.warn('Realtime disabled (socket.io not available)', e);
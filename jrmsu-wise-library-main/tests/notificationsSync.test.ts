@@ -0,0 +1,60 @@
+import { describe, it, expect } from 'vitest'
+import { onEvents, SeqTracker } from '../src/services/notificationsApi'
+
+// Minimal socket.io client: on/onAny listeners and a receive() that delivers a frame
+class FakeSocket {
+  listeners: Record<string, (data: any) => void> = {}
+  any: ((event: string, data: any) => void)[] = []
+  on(event: string, fn: (data: any) => void) { this.listeners[event] = fn }
+  onAny(fn: (event: string, data: any) => void) { this.any.push(fn) }
+  receive(event: string, data: any) {
+    this.any.forEach(fn => fn(event, data))
+    this.listeners[event]?.(data)
+  }
+}
+
+// Wires a tracker the way NotificationsAPI.connect does
+function connect() {
+  const sock = new FakeSocket()
+  const synced: number[] = []
+  const applied: string[] = []
+  const tracker = new SeqTracker(() => synced.push(tracker.lastSeq))
+  tracker.epoch = 'e1'
+  onEvents(sock, {
+    'notification.new': (n: any) => { if (tracker.accept(n)) applied.push(n.id) },
+  }, (_event, data) => { tracker.accept(data) })
+  return { sock, tracker, synced, applied }
+}
+
+describe('notifications delta sync', () => {
+  it('does not sync after an event the client has no handler for', () => {
+    const { sock, tracker, synced, applied } = connect()
+    sock.receive('admins.updated', { _seq: 1 })
+    sock.receive('notification.new', { id: 'n1', _seq: 2 })
+    expect(synced).toEqual([])
+    expect(applied).toEqual(['n1'])
+    expect(tracker.lastSeq).toBe(2)
+  })
+
+  it('advances the seq for untracked events inside batch frames', () => {
+    const { sock, synced, applied } = connect()
+    sock.receive('batch', {
+      count: 3,
+      events: [
+        { event: 'user.updated', data: { _seq: 1 } },
+        { event: 'students.updated', data: { _seq: 2 } },
+        { event: 'notification.new', data: { id: 'n1', _seq: 3 } },
+      ],
+    })
+    expect(synced).toEqual([])
+    expect(applied).toEqual(['n1'])
+  })
+
+  it('still syncs when frames were actually dropped', () => {
+    const { sock, synced, applied } = connect()
+    sock.receive('notification.new', { id: 'n1', _seq: 1 })
+    sock.receive('notification.new', { id: 'n3', _seq: 3 })
+    expect(synced).toEqual([1])
+    expect(applied).toEqual(['n1'])
+  })
+})